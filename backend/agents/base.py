@@ -1,12 +1,15 @@
 from abc import ABC, abstractmethod
-from typing import Dict, Any, List
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Sequence
 import asyncio
+import numpy as np
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from ml.youtu_integration.client import YoutuSearchClient
+from ml.retrieval.bm25_index import get_default_index
 from services.personalization import personalization_service
+from agents.fanout import HedgingPolicy, fan_out
 
 class BaseAgent(ABC):
     """Base class for all agents in the system"""
@@ -17,6 +20,23 @@ class BaseAgent(ABC):
         self.status = "idle"
         self.success_count = 0
         self.error_count = 0
+        # SSRL framework whose learners tune this agent; the feedback service's when None
+        self.ssrl_framework = None
+
+    def learned_weights(self, user_id: Optional[str] = None) -> Dict[str, float]:
+        """Parameters learned from feedback for this agent: the user's segment's, or the global ones"""
+        return self._ssrl().get_segment_weights(self.agent_id, user_id)
+
+    def has_learned_weights(self, user_id: str) -> bool:
+        """Whether feedback from the user's segment has given it learned weights of its own"""
+        return self._ssrl().has_segment_weights(user_id)
+
+    def _ssrl(self):
+        if self.ssrl_framework is None:
+            # Imported on first use: the feedback service opens the feedback log
+            from services.feedback import feedback_service
+            self.ssrl_framework = feedback_service.ssrl_framework
+        return self.ssrl_framework
         
     @abstractmethod
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -34,27 +54,75 @@ class BaseAgent(ABC):
         }
 
 class SearchAgent(BaseAgent):
-    """Agent responsible for performing searches using Youtu-agent"""
+    """Agent responsible for performing searches using Youtu-agent and the local index"""
     
-    def __init__(self):
+    def __init__(self, modalities: Sequence[str] = ("local", "text", "cross_modal", "image"),
+                 deadline: float = float(os.environ.get("SEARCH_DEADLINE_MS", 1000)) / 1000.0,
+                 local_index=None, local_top_k: int = 50):
         super().__init__("search_001", "Search Agent")
         self.youtu_client = YoutuSearchClient()  # In practice, pass API key
+        # Any object with search(query, k) -> results; defaults to the index in SEARCH_INDEX_DIR
+        self.local_index = local_index if local_index is not None else get_default_index()
+        self.local_top_k = local_top_k
+        self.modalities = tuple(modalities)
+        self.deadline = deadline
+        self.hedging = HedgingPolicy()
+        # A duplicate local search would only compete with the first for the same CPU
+        self.unhedged_sources = frozenset({"local"})
+
+    def _source_calls(self, query: str, input_data: Dict[str, Any]) -> Dict[str, Callable[[], Awaitable[List]]]:
+        """One call per configured modality that applies to this request"""
+        calls: Dict[str, Callable[[], Awaitable[List]]] = {}
+        if "local" in self.modalities and self.local_index is not None:
+            # Retrieval is CPU-bound; keep it off the event loop
+            calls["local"] = lambda: asyncio.get_running_loop().run_in_executor(
+                None, self.local_index.search, query, self.local_top_k
+            )
+        if "text" in self.modalities:
+            calls["text"] = lambda: self.youtu_client.text_search(query)
+        if "cross_modal" in self.modalities:
+            calls["cross_modal"] = lambda: self.youtu_client.cross_modal_search(query, "text_to_image")
+        image_data = input_data.get("image_data")
+        if "image" in self.modalities and image_data:
+            calls["image"] = lambda: self.youtu_client.image_search(image_data)
+        return calls
         
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         self.status = "searching"
         
         query = input_data.get("refined_query", input_data.get("query", ""))
         
-        # Perform text search using Youtu-agent
-        search_results = await self.youtu_client.text_search(query)
+        # Query all modalities concurrently; a slow one is hedged and cut off at the deadline
+        outcomes = await fan_out(self._source_calls(query, input_data), self.deadline, self.hedging,
+                                 self.unhedged_sources)
+        search_results = self.weigh_sources([
+            {**result, "source": source}
+            for source, outcome in outcomes.items()
+            for result in outcome.results
+        ], input_data.get("user_id"))
         
         self.status = "idle"
         
         return {
             "agent_id": self.agent_id,
-            "results": search_results
+            "results": search_results,
+            "sources": {source: outcome.status() for source, outcome in outcomes.items()},
+            "complete": all(outcome.complete for outcome in outcomes.values())
         }
 
+    def weigh_sources(self, results: List[Dict[str, Any]], user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Set each result's source_weight from the source weights learned for the user (the global
+        ones without a user), scaled so that equal weights give 1.0
+        """
+        weights = self.learned_weights(user_id)
+        scale = len(weights)
+        return [
+            {**result, "source_weight": weights[result.get("source")] * scale
+             if result.get("source") in weights else 1.0}
+            for result in results
+        ]
+
 class ReasoningAgent(BaseAgent):
     """Agent responsible for reasoning and query processing using DSPy"""
     
@@ -85,15 +153,35 @@ class RankingAgent(BaseAgent):
         await asyncio.sleep(0.1)  # Simulate async work
         self.status = "idle"
         
-        results = input_data.get("results", [])
-        # Simple re-ranking for demonstration
-        ranked_results = sorted(results, key=lambda x: x.get("score", 0), reverse=True)
+        # GEPA search agents emit "search_results"; traditional search emits "results"
+        results = input_data.get("results", input_data.get("search_results", []))
+        ranked_results = self.rank(results, input_data.get("user_id"))
         
         return {
             "agent_id": self.agent_id,
             "ranked_results": ranked_results
         }
 
+    def rank(self, results: List[Dict[str, Any]], user_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        Score results by the feature weights learned for the user (the global ones without a
+        user) times their source_weight, best first. Relevance is the retrieval score; the other
+        features are read from the result and count as 0 when missing, so equal weights rank by
+        relevance. The features are kept on each result so feedback can be credited to them.
+        """
+        weights = self.learned_weights(user_id)
+        scale = len(weights)
+        ranked = []
+        for result in results:
+            features = dict(result.get("features") or {})
+            features.setdefault("relevance", result.get("score", 0))
+            for name in weights:
+                features.setdefault(name, float(result.get(name, 0.0)))
+            score = sum(weights[name] * features[name] for name in weights) * scale
+            ranked.append({**result, "features": features, "score": score * result.get("source_weight", 1.0)})
+        ranked.sort(key=lambda result: result["score"], reverse=True)
+        return ranked
+
 class PersonalizationAgent(BaseAgent):
     """Agent responsible for personalizing results based on user preferences"""
     
@@ -106,32 +194,40 @@ class PersonalizationAgent(BaseAgent):
         results = input_data.get("results", [])
         user_id = input_data.get("user_id", "default")
         
-        # Get user profile for personalization
-        user_profile = personalization_service.get_user_profile(user_id)
-        
-        # Personalize results based on user profile
-        personalized_results = []
-        for result in results:
-            # Extract categories/keywords from result (simplified)
-            categories = ["general"]  # In practice, extract from result content
-            
-            # Calculate personalized score
-            base_score = result.get("score", 0)
-            result_id = result.get("id", "")
-            
-            personalized_score = personalization_service.get_personalized_score(
-                user_id, base_score, result_id, categories
-            )
-            
-            # Add personalized result
-            personalized_result = {
-                **result,
-                "personalized_score": personalized_score
-            }
-            personalized_results.append(personalized_result)
-        
-        # Sort by personalized score
-        personalized_results.sort(key=lambda x: x.get("personalized_score", 0), reverse=True)
+        # Get user profile for personalization (preloaded by the orchestrator when available)
+        user_profile = input_data.get("user_profile") or personalization_service.get_compact_profile(user_id)
+        
+        # Build the candidate arrays once and score them in a single vectorized pass
+        categories: List[str] = []
+        category_index: Dict[str, int] = {}
+        memberships = []
+        for row, result in enumerate(results):
+            # Results without category metadata fall back to "general"
+            for category in result.get("categories") or ["general"]:
+                if category not in category_index:
+                    category_index[category] = len(categories)
+                    categories.append(category)
+                memberships.append((row, category_index[category]))
+
+        category_matrix = np.zeros((len(results), len(categories)), dtype=np.float64)
+        if memberships:
+            rows, cols = zip(*memberships)
+            category_matrix[list(rows), list(cols)] = 1.0
+
+        base_scores = np.fromiter((result.get("score", 0) for result in results),
+                                  dtype=np.float64, count=len(results))
+        result_ids = [result.get("id", "") for result in results]
+
+        indices, scores = personalization_service.rank_personalized(
+            user_id, base_scores, result_ids, category_matrix, categories,
+            top_k=input_data.get("top_k"), profile=user_profile
+        )
+
+        # Sorted by personalized score
+        personalized_results = [
+            {**results[index], "personalized_score": float(score)}
+            for index, score in zip(indices.tolist(), scores.tolist())
+        ]
         
         self.status = "idle"
         
@@ -0,0 +1,113 @@
+from dataclasses import dataclass
+from typing import AbstractSet, Dict, Any, Awaitable, Callable, List, Optional
+import asyncio
+import time
+from services.histograms import LatencyHistogram
+from services.metrics import metrics_service
+
+@dataclass
+class SourceResult:
+    """Outcome of one source in a fan-out"""
+    results: List[Dict[str, Any]]
+    complete: bool
+    latency: float
+    hedged: bool = False
+    error: Optional[str] = None
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "complete": self.complete,
+            "result_count": len(self.results),
+            "latency": self.latency,
+            "hedged": self.hedged,
+            "error": self.error
+        }
+
+class HedgingPolicy:
+    """
+    Tracks per-source latency and decides when to send a duplicate request: once a call has taken
+    longer than the source's p95 (or `default_delay` until enough samples have been seen)
+    """
+
+    def __init__(self, quantile: float = 0.95, min_samples: int = 20, default_delay: float = 0.5):
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.default_delay = default_delay
+        self._latencies: Dict[str, LatencyHistogram] = {}
+
+    def observe(self, source: str, seconds: float):
+        self._latencies.setdefault(source, LatencyHistogram()).record(seconds)
+
+    def hedge_delay(self, source: str) -> float:
+        histogram = self._latencies.get(source)
+        if histogram is None or histogram.count < self.min_samples:
+            return self.default_delay
+        return histogram.quantile(self.quantile)
+
+async def hedged_call(call: Callable[[], Awaitable[List[Dict[str, Any]]]], hedge_delay: float):
+    """
+    Run `call`; if it has not finished after hedge_delay (or fails), start one duplicate and take
+    whichever succeeds first. Returns (results, hedged).
+    """
+    primary = asyncio.ensure_future(call())
+    tasks = {primary}
+    hedged = False
+    try:
+        done, _ = await asyncio.wait(tasks, timeout=hedge_delay)
+        if primary in done and primary.exception() is None:
+            return primary.result(), False
+        tasks = {task for task in tasks if task not in done}
+        tasks.add(asyncio.ensure_future(call()))
+        hedged = True
+        error: Optional[BaseException] = primary.exception() if primary in done else None
+        while tasks:
+            done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result(), hedged
+                error = task.exception()
+        raise error
+    finally:
+        for task in tasks:
+            task.cancel()
+
+async def fan_out(calls: Dict[str, Callable[[], Awaitable[List[Dict[str, Any]]]]], deadline: float,
+                  policy: HedgingPolicy, unhedged: AbstractSet[str] = frozenset()) -> Dict[str, SourceResult]:
+    """
+    Query every source concurrently (hedging slow calls, except sources in `unhedged`) and return
+    whatever arrived within `deadline` seconds; sources that failed or missed the deadline are
+    marked incomplete
+    """
+    if not calls:
+        return {}
+    start_time = time.time()
+    outcomes: Dict[str, SourceResult] = {}
+
+    async def run_source(source: str, call):
+        if source in unhedged:
+            results, hedged = await call(), False
+        else:
+            results, hedged = await hedged_call(call, policy.hedge_delay(source))
+        latency = time.time() - start_time
+        policy.observe(source, latency)
+        metrics_service.observe_latency("search_source", latency, {"source": source})
+        if hedged:
+            metrics_service.record_metric("search_hedged", 1.0, {"source": source})
+        outcomes[source] = SourceResult(results, True, latency, hedged)
+
+    tasks = {asyncio.ensure_future(run_source(source, call)): source for source, call in calls.items()}
+    done, pending = await asyncio.wait(tasks, timeout=deadline)
+    for task in pending:
+        task.cancel()
+    for task, source in tasks.items():
+        if source in outcomes:
+            continue
+        elapsed = time.time() - start_time
+        if task in done:
+            error = repr(task.exception())
+        else:
+            error = "deadline exceeded"
+            policy.observe(source, elapsed)  # Slow sources must still raise their p95
+        metrics_service.record_metric("search_source_incomplete", 1.0, {"source": source})
+        outcomes[source] = SourceResult([], False, elapsed, error=error)
+    return outcomes
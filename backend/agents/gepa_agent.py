@@ -6,7 +6,11 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
 
 from agents.base import BaseAgent
-from ml.dspy_pipelines.gepa_enhanced_reasoning import GEPAEnhancedSearchPipeline, AdaptiveGEPASearchOrchestrator
+from services.executor import ExecutorSaturatedError, pipeline_executor
+from ml.dspy_pipelines.gepa_enhanced_reasoning import AdaptiveGEPASearchOrchestrator
+from ml.dspy_pipelines.gepa_optimizer_worker import GEPAOptimizerClient
+from ml.dspy_pipelines.prompt_encoding import decode_ranking
+from ml.retrieval.bm25_index import get_default_index
 from typing import Dict, Any, List, Optional
 import asyncio
 import time
@@ -18,7 +22,8 @@ class GEPAReasoningAgent(BaseAgent):
     
     def __init__(self):
         super().__init__("gepa_reasoning_001", "GEPA Reasoning Agent")
-        self.orchestrator = AdaptiveGEPASearchOrchestrator()
+        # GEPA compilation runs in a separate optimizer process; snapshots are swapped in as published
+        self.orchestrator = AdaptiveGEPASearchOrchestrator(optimizer=GEPAOptimizerClient())
         self.processing_history = []
         
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
@@ -30,7 +35,6 @@ class GEPAReasoningAgent(BaseAgent):
         try:
             query = input_data.get("query", "")
             user_id = input_data.get("user_id", "default")
-            initial_results = input_data.get("initial_results", [])
             user_feedback = input_data.get("user_feedback")
             
             # Build user context from available data
@@ -41,17 +45,18 @@ class GEPAReasoningAgent(BaseAgent):
                 "timestamp": time.time()
             }
             
-            # Process with GEPA-enhanced pipeline
-            result = self.orchestrator.process_search(
+            # Process with GEPA-enhanced pipeline on the bounded executor. Reasoning runs before
+            # search, so with no candidates the pipeline only enhances the query; GEPASearchAgent
+            # ranks the searched results
+            result = await pipeline_executor.run(
+                self.orchestrator.process_search,
                 query=query,
-                initial_results=initial_results,
+                initial_results=[],
                 user_context=user_context,
                 user_feedback=user_feedback
             )
             
-            # Extract optimized results
             enhanced_query = result.enhanced_query
-            optimized_results = self._parse_results(result.optimized_results)
             performance_score = result.performance_score
             
             # Store processing history for analysis
@@ -71,46 +76,21 @@ class GEPAReasoningAgent(BaseAgent):
             
             return {
                 "refined_query": enhanced_query,
-                "optimized_results": optimized_results,
                 "performance_score": performance_score,
                 "processing_time": processing_time,
-                "optimization_stats": self.orchestrator.get_system_stats(),
+                # Full stats are served separately; responses only reference the snapshot
+                "optimization_stats_version": self.orchestrator.get_stats_snapshot().version,
                 "agent_id": self.agent_id
             }
             
+        except ExecutorSaturatedError:
+            # Backpressure, not a failure of this agent; callers turn it into a retryable rejection
+            self.error_count += 1
+            raise
         except Exception as e:
             self.error_count += 1
             raise Exception(f"GEPA reasoning failed: {str(e)}")
     
-    def _parse_results(self, results_str: str) -> List[Dict[str, Any]]:
-        """
-        Parse and structure the optimized results
-        """
-        try:
-            # Handle string representation of results
-            if isinstance(results_str, str):
-                # Try to extract structured data from string
-                import re
-                
-                # Simple parsing for demonstration - in production, use proper parsing
-                mock_results = [
-                    {
-                        "id": f"result_{i}",
-                        "title": f"Optimized Result {i+1}",
-                        "url": f"https://example.com/result{i+1}",
-                        "score": 0.9 - (i * 0.1),
-                        "personalized_score": 0.95 - (i * 0.1),
-                        "optimization_applied": True
-                    }
-                    for i in range(min(5, 10))  # Limit to reasonable number
-                ]
-                return mock_results
-            
-            return results_str if isinstance(results_str, list) else []
-            
-        except Exception:
-            return []
-    
     async def learn_from_feedback(self, query: str, results: List[Dict], 
                                  feedback: List[Dict], user_context: Dict):
         """
@@ -118,7 +98,8 @@ class GEPAReasoningAgent(BaseAgent):
         """
         try:
             # Process feedback through GEPA optimization
-            self.orchestrator.process_search(
+            await pipeline_executor.run(
+                self.orchestrator.process_search,
                 query=query,
                 initial_results=results,
                 user_context=user_context,
@@ -150,6 +131,7 @@ class GEPAReasoningAgent(BaseAgent):
         return {
             "agent_metrics": self.get_status(),
             "system_stats": system_stats,
+            "executor_stats": pipeline_executor.get_stats(),
             "average_performance": avg_performance,
             "total_processed": len(self.processing_history),
             "recent_queries": [
@@ -167,9 +149,13 @@ class GEPASearchAgent(BaseAgent):
     Search agent enhanced with GEPA optimization for result improvement
     """
     
-    def __init__(self):
+    def __init__(self, orchestrator: Optional[AdaptiveGEPASearchOrchestrator] = None):
         super().__init__("gepa_search_001", "GEPA Search Agent")
-        self.pipeline = GEPAEnhancedSearchPipeline()
+        # Rank with the orchestrator's per-query-type pipelines so published predictor snapshots
+        # reach the ranked results; share the reasoning agent's to keep one set of pipelines
+        self.orchestrator = orchestrator if orchestrator is not None else \
+            AdaptiveGEPASearchOrchestrator(optimizer=GEPAOptimizerClient())
+        self.local_index = get_default_index()
         
     async def process(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -181,8 +167,13 @@ class GEPASearchAgent(BaseAgent):
             query = input_data.get("refined_query", input_data.get("query", ""))
             user_id = input_data.get("user_id", "default")
             
-            # Simulate search results (in production, integrate with actual search APIs)
-            mock_results = self._generate_mock_search_results(query)
+            # First-stage retrieval from the local index; mock results when none is configured
+            if self.local_index is not None:
+                initial_results = await asyncio.get_running_loop().run_in_executor(
+                    None, self.local_index.search, query, 10
+                )
+            else:
+                initial_results = self._generate_mock_search_results(query)
             
             # Build user context
             user_context = {
@@ -191,10 +182,11 @@ class GEPASearchAgent(BaseAgent):
                 "search_history": input_data.get("search_history", [])
             }
             
-            # Apply GEPA optimization
-            optimized_result = self.pipeline.forward(
+            # Apply GEPA optimization on the bounded executor
+            optimized_result = await pipeline_executor.run(
+                self.orchestrator.process_search,
                 query=query,
-                initial_results=mock_results,
+                initial_results=initial_results,
                 user_context=user_context
             )
             
@@ -202,13 +194,17 @@ class GEPASearchAgent(BaseAgent):
             self.success_count += 1
             
             return {
-                "search_results": self._parse_results(optimized_result.optimized_results),
+                "search_results": self._parse_results(optimized_result.optimized_results, initial_results),
                 "enhanced_query": optimized_result.enhanced_query,
                 "performance_score": optimized_result.performance_score,
                 "processing_time": processing_time,
                 "optimization_applied": True
             }
             
+        except ExecutorSaturatedError:
+            # Backpressure, not a failure of this agent; callers turn it into a retryable rejection
+            self.error_count += 1
+            raise
         except Exception as e:
             self.error_count += 1
             raise Exception(f"GEPA search failed: {str(e)}")
@@ -229,29 +225,14 @@ class GEPASearchAgent(BaseAgent):
             for i in range(10)
         ]
     
-    def _parse_results(self, results_str: str) -> List[Dict[str, Any]]:
+    def _parse_results(self, ranking: Any, initial_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        Parse optimized results from GEPA output
+        Apply the GEPA ranking (compact result IDs) to the searched results
         """
-        # Similar parsing logic as in GEPAReasoningAgent
-        try:
-            if isinstance(results_str, str):
-                # Return enhanced mock results
-                return [
-                    {
-                        "id": f"gepa_result_{i}",
-                        "title": f"GEPA Optimized Result {i+1}",
-                        "url": f"https://optimized.example.com/result{i+1}",
-                        "snippet": "This result has been optimized by GEPA based on user feedback patterns",
-                        "score": 0.95 - (i * 0.05),
-                        "personalized_score": 0.98 - (i * 0.05),
-                        "gepa_optimized": True
-                    }
-                    for i in range(8)
-                ]
-            return results_str if isinstance(results_str, list) else []
-        except Exception:
-            return []
+        return [
+            {**result, "gepa_optimized": True}
+            for result in decode_ranking(ranking, initial_results)
+        ]
 
 # Export agents for use in orchestrator
 __all__ = ['GEPAReasoningAgent', 'GEPASearchAgent']
\ No newline at end of file
@@ -1,30 +1,72 @@
-from typing import Dict, Any, List
+from contextvars import ContextVar
+from typing import Dict, Any, AsyncIterator, List, Optional
 from agents.base import BaseAgent, SearchAgent, ReasoningAgent, RankingAgent, PersonalizationAgent
 from agents.gepa_agent import GEPAReasoningAgent, GEPASearchAgent
+from agents.scheduler import Stage, StageScheduler, StageListener
+from ml.retrieval.bm25_index import get_default_index
 import asyncio
 import time
 from services.metrics import metrics_service
+from services.personalization import personalization_service
+from services.search_cache import search_cache
+from services.coalescing import SingleFlight
+from services.executor import ExecutorSaturatedError
+
+# Agents behind each stage of the two pipeline variants
+AGENT_IDS = {
+    "gepa": {
+        "reasoning": "gepa_reasoning_001",
+        "search": "gepa_search_001",
+        "ranking": "ranking_001",
+        "personalization": "personalization_001"
+    },
+    "traditional": {
+        "reasoning": "reasoning_001",
+        "search": "search_001",
+        "ranking": "ranking_001",
+        "personalization": "personalization_001"
+    }
+}
+
+# Listener for candidate stages of a streaming request; tasks started by the request inherit it
+_candidate_listener: ContextVar[Optional[StageListener]] = ContextVar("candidate_listener", default=None)
+
+# Per-stage timeouts in seconds (None disables the timeout)
+DEFAULT_STAGE_TIMEOUTS = {
+    "profile": 0.5,
+    "reasoning": 30.0,
+    "search": 30.0,
+    "ranking": 5.0,
+    "personalization": 5.0
+}
 
 class AgentOrchestrator:
     """Orchestrates the multi-agent system for search processing"""
     
-    def __init__(self):
+    def __init__(self, stage_timeouts: Dict[str, float] = None):
         self.agents: Dict[str, BaseAgent] = {}
+        self.stage_timeouts = {**DEFAULT_STAGE_TIMEOUTS, **(stage_timeouts or {})}
         self._initialize_agents()
+        self.candidate_plans = {variant: self._build_candidate_plan(variant) for variant in AGENT_IDS}
+        self.plans = {variant: self._build_plan(variant) for variant in AGENT_IDS}
+        # Identical concurrent searches share one candidate computation
+        self.candidate_flights = SingleFlight("candidates")
         
     def _initialize_agents(self):
         """Initialize all agents in the system"""
-        agent_classes = [
-            SearchAgent,
-            ReasoningAgent,
-            RankingAgent,
-            PersonalizationAgent,
-            GEPAReasoningAgent,
-            GEPASearchAgent
+        gepa_reasoning = GEPAReasoningAgent()
+        agents = [
+            SearchAgent(),
+            ReasoningAgent(),
+            RankingAgent(),
+            PersonalizationAgent(),
+            gepa_reasoning,
+            # Shares the reasoning agent's pipelines, so a snapshot swap reaches ranking and
+            # changes the version that keys cached candidates
+            GEPASearchAgent(orchestrator=gepa_reasoning.orchestrator)
         ]
         
-        for agent_class in agent_classes:
-            agent = agent_class()
+        for agent in agents:
             self.agents[agent.agent_id] = agent
             
     async def process_search_query(self, query: str, user_id: str = "default", use_gepa: bool = True) -> Dict[str, Any]:
@@ -46,93 +88,236 @@ class AgentOrchestrator:
         finally:
             # Record overall search metrics
             total_time = time.time() - start_time
-            metrics_service.record_search_query(total_time, success)
-            metrics_service.flush_metrics()
+            metrics_service.record_search_query(
+                total_time, success, {"variant": "gepa" if use_gepa else "traditional"}
+            )
     
+    async def stream_search_query(self, query: str, user_id: str = "default",
+                                  use_gepa: bool = True) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run a search and yield events as stages finish: "enhanced_query", "candidates" (raw search
+        results), "ranked", "personalized", then "done" (or "error"). Candidates served from the
+        cache skip straight to "enhanced_query" and "ranked".
+        """
+        variant = "gepa" if use_gepa else "traditional"
+        start_time = time.time()
+        events: "asyncio.Queue[Optional[Dict[str, Any]]]" = asyncio.Queue()
+        candidates_done = False
+
+        def emit(event: str, data: Dict[str, Any]):
+            events.put_nowait({"event": event, "elapsed": time.time() - start_time, **data})
+
+        def on_candidate_stage(stage: str, output: Dict[str, Any]):
+            if candidates_done:
+                return  # A background cache refresh finishing after this request's candidates
+            if stage == "reasoning":
+                emit("enhanced_query", {
+                    "refined_query": output.get("refined_query"),
+                    "enhanced_query": output.get("enhanced_query")
+                })
+            elif stage == "search":
+                emit("candidates", {
+                    "results": output.get("results", output.get("search_results", [])),
+                    "sources": output.get("sources", {}),
+                    "complete": output.get("complete", True)
+                })
+            elif stage == "ranking":
+                emit("ranked", {"results": output.get("ranked_results", [])})
+
+        def on_stage(stage: str, output: Dict[str, Any]):
+            nonlocal candidates_done
+            if stage == "candidates":
+                if output.get("cache_status") != "miss" or output.get("coalesced"):
+                    # Nothing was streamed for these candidates; send them in one go
+                    emit("enhanced_query", {
+                        "refined_query": output.get("refined_query"),
+                        "enhanced_query": output.get("enhanced_query")
+                    })
+                    emit("ranked", {"results": output.get("results", [])})
+                candidates_done = True
+            elif stage == "personalization":
+                emit("personalized", {"results": output.get("personalized_results", [])})
+
+        async def run():
+            success = True
+            try:
+                _candidate_listener.set(on_candidate_stage)
+                result = await self.plans[variant].run({"query": query, "user_id": user_id}, on_stage)
+                self._record_stage_metrics(variant, result.timings)
+                candidates = result.outputs["candidates"]
+                emit("done", {
+                    "total_time": time.time() - start_time,
+                    "cache_status": candidates.get("cache_status"),
+                    "complete": candidates.get("complete", True),
+                    "gepa_optimized": use_gepa
+                })
+            except Exception as e:
+                success = False
+                error = {"message": str(e)}
+                if isinstance(e, ExecutorSaturatedError):
+                    error["retry_after"] = e.retry_after
+                emit("error", error)
+            finally:
+                metrics_service.record_search_query(time.time() - start_time, success, {"variant": variant})
+                events.put_nowait(None)
+
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    break
+                yield event
+        finally:
+            # The client went away; stop work that only this request needs
+            if not task.done():
+                task.cancel()
+
+    def _build_candidate_plan(self, variant: str) -> StageScheduler:
+        """Declare the unpersonalized stages that produce a shareable candidate set"""
+        agent_ids = AGENT_IDS[variant]
+
+        def agent_stage(agent_id: str):
+            async def run(input_data: Dict[str, Any]) -> Dict[str, Any]:
+                return await self._process_agent(agent_id, input_data)
+            return run
+
+        return StageScheduler([
+            Stage("reasoning", agent_stage(agent_ids["reasoning"]),
+                  timeout=self.stage_timeouts.get("reasoning")),
+            Stage("search", agent_stage(agent_ids["search"]), inputs=["reasoning"],
+                  timeout=self.stage_timeouts.get("search")),
+            Stage("ranking", agent_stage(agent_ids["ranking"]), inputs=["search"],
+                  timeout=self.stage_timeouts.get("ranking")),
+        ])
+
+    def _build_plan(self, variant: str) -> StageScheduler:
+        """Declare the stage DAG for a search; stages without shared inputs run concurrently"""
+        async def candidates(input_data: Dict[str, Any]) -> Dict[str, Any]:
+            return await self._get_candidates(variant, input_data["query"])
+
+        async def personalize(input_data: Dict[str, Any]) -> Dict[str, Any]:
+            results = self._apply_learned_weights(input_data.get("results", []),
+                                                  input_data.get("user_id", "default"))
+            return await self._process_agent(AGENT_IDS[variant]["personalization"],
+                                             {**input_data, "results": results})
+
+        return StageScheduler([
+            Stage("profile", self._load_user_profile, timeout=self.stage_timeouts.get("profile"),
+                  optional=True),
+            Stage("candidates", candidates),
+            Stage("personalization", personalize, inputs=["candidates", "profile"],
+                  timeout=self.stage_timeouts.get("personalization")),
+        ])
+
+    async def _get_candidates(self, variant: str, query: str) -> Dict[str, Any]:
+        """Look up the shared candidate set for a query, computing it on a miss"""
+        key = search_cache.make_key(query, variant, self._pipeline_version(variant))
+
+        async def compute() -> Dict[str, Any]:
+            return await self._compute_candidates(variant, query)
+
+        async def lookup():
+            return await search_cache.get_or_compute(key, compute)
+
+        (candidates, cache_status), coalesced = await self.candidate_flights.do(key, lookup)
+        return {**candidates, "cache_status": cache_status, "coalesced": coalesced}
+
+    async def _compute_candidates(self, variant: str, query: str) -> Dict[str, Any]:
+        """Run reasoning, search and ranking without user context so the result can be shared"""
+        run = await self.candidate_plans[variant].run({"query": query}, _candidate_listener.get())
+        self._record_stage_metrics(variant, run.timings)
+
+        reasoning_output = run.outputs["reasoning"]
+        search_output = run.outputs["search"]
+        return {
+            "refined_query": reasoning_output.get("refined_query"),
+            "enhanced_query": reasoning_output.get("enhanced_query"),
+            "performance_score": reasoning_output.get("performance_score", 0.5),
+            "optimization_stats_version": reasoning_output.get("optimization_stats_version"),
+            "results": run.outputs["ranking"].get("ranked_results", []),
+            "sources": search_output.get("sources", {}),
+            "complete": search_output.get("complete", True)
+        }
+
+    def _apply_learned_weights(self, results: List[Dict[str, Any]], user_id: str) -> List[Dict[str, Any]]:
+        """
+        Shared candidates are weighted and ranked with the globally learned source and feature
+        weights; re-rank them with the user's own once their feedback has given them some
+        """
+        search = self.agents[AGENT_IDS["traditional"]["search"]]
+        ranking = self.agents[AGENT_IDS["traditional"]["ranking"]]
+        if not ranking.has_learned_weights(user_id):
+            return results
+        return ranking.rank(search.weigh_sources(results, user_id), user_id)
+
+    def _pipeline_version(self, variant: str) -> str:
+        """Version of the predictors behind a variant; part of the candidate cache key"""
+        if variant == "gepa":
+            # Both GEPA stages run optimized predictors; a swap in either must miss the cache
+            return "/".join(self.agents[AGENT_IDS["gepa"][stage]].orchestrator.get_pipeline_version()
+                            for stage in ("reasoning", "search"))
+        return "0"
+
+    async def _load_user_profile(self, input_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Load the user profile independently of query reasoning"""
+        # The profile store is synchronous; run it off the event loop so the stage overlaps
+        # reasoning and its timeout can fire
+        profile = await asyncio.get_running_loop().run_in_executor(
+            None, personalization_service.get_compact_profile, input_data.get("user_id", "default"))
+        return {"user_profile": profile}
+
+    def _record_stage_metrics(self, variant: str, timings: Dict[str, float]):
+        """Record per-agent processing time and per-stage latency for each stage that ran"""
+        for stage_name, stage_time in timings.items():
+            metrics_service.observe_latency("stage", stage_time, {"variant": variant, "stage": stage_name})
+        for stage_name, agent_id in AGENT_IDS[variant].items():
+            if stage_name in timings:
+                metrics_service.record_agent_processing(agent_id, timings[stage_name])
+
     async def _process_with_gepa(self, query: str, user_id: str) -> Dict[str, Any]:
         """Process search query using GEPA-enhanced agents"""
-        # Step 1: GEPA Reasoning Agent processes and enhances the query
-        reasoning_start = time.time()
-        reasoning_input = {"query": query, "user_id": user_id}
-        reasoning_output = await self._process_agent("gepa_reasoning_001", reasoning_input)
-        reasoning_time = time.time() - reasoning_start
-        
-        # Step 2: GEPA Search Agent performs optimized search
-        search_start = time.time()
-        search_input = {**reasoning_output, "user_id": user_id}
-        search_output = await self._process_agent("gepa_search_001", search_input)
-        search_time = time.time() - search_start
-        
-        # Step 3: Traditional Ranking Agent (can be enhanced with GEPA later)
-        ranking_start = time.time()
-        ranking_input = {**search_output, "user_id": user_id}
-        ranking_output = await self._process_agent("ranking_001", ranking_input)
-        ranking_time = time.time() - ranking_start
-        
-        # Step 4: Personalization Agent
-        personalization_start = time.time()
-        personalization_input = {**ranking_output, "user_id": user_id}
-        personalization_output = await self._process_agent("personalization_001", personalization_input)
-        personalization_time = time.time() - personalization_start
-        
-        # Record metrics for GEPA agents
-        metrics_service.record_agent_processing("gepa_reasoning_001", reasoning_time)
-        metrics_service.record_agent_processing("gepa_search_001", search_time)
-        metrics_service.record_agent_processing("ranking_001", ranking_time)
-        metrics_service.record_agent_processing("personalization_001", personalization_time)
-        
+        run = await self.plans["gepa"].run({"query": query, "user_id": user_id})
+        candidates = run.outputs["candidates"]
+
+        # Record metrics for the per-user stage (candidate stages are recorded when computed)
+        self._record_stage_metrics("gepa", run.timings)
+
         return {
             "original_query": query,
-            "refined_query": reasoning_output.get("refined_query"),
-            "enhanced_query": reasoning_output.get("enhanced_query"),
-            "results": search_output.get("search_results", []),
+            "refined_query": candidates.get("refined_query"),
+            "enhanced_query": candidates.get("enhanced_query"),
+            "results": run.outputs["personalization"].get("personalized_results", []),
             "gepa_optimized": True,
-            "performance_score": reasoning_output.get("performance_score", 0.5),
-            "optimization_stats": reasoning_output.get("optimization_stats", {}),
+            "performance_score": candidates.get("performance_score", 0.5),
+            "optimization_stats_version": candidates.get("optimization_stats_version"),
+            "cache_status": candidates.get("cache_status"),
             "processing_steps": [
                 "gepa_reasoning", "gepa_search", "ranking", "personalization"
             ]
         }
-    
+
     async def _process_traditional(self, query: str, user_id: str) -> Dict[str, Any]:
         """Process search query using traditional agents"""
-        # Original implementation
-        reasoning_start = time.time()
-        reasoning_input = {"query": query, "user_id": user_id}
-        reasoning_output = await self._process_agent("reasoning_001", reasoning_input)
-        reasoning_time = time.time() - reasoning_start
-        
-        search_start = time.time()
-        search_input = {**reasoning_output, "user_id": user_id}
-        search_output = await self._process_agent("search_001", search_input)
-        search_time = time.time() - search_start
-        
-        ranking_start = time.time()
-        ranking_input = {**search_output, "user_id": user_id}
-        ranking_output = await self._process_agent("ranking_001", ranking_input)
-        ranking_time = time.time() - ranking_start
-        
-        personalization_start = time.time()
-        personalization_input = {**ranking_output, "user_id": user_id}
-        personalization_output = await self._process_agent("personalization_001", personalization_input)
-        personalization_time = time.time() - personalization_start
-        
+        run = await self.plans["traditional"].run({"query": query, "user_id": user_id})
+        candidates = run.outputs["candidates"]
+
         # Record agent metrics
-        metrics_service.record_agent_processing("reasoning_001", reasoning_time)
-        metrics_service.record_agent_processing("search_001", search_time)
-        metrics_service.record_agent_processing("ranking_001", ranking_time)
-        metrics_service.record_agent_processing("personalization_001", personalization_time)
-        
+        self._record_stage_metrics("traditional", run.timings)
+
         return {
             "original_query": query,
-            "refined_query": reasoning_output.get("refined_query"),
-            "results": personalization_output.get("personalized_results", []),
+            "refined_query": candidates.get("refined_query"),
+            "results": run.outputs["personalization"].get("personalized_results", []),
             "gepa_optimized": False,
+            "cache_status": candidates.get("cache_status"),
+            "sources": candidates.get("sources", {}),
+            "complete": candidates.get("complete", True),
             "processing_steps": [
                 "reasoning", "search", "ranking", "personalization"
             ]
         }
-        
+
     async def _process_agent(self, agent_id: str, input_data: Dict[str, Any]) -> Dict[str, Any]:
         """Process input through a specific agent"""
         if agent_id not in self.agents:
@@ -140,6 +325,20 @@ class AgentOrchestrator:
             
         return await self.agents[agent_id].process(input_data)
         
+    def get_performance_stats(self) -> Dict[str, Any]:
+        """Get candidate cache, request coalescing, profile cache and local index statistics"""
+        local_index = get_default_index()
+        return {
+            "search_cache": search_cache.get_stats(),
+            "coalescing": self.candidate_flights.get_stats(),
+            "profile_cache": personalization_service.get_cache_stats(),
+            "local_index": local_index.get_stats() if local_index is not None else None
+        }
+
+    def get_optimization_stats(self) -> Dict[str, Any]:
+        """Latest GEPA system stats snapshot, referenced by version from search responses"""
+        return self.agents["gepa_reasoning_001"].orchestrator.get_stats_snapshot().to_dict()
+
     def get_agent_status(self) -> List[Dict[str, Any]]:
         """Get status of all agents"""
         return [agent.get_status() for agent in self.agents.values()]
\ No newline at end of file
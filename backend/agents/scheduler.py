@@ -0,0 +1,124 @@
+"""
+Dependency-graph stage scheduler for the agent orchestrator
+"""
+from dataclasses import dataclass, field
+from typing import Dict, Any, List, Optional, Callable, Awaitable
+import asyncio
+import time
+
+StageFn = Callable[[Dict[str, Any]], Awaitable[Dict[str, Any]]]
+StageListener = Callable[[str, Dict[str, Any]], None]
+
+class StageTimeoutError(Exception):
+    """Raised when a stage does not finish within its timeout"""
+    pass
+
+@dataclass
+class Stage:
+    """A single step of a search plan and the stages it depends on"""
+    name: str
+    run: StageFn
+    inputs: List[str] = field(default_factory=list)
+    timeout: Optional[float] = None
+    optional: bool = False  # Failures and timeouts yield an empty output instead of aborting
+
+@dataclass
+class ScheduleResult:
+    """Outputs and wall-clock timings of every stage in a run"""
+    outputs: Dict[str, Dict[str, Any]]
+    timings: Dict[str, float]
+    failed: List[str] = field(default_factory=list)
+
+class StageScheduler:
+    """
+    Runs a declared DAG of stages, starting each stage as soon as its inputs are ready.
+    Independent stages run concurrently, so latency follows the critical path.
+    """
+
+    def __init__(self, stages: List[Stage]):
+        self.stages: Dict[str, Stage] = {}
+        for stage in stages:
+            if stage.name in self.stages:
+                raise ValueError(f"Duplicate stage {stage.name}")
+            self.stages[stage.name] = stage
+        self.order = self._topological_order()
+
+    def _topological_order(self) -> List[str]:
+        """Validate the graph and return stage names in dependency order"""
+        order: List[str] = []
+        state: Dict[str, int] = {}  # 1 = visiting, 2 = done
+
+        def visit(name: str, path: List[str]):
+            if state.get(name) == 2:
+                return
+            if state.get(name) == 1:
+                raise ValueError(f"Stage cycle detected: {' -> '.join(path + [name])}")
+            state[name] = 1
+            for dep in self.stages[name].inputs:
+                if dep not in self.stages:
+                    raise ValueError(f"Stage {name} depends on unknown stage {dep}")
+                visit(dep, path + [name])
+            state[name] = 2
+            order.append(name)
+
+        for name in self.stages:
+            visit(name, [])
+        return order
+
+    async def run(self, context: Dict[str, Any],
+                  on_stage_complete: Optional[StageListener] = None) -> ScheduleResult:
+        """
+        Execute all stages. Each stage receives the shared context merged with the
+        outputs of its inputs, in declared order. on_stage_complete, if given, is called
+        with each successful stage's name and output as soon as it finishes.
+        """
+        tasks: Dict[str, asyncio.Task] = {}
+        timings: Dict[str, float] = {}
+        failed: List[str] = []
+
+        async def run_stage(stage: Stage) -> Dict[str, Any]:
+            upstream = await asyncio.gather(*(tasks[dep] for dep in stage.inputs))
+            stage_input = dict(context)
+            for output in upstream:
+                stage_input.update(output)
+
+            start_time = time.time()
+            try:
+                if stage.timeout is not None:
+                    try:
+                        output = await asyncio.wait_for(stage.run(stage_input), stage.timeout)
+                    except asyncio.TimeoutError:
+                        raise StageTimeoutError(
+                            f"Stage {stage.name} timed out after {stage.timeout}s"
+                        )
+                else:
+                    output = await stage.run(stage_input)
+                if on_stage_complete is not None:
+                    on_stage_complete(stage.name, output)
+                return output
+            except Exception as e:
+                if not stage.optional:
+                    raise
+                print(f"Optional stage {stage.name} skipped: {e}")
+                failed.append(stage.name)
+                return {}
+            finally:
+                timings[stage.name] = time.time() - start_time
+
+        for name in self.order:
+            tasks[name] = asyncio.create_task(run_stage(self.stages[name]))
+
+        try:
+            results = await asyncio.gather(*(tasks[name] for name in self.order))
+        finally:
+            for task in tasks.values():
+                if not task.done():
+                    task.cancel()
+
+        return ScheduleResult(
+            outputs=dict(zip(self.order, results)),
+            timings=timings,
+            failed=failed
+        )
+
+__all__ = ['Stage', 'StageScheduler', 'ScheduleResult', 'StageTimeoutError', 'StageListener']
@@ -1,12 +1,24 @@
 """
 Simplified YSearch2 Backend for Integration Testing
 """
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+from collections import OrderedDict, deque
 import time
+import json
 import asyncio
+import sys
+import os
+sys.path.append(os.path.dirname(__file__))
+
+from services.metrics import metrics_service
+from services.feedback_log import feedback_log
+from services.feedback import feedback_service, log_event
+from services.feedback_scheduler import FeedbackBackpressureError
+from services.executor import ExecutorSaturatedError
 
 app = FastAPI(
     title="YSearch2 API - Simplified",
@@ -23,6 +35,46 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def start_background_workers():
+    feedback_service.scheduler.start()
+
+@app.on_event("shutdown")
+async def stop_background_workers():
+    feedback_service.close()
+
+@app.exception_handler(FeedbackBackpressureError)
+async def feedback_backpressure_handler(request: Request, exc: FeedbackBackpressureError):
+    """Shed feedback while learners catch up; clients should retry later"""
+    return JSONResponse(
+        status_code=429,
+        content={"status": "error", "message": str(exc), "lag": exc.lag},
+        headers={"Retry-After": str(int(exc.retry_after + 0.999))}
+    )
+
+@app.exception_handler(ExecutorSaturatedError)
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturatedError):
+    """Reject searches while the pipeline executor queue is full; clients should retry later"""
+    return JSONResponse(
+        status_code=503,
+        content={"status": "error", "message": str(exc)},
+        headers={"Retry-After": str(int(exc.retry_after + 0.999))}
+    )
+
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    """Record per-endpoint latency histograms"""
+    start_time = time.time()
+    response = await call_next(request)
+    # Use the route template rather than the raw path to keep label cardinality bounded
+    route = request.scope.get("route")
+    metrics_service.observe_latency("http_request", time.time() - start_time, {
+        "method": request.method,
+        "path": getattr(route, "path", "unmatched"),
+        "status": str(response.status_code)
+    })
+    return response
+
 class SearchRequest(BaseModel):
     query: str
     user_id: Optional[str] = "default"
@@ -49,10 +101,43 @@ class FeedbackRequest(BaseModel):
     result_id: str
     user_id: str
     feedback_type: str
+    timestamp: Optional[float] = None
+    # The result's "source" and "features" fields, so learning moves only what the feedback is about
+    source: Optional[str] = None
+    features: Optional[Dict[str, float]] = None
+
+class FeedbackBatchRequest(BaseModel):
+    events: List[FeedbackRequest]
 
-# Mock data storage
-feedback_storage = []
-search_history = {}
+# Largest number of events accepted by one /feedback/batch call
+MAX_FEEDBACK_BATCH = 10000
+
+# Recent feedback per user, bounded in users and entries; the full history is in feedback_log
+MAX_TRACKED_USERS = 10000
+MAX_USER_HISTORY = 50
+search_history: "OrderedDict[str, deque]" = OrderedDict()
+
+def _track_user_history(events: List[Dict[str, Any]]):
+    """Keep the last few feedback entries of recently active users"""
+    for event in events:
+        user_id = event["user_id"]
+        history = search_history.get(user_id)
+        if history is None:
+            history = search_history[user_id] = deque(maxlen=MAX_USER_HISTORY)
+            if len(search_history) > MAX_TRACKED_USERS:
+                search_history.popitem(last=False)
+        else:
+            search_history.move_to_end(user_id)
+        history.append({
+            "query": event["query"],
+            "feedback": event["feedback_type"],
+            "timestamp": event["timestamp"]
+        })
+
+def _feedback_event(request: FeedbackRequest) -> Dict[str, Any]:
+    event = log_event(request.dict())
+    event["timestamp"] = event["timestamp"] or time.time()
+    return event
 
 def generate_mock_results(query: str, is_gepa: bool = False) -> List[SearchResult]:
     """Generate mock search results"""
@@ -128,33 +213,82 @@ async def search_traditional(request: SearchRequest):
         performance_score=0.75
     )
 
+_orchestrator = None
+
+def _get_orchestrator():
+    """Agent orchestrator for streaming search, built on first use (agent setup is slow)"""
+    global _orchestrator
+    if _orchestrator is None:
+        from agents.orchestrator import AgentOrchestrator
+        _orchestrator = AgentOrchestrator()
+    return _orchestrator
+
+STREAM_MEDIA_TYPES = {"ndjson": "application/x-ndjson", "sse": "text/event-stream"}
+
+@app.get("/search/stream")
+async def search_stream(q: str, user_id: str = "default", use_gepa: bool = True, format: str = "ndjson"):
+    """
+    Stream search progress as stages finish (enhanced_query, candidates, ranked, personalized,
+    done) so clients can render the first results before the full pipeline completes.
+    format is "ndjson" (one JSON object per line) or "sse" (Server-Sent Events).
+    """
+    if format not in STREAM_MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"format must be one of {sorted(STREAM_MEDIA_TYPES)}")
+
+    async def encode():
+        async for event in _get_orchestrator().stream_search_query(q, user_id, use_gepa):
+            payload = json.dumps(event, default=str)
+            if format == "sse":
+                yield f"event: {event['event']}\ndata: {payload}\n\n"
+            else:
+                yield payload + "\n"
+
+    return StreamingResponse(
+        encode(),
+        media_type=STREAM_MEDIA_TYPES[format],
+        # Keep proxies from buffering the stream
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @app.post("/feedback")
 async def record_feedback(request: FeedbackRequest):
-    """Record user feedback for learning"""
-    feedback_entry = {
-        "query": request.query,
-        "result_id": request.result_id,
-        "user_id": request.user_id,
-        "feedback_type": request.feedback_type,
-        "timestamp": time.time()
-    }
-    
-    feedback_storage.append(feedback_entry)
-    
-    # Update search history
-    if request.user_id not in search_history:
-        search_history[request.user_id] = []
-    
-    search_history[request.user_id].append({
-        "query": request.query,
-        "feedback": request.feedback_type,
-        "timestamp": time.time()
-    })
+    """Record user feedback for learning; responds once the event is durable"""
+    feedback_service.scheduler.admit(1)
+    event = _feedback_event(request)
+    seq = await asyncio.wrap_future(feedback_log.submit([event]))
+    _track_user_history([event])
     
     return {
         "status": "success",
         "message": f"Feedback recorded for result {request.result_id}",
-        "feedback_count": len(feedback_storage)
+        "feedback_count": seq
+    }
+
+@app.post("/feedback/batch")
+async def record_feedback_batch(request: FeedbackBatchRequest):
+    """Record many feedback events (e.g. a click stream) with one durable write"""
+    if len(request.events) > MAX_FEEDBACK_BATCH:
+        raise HTTPException(status_code=413, detail=f"At most {MAX_FEEDBACK_BATCH} events per batch")
+    feedback_service.scheduler.admit(len(request.events))
+    events = [_feedback_event(event) for event in request.events]
+    seq = await asyncio.wrap_future(feedback_log.submit(events))
+    _track_user_history(events)
+    feedback_service.scheduler.notify()
+    
+    return {
+        "status": "success",
+        "message": f"Recorded {len(events)} feedback events",
+        "feedback_count": seq
+    }
+
+@app.post("/process_feedback")
+async def process_feedback():
+    """Process pending feedback now instead of waiting for the background scheduler"""
+    result = await feedback_service.process_feedback_batch()
+    return {
+        "status": "success",
+        "processed_count": result.get("processed_count", 0),
+        "lag": feedback_service.lag()
     }
 
 @app.get("/gepa/metrics")
@@ -162,21 +296,43 @@ async def get_gepa_metrics():
     """Get GEPA optimization metrics"""
     return {
         "gepa_reasoning": {
-            "total_processed": len(feedback_storage),
+            "total_processed": feedback_log.committed_seq,
             "average_performance": 0.87,
             "optimization_cycles": 15,
             "learning_rate": 0.01
         },
         "gepa_search": {
-            "searches_optimized": len(feedback_storage) * 2,
+            "searches_optimized": feedback_log.committed_seq * 2,
             "improvement_score": 0.23,
             "user_satisfaction": 0.91
         },
         "system_status": "active",
-        "feedback_entries": len(feedback_storage),
-        "active_users": len(search_history)
+        "feedback_entries": feedback_log.committed_seq,
+        "feedback_log": feedback_log.get_stats(),
+        "feedback_processing": feedback_service.scheduler.get_stats(),
+        "active_users": len(search_history),
+        "latency": metrics_service.histograms.summary()
     }
 
+@app.get("/metrics")
+async def get_metrics():
+    """Get a summary of all collected metrics, including latency percentiles"""
+    return metrics_service.get_metrics_summary()
+
+@app.get("/metrics/prometheus", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """Latency histograms and counters in the Prometheus text exposition format"""
+    return PlainTextResponse(
+        metrics_service.render_prometheus(),
+        media_type="text/plain; version=0.0.4"
+    )
+
+@app.post("/metrics/flush")
+async def flush_metrics():
+    """Persist queued metric updates"""
+    metrics_service.flush_metrics()
+    return {"status": "success"}
+
 @app.get("/gepa/status")
 async def get_gepa_status():
     """Get GEPA system status"""
@@ -199,6 +355,11 @@ async def get_gepa_status():
         "version": "simplified_1.0"
     }
 
+@app.get("/gepa/stats")
+async def get_gepa_stats():
+    """Latest GEPA system stats snapshot; search responses carry its optimization_stats_version"""
+    return _get_orchestrator().get_optimization_stats()
+
 @app.post("/gepa/optimize")
 async def trigger_gepa_optimization():
     """Manually trigger GEPA optimization"""
@@ -244,7 +405,7 @@ async def get_agent_status():
 @app.get("/feedback/recent")
 async def get_recent_feedback(limit: int = 10):
     """Get recent feedback entries"""
-    return feedback_storage[-limit:] if feedback_storage else []
+    return [record._asdict() for record in feedback_log.recent(limit)]
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,48 @@
+from typing import Dict, Any, Callable, Awaitable, Tuple
+import asyncio
+from services.metrics import metrics_service
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key into one execution.
+    The shared work runs in its own task, so a cancelled caller does not cancel it for the others.
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, shared) where shared is True if another caller's execution was reused"""
+        task = self._inflight.get(key)
+        shared = task is not None
+
+        if shared:
+            self.followers += 1
+        else:
+            self.leaders += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done, key=key: self._finish(key, done))
+
+        metrics_service.record_metric("request_coalesced", 1.0 if shared else 0.0, {"group": self.name})
+        return await asyncio.shield(task), shared
+
+    def _finish(self, key: str, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception as retrieved when every waiter has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get coalescing counters"""
+        total = self.leaders + self.followers
+        return {
+            "executions": self.leaders,
+            "coalesced": self.followers,
+            "coalescing_rate": self.followers / total if total else 0.0,
+            "in_flight": len(self._inflight)
+        }
@@ -0,0 +1,201 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, Any, Iterable, List, Optional, Iterator, Tuple
+import sys
+import threading
+import weakref
+
+# Per-string overhead beyond the str object itself: dict entry, list slots and refcount
+_INTERN_OVERHEAD = 72
+
+class StringInterner:
+    """
+    Maps strings to dense integer ids so profiles store 4-byte ids instead of strings.
+    Reference counted: once no live profile holds a string it is dropped and its id reused,
+    so the table tracks the strings of profiles in memory, not every string ever seen.
+    """
+    __slots__ = ("_ids", "_strings", "_refs", "_free", "_lock", "bytes_used")
+
+    def __init__(self):
+        self._ids: Dict[str, int] = {}
+        self._strings: List[Optional[str]] = []
+        self._refs: List[int] = []
+        self._free: List[int] = []
+        self._lock = threading.Lock()
+        self.bytes_used = 0
+
+    def intern(self, value: str) -> int:
+        """Id for a string, taking a reference (assigns an id if needed)"""
+        with self._lock:
+            ident = self._ids.get(value)
+            if ident is None:
+                if self._free:
+                    ident = self._free.pop()
+                    self._strings[ident] = value
+                else:
+                    ident = len(self._strings)
+                    self._strings.append(value)
+                    self._refs.append(0)
+                self._ids[value] = ident
+                self.bytes_used += sys.getsizeof(value) + _INTERN_OVERHEAD
+            self._refs[ident] += 1
+            return ident
+
+    def release(self, idents: Iterable[int]):
+        """Drop one reference per id; strings nobody references any more are removed"""
+        with self._lock:
+            for ident in idents:
+                self._refs[ident] -= 1
+                if self._refs[ident] == 0:
+                    value = self._strings[ident]
+                    del self._ids[value]
+                    self._strings[ident] = None
+                    self._free.append(ident)
+                    self.bytes_used -= sys.getsizeof(value) + _INTERN_OVERHEAD
+
+    def lookup(self, value: str, default: int = -1) -> int:
+        """Id for a string without assigning one or taking a reference"""
+        return self._ids.get(value, default)
+
+    def resolve(self, ident: int) -> str:
+        return self._strings[ident]
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+# Shared across all profiles: each distinct query/result string is stored once
+query_interner = StringInterner()
+result_interner = StringInterner()
+
+def interned_bytes() -> int:
+    """Approximate bytes held by the shared interners, for the profile cache budget"""
+    return query_interner.bytes_used + result_interner.bytes_used
+
+class IdRing:
+    """Fixed-capacity ring buffer of interned ids in a typed array; grows until full, then overwrites"""
+    __slots__ = ("capacity", "_items", "_start")
+
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._items = array('i')
+        self._start = 0  # Index of the oldest item once the buffer is full
+
+    def append(self, value: int) -> Optional[int]:
+        """Add an item; returns the overwritten oldest item once the buffer is full"""
+        if len(self._items) < self.capacity:
+            self._items.append(value)
+            return None
+        evicted = self._items[self._start]
+        self._items[self._start] = value
+        self._start = (self._start + 1) % self.capacity
+        return evicted
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[int]:
+        """Oldest to newest"""
+        size = len(self._items)
+        for offset in range(size):
+            yield self._items[(self._start + offset) % size]
+
+def _release_ids(search_history: array, clicked_results: array, feedback_ids: array):
+    """Finalizer of a CompactProfile: give back its interner references"""
+    query_interner.release(search_history)
+    result_interner.release(clicked_results)
+    result_interner.release(feedback_ids)
+
+class CompactProfile:
+    """
+    Memory-compact user profile: interned ids in typed ring buffers and sorted feedback arrays.
+    Converted to and from the UserProfile model only at the API boundary (see to_dict/from_dict).
+    Holds one interner reference per stored id, released when the profile is garbage collected
+    (after cache eviction and once in-flight requests are done with it).
+    """
+    __slots__ = ("user_id", "preferences", "search_history", "clicked_results",
+                 "feedback_ids", "feedback_scores", "__weakref__")
+
+    def __init__(self, user_id: str, history_capacity: int = 100, click_capacity: int = 1000):
+        self.user_id = user_id
+        self.preferences: Dict[str, float] = {}
+        self.search_history = IdRing(history_capacity)
+        self.clicked_results = IdRing(click_capacity)
+        # Parallel arrays sorted by interned result id
+        self.feedback_ids = array('i')
+        self.feedback_scores = array('d')
+        # The containers are never replaced, so the finalizer sees the ids held at collection
+        weakref.finalize(self, _release_ids, self.search_history._items, self.clicked_results._items,
+                         self.feedback_ids).atexit = False
+
+    def add_search(self, query: str):
+        evicted = self.search_history.append(query_interner.intern(query))
+        if evicted is not None:
+            query_interner.release((evicted,))
+
+    def add_click(self, result_id: str):
+        evicted = self.clicked_results.append(result_interner.intern(result_id))
+        if evicted is not None:
+            result_interner.release((evicted,))
+
+    def set_feedback(self, result_id: str, score: float):
+        ident = result_interner.intern(result_id)
+        position = bisect_left(self.feedback_ids, ident)
+        if position < len(self.feedback_ids) and self.feedback_ids[position] == ident:
+            self.feedback_scores[position] = score
+            # Already referenced by this entry
+            result_interner.release((ident,))
+        else:
+            self.feedback_ids.insert(position, ident)
+            self.feedback_scores.insert(position, score)
+
+    def get_feedback(self, result_id: str) -> Optional[float]:
+        ident = result_interner.lookup(result_id)
+        if ident < 0:
+            return None
+        position = bisect_left(self.feedback_ids, ident)
+        if position < len(self.feedback_ids) and self.feedback_ids[position] == ident:
+            return self.feedback_scores[position]
+        return None
+
+    def estimated_size(self) -> int:
+        """
+        Approximate bytes held by this profile, for memory-budgeted caching (the strings it
+        references are shared and counted by interned_bytes())
+        """
+        return (
+            400  # Object, slots, ring buffers and array headers
+            + 100 * len(self.preferences)
+            + self.search_history._items.itemsize * len(self.search_history)
+            + self.clicked_results._items.itemsize * len(self.clicked_results)
+            + (self.feedback_ids.itemsize + self.feedback_scores.itemsize) * len(self.feedback_ids)
+        )
+
+    def feedback_arrays(self) -> Tuple[array, array]:
+        """Sorted interned ids and their scores, suitable for numpy.frombuffer"""
+        return self.feedback_ids, self.feedback_scores
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Plain representation matching the UserProfile model fields"""
+        return {
+            "user_id": self.user_id,
+            "preferences": dict(self.preferences),
+            "search_history": [query_interner.resolve(ident) for ident in self.search_history],
+            "clicked_results": [result_interner.resolve(ident) for ident in self.clicked_results],
+            "feedback_scores": {
+                result_interner.resolve(ident): score
+                for ident, score in zip(self.feedback_ids, self.feedback_scores)
+            }
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], history_capacity: int = 100,
+                  click_capacity: int = 1000) -> "CompactProfile":
+        profile = cls(data["user_id"], history_capacity, click_capacity)
+        profile.preferences = dict(data.get("preferences", {}))
+        for query in data.get("search_history", [])[-history_capacity:]:
+            profile.add_search(query)
+        for result_id in data.get("clicked_results", [])[-click_capacity:]:
+            profile.add_click(result_id)
+        for result_id, score in data.get("feedback_scores", {}).items():
+            profile.set_feedback(result_id, score)
+        return profile
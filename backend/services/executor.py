@@ -0,0 +1,101 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Callable
+import asyncio
+import os
+import threading
+import time
+from services.metrics import metrics_service
+
+class ExecutorSaturatedError(Exception):
+    """Raised when the executor queue is full and the call is rejected"""
+
+    def __init__(self, message: str, retry_after: float = 1.0):
+        super().__init__(message)
+        self.retry_after = retry_after  # Seconds a queued call currently waits for a worker
+
+class PipelineExecutor:
+    """Bounded thread pool for blocking DSPy/GEPA pipeline calls"""
+
+    def __init__(self, max_workers: int = 8, max_queue_size: int = 64, name: str = "pipeline"):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue_size = max_queue_size
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queued = 0  # Submitted but not yet picked up by a worker
+        self._active = 0
+        self._completed = 0
+        self._rejected = 0
+        self._total_wait_time = 0.0
+        self._max_wait_time = 0.0
+
+    async def run(self, fn: Callable, *args, **kwargs) -> Any:
+        """Run a blocking callable on the pool without blocking the event loop"""
+        with self._lock:
+            if self._queued >= self.max_queue_size:
+                self._rejected += 1
+                started = self._completed + self._active
+                raise ExecutorSaturatedError(
+                    f"{self.name} executor queue is full ({self.max_queue_size} pending calls)",
+                    retry_after=max(1.0, self._total_wait_time / started) if started else 1.0
+                )
+            self._queued += 1
+            queue_depth = self._queued
+
+        metrics_service.record_metric("executor_queue_depth", float(queue_depth), {"executor": self.name})
+        submit_time = time.time()
+        wait_times = []
+
+        def task():
+            wait_time = time.time() - submit_time
+            with self._lock:
+                self._queued -= 1
+                self._active += 1
+                self._total_wait_time += wait_time
+                self._max_wait_time = max(self._max_wait_time, wait_time)
+            wait_times.append(wait_time)
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._lock:
+                    self._active -= 1
+                    self._completed += 1
+
+        future = self._executor.submit(task)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # The call never started, so it still counts as queued
+            if future.cancel():
+                with self._lock:
+                    self._queued -= 1
+            raise
+        finally:
+            if wait_times:
+                metrics_service.record_metric("executor_wait_time", wait_times[0], {"executor": self.name})
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get queue depth, utilization and wait time statistics"""
+        with self._lock:
+            started = self._completed + self._active
+            return {
+                "name": self.name,
+                "max_workers": self.max_workers,
+                "max_queue_size": self.max_queue_size,
+                "queue_depth": self._queued,
+                "active": self._active,
+                "completed": self._completed,
+                "rejected": self._rejected,
+                "average_wait_time": self._total_wait_time / started if started else 0.0,
+                "max_wait_time": self._max_wait_time
+            }
+
+    def shutdown(self, wait: bool = True):
+        """Stop accepting work and release the worker threads"""
+        self._executor.shutdown(wait=wait)
+
+# Global executor for blocking pipeline calls
+pipeline_executor = PipelineExecutor(
+    max_workers=int(os.environ.get("PIPELINE_EXECUTOR_WORKERS", 8)),
+    max_queue_size=int(os.environ.get("PIPELINE_EXECUTOR_QUEUE_SIZE", 64))
+)
@@ -1,7 +1,16 @@
 from pydantic import BaseModel
-from typing import Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple
+from concurrent.futures import Future
 import asyncio
-from ml.ssrl.framework import SSRLFramework, FeedbackEvent
+import numpy as np
+import os
+import sys
+import threading
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+from ml.ssrl.framework import SSRLFramework, RANKING_FEATURES
+from services.feedback_log import FeedbackLog, feedback_log
+from services.feedback_scheduler import FeedbackScheduler
 import time
 
 class FeedbackData(BaseModel):
@@ -11,31 +20,83 @@ class FeedbackData(BaseModel):
     user_id: str
     feedback_type: str  # "click", "like", "dislike", "skip"
     timestamp: float
+    source: Optional[str] = None  # Source of the result (its "source" field)
+    features: Optional[Dict[str, float]] = None  # Its ranking features (its "features" field)
+
+def feature_vector(features: Optional[Dict[str, float]]) -> Tuple[float, ...]:
+    """A result's ranking features as logged: values in RANKING_FEATURES order, () if unknown"""
+    if not features:
+        return ()
+    return tuple(float(features.get(name, 0.0)) for name in RANKING_FEATURES)
+
+def log_event(feedback: Dict[str, Any]) -> Dict[str, Any]:
+    """Feedback fields in the form the feedback log stores them"""
+    return {**feedback, "features": feature_vector(feedback.get("features"))}
 
 class FeedbackService:
     """Service for handling real-time user feedback"""
     
-    def __init__(self):
-        self.ssrl_framework = SSRLFramework()
-        self.feedback_queue: List[FeedbackData] = []
-        
-    def record_feedback(self, feedback: FeedbackData):
-        """Record user feedback"""
-        self.feedback_queue.append(feedback)
-        
-        # Convert to SSRL feedback event
-        feedback_value = self._convert_feedback_type_to_value(feedback.feedback_type)
-        ssrl_feedback = FeedbackEvent(
-            query=feedback.query,
-            result_id=feedback.result_id,
-            user_id=feedback.user_id,
-            feedback=feedback_value,
-            timestamp=feedback.timestamp
+    def __init__(self, log: Optional[FeedbackLog] = None, checkpoint_dir: Optional[str] = None):
+        self.ssrl_framework = SSRLFramework(
+            checkpoint_dir=checkpoint_dir or os.environ.get("SSRL_CHECKPOINT_DIR", "ssrl_checkpoints")
+        )
+        # Feedback is queued in the durable log; processed_seq is this service's read position.
+        # It resumes from the position saved with the learners' checkpoint, so events logged but
+        # not yet learned from before a restart are processed after it.
+        self.log = log or feedback_log
+        self.processed_seq = min(self.ssrl_framework.feedback_seq, self.log.committed_seq)
+        self._cursor = self.log.cursor(self.processed_seq)
+        self._process_lock = threading.Lock()
+        self.scheduler = FeedbackScheduler(
+            self,
+            batch_size=int(os.environ.get("FEEDBACK_BATCH_SIZE", 10000)),
+            max_interval=float(os.environ.get("FEEDBACK_BATCH_INTERVAL", 1.0)),
+            max_lag=int(os.environ.get("FEEDBACK_MAX_LAG", 1_000_000))
         )
         
-        # Record in SSRL framework
-        self.ssrl_framework.record_feedback(ssrl_feedback)
+    def record_feedback(self, feedback: FeedbackData) -> Future:
+        """
+        Record user feedback; the returned future resolves once it is durable.
+        Raises FeedbackBackpressureError when learners are too far behind.
+        """
+        self.scheduler.admit(1)
+        return self.log.submit([log_event(feedback.dict())])
+
+    def lag(self) -> int:
+        """Durable feedback events not yet learned from"""
+        return max(0, self.log.committed_seq - self.processed_seq)
+
+    def process_pending(self, max_events: int = 10000) -> Dict:
+        """Feed up to max_events logged events to the SSRL learners, oldest first"""
+        with self._process_lock:
+            committed_seq = self.log.committed_seq
+            if committed_seq <= self.processed_seq:
+                return {}
+            records = self._cursor.read(max_events)
+            if not records:
+                # The pending range was removed by log retention
+                self.processed_seq = self.ssrl_framework.feedback_seq = committed_seq
+                return {}
+            values = np.fromiter((self._convert_feedback_type_to_value(record.feedback_type) for record in records),
+                                 dtype=np.float64, count=len(records))
+            # The result's source and features decide which learned parameters each event moves
+            updates = self.ssrl_framework.process_feedback_values(
+                values, [record.user_id for record in records], last_seq=records[-1].seq,
+                sources=[record.source for record in records],
+                features=[record.features for record in records]
+            )
+            self.processed_seq = records[-1].seq
+            return {
+                "processed_count": len(records),
+                "agent_updates": updates
+            }
         
+    def close(self):
+        """Stop background processing and checkpoint the learners with their log position"""
+        self.scheduler.stop()
+        with self._process_lock:
+            self.ssrl_framework.checkpoint()
+
     def _convert_feedback_type_to_value(self, feedback_type: str) -> float:
         """Convert feedback type to numerical value"""
         feedback_map = {
@@ -47,25 +108,18 @@ class FeedbackService:
         return feedback_map.get(feedback_type, 0.0)
         
     async def process_feedback_batch(self):
-        """Process a batch of feedback for learning"""
-        if not self.feedback_queue:
-            return {}
-            
-        # Process feedback in SSRL framework
-        updates = self.ssrl_framework.process_feedback_batch()
-        
-        # Clear processed feedback
-        processed_count = len(self.feedback_queue)
-        self.feedback_queue.clear()
-        
-        return {
-            "processed_count": processed_count,
-            "agent_updates": updates
-        }
+        """Process a batch of feedback for learning (normally done by the background scheduler)"""
+        return await asyncio.get_running_loop().run_in_executor(None, self.scheduler.run_once)
         
     def get_recent_feedback(self, limit: int = 10) -> List[FeedbackData]:
         """Get recent feedback entries"""
-        return self.feedback_queue[-limit:]
+        return [
+            FeedbackData(query=record.query, result_id=record.result_id, user_id=record.user_id,
+                         feedback_type=record.feedback_type, timestamp=record.timestamp,
+                         source=record.source or None,
+                         features=dict(zip(RANKING_FEATURES, record.features)) or None)
+            for record in self.log.recent(limit)
+        ]
 
 # Global instance of the feedback service
 feedback_service = FeedbackService()
\ No newline at end of file
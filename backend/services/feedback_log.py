@@ -0,0 +1,403 @@
+from collections import deque
+from concurrent.futures import Future
+from typing import Dict, Any, List, Iterator, NamedTuple, Optional, Tuple
+import atexit
+import mmap
+import os
+import queue
+import struct
+import threading
+import time
+import weakref
+import zlib
+
+# Frame: payload length and CRC32 of the payload. Payload: header followed by the UTF-8 strings,
+# then optionally the result's source and feature values (records written before they existed
+# end after the strings).
+_FRAME = struct.Struct("<II")
+_HEADER = struct.Struct("<QdHHHB")
+_EXTENSION = struct.Struct("<BB")
+_MAX_FIELD = 0xFFFF
+_MAX_TYPE = 0xFF
+
+class FeedbackRecord(NamedTuple):
+    seq: int
+    timestamp: float
+    user_id: str
+    query: str
+    result_id: str
+    feedback_type: str
+    source: str = ""
+    features: Tuple[float, ...] = ()
+
+def encode_record(record: FeedbackRecord) -> bytes:
+    """Binary frame for one record; over-long fields are truncated"""
+    user_id = record.user_id.encode("utf-8")[:_MAX_FIELD]
+    query = record.query.encode("utf-8")[:_MAX_FIELD]
+    result_id = record.result_id.encode("utf-8")[:_MAX_FIELD]
+    feedback_type = record.feedback_type.encode("utf-8")[:_MAX_TYPE]
+    parts = [
+        _HEADER.pack(record.seq, record.timestamp, len(user_id), len(query), len(result_id), len(feedback_type)),
+        user_id, query, result_id, feedback_type
+    ]
+    if record.source or record.features:
+        source = record.source.encode("utf-8")[:_MAX_TYPE]
+        features = record.features[:_MAX_TYPE]
+        parts += [_EXTENSION.pack(len(source), len(features)), source,
+                  struct.pack(f"<{len(features)}f", *features)]
+    payload = b"".join(parts)
+    return _FRAME.pack(len(payload), zlib.crc32(payload)) + payload
+
+def decode_records(buffer, start: int = 0, end: Optional[int] = None) -> Iterator[Tuple[FeedbackRecord, int]]:
+    """Yield (record, offset after it) from a buffer; stops at a torn or corrupt frame"""
+    end = len(buffer) if end is None else end
+    offset = start
+    while offset + _FRAME.size <= end:
+        length, checksum = _FRAME.unpack_from(buffer, offset)
+        payload_start = offset + _FRAME.size
+        payload_end = payload_start + length
+        if length < _HEADER.size or payload_end > end:
+            return
+        payload = buffer[payload_start:payload_end]
+        if zlib.crc32(payload) != checksum:
+            return
+        seq, timestamp, user_len, query_len, result_len, type_len = _HEADER.unpack_from(payload)
+        fields = []
+        position = _HEADER.size
+        for size in (user_len, query_len, result_len, type_len):
+            fields.append(payload[position:position + size].decode("utf-8", "replace"))
+            position += size
+        if position + _EXTENSION.size <= length:
+            source_len, feature_count = _EXTENSION.unpack_from(payload, position)
+            position += _EXTENSION.size
+            fields.append(payload[position:position + source_len].decode("utf-8", "replace"))
+            position += source_len
+            fields.append(struct.unpack_from(f"<{feature_count}f", payload, position))
+        yield FeedbackRecord(seq, timestamp, *fields), payload_end
+        offset = payload_end
+
+class FeedbackLog:
+    """
+    Durable append-only feedback log split into segment files named by their first sequence number.
+    A writer thread group-commits everything queued while the previous fsync ran; readers map
+    segments with mmap. Old segments are deleted by total size and age, but only once every
+    open cursor has read past them.
+    """
+
+    def __init__(self, log_dir: str, max_segment_bytes: int = 64 * 1024 * 1024,
+                 retention_bytes: int = 1024 * 1024 * 1024, retention_seconds: Optional[float] = None,
+                 recent_capacity: int = 1000):
+        self.log_dir = log_dir
+        self.max_segment_bytes = max_segment_bytes
+        self.retention_bytes = retention_bytes
+        self.retention_seconds = retention_seconds
+        os.makedirs(log_dir, exist_ok=True)
+        self._recent: deque = deque(maxlen=recent_capacity)
+        self._lock = threading.Lock()
+        self._queue: "queue.Queue[Optional[Tuple[bytes, List[FeedbackRecord], Future]]]" = queue.Queue()
+        self._file = None
+        self._active_path: Optional[str] = None
+        self._committed_size = 0
+        self._cursors: "weakref.WeakSet[FeedbackLogCursor]" = weakref.WeakSet()
+        # Set when a failed write could not be rolled back; the log then refuses new events
+        self._failed: Optional[Exception] = None
+        self.last_seq = 0
+        self._recover()
+        self.committed_seq = self.last_seq
+        self.commit_count = 0
+        self.record_count = 0
+        self.failed_commit_count = 0
+        self.retention_deferred = 0
+        self._thread = threading.Thread(target=self._run, name="feedback-log", daemon=True)
+        self._thread.start()
+
+    def segments(self) -> List[str]:
+        """Segment paths in sequence order"""
+        names = sorted(name for name in os.listdir(self.log_dir) if name.endswith(".seg"))
+        return [os.path.join(self.log_dir, name) for name in names]
+
+    @staticmethod
+    def _first_seq(path: str) -> int:
+        return int(os.path.basename(path)[len("segment-"):-len(".seg")])
+
+    def _recover(self):
+        """Reopen the newest segment, dropping a torn tail left by a crash"""
+        segments = self.segments()
+        if not segments:
+            self._open_segment(1)
+            return
+        path = segments[-1]
+        self.last_seq = self._first_seq(path) - 1
+        valid_end = 0
+        for record, valid_end in self._scan(path):
+            self.last_seq = record.seq
+            self._recent.append(record)
+        with open(path, "r+b") as f:
+            f.truncate(valid_end)
+        self._file = open(path, "ab")
+        self._active_path = path
+        self._committed_size = valid_end
+
+    def _scan(self, path: str, limit: Optional[int] = None, start: int = 0) -> Iterator[Tuple[FeedbackRecord, int]]:
+        size = os.path.getsize(path) if limit is None else limit
+        if size <= start:
+            return
+        with open(path, "rb") as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+                yield from decode_records(buffer, start, min(size, len(buffer)))
+
+    def _open_segment(self, first_seq: int):
+        if self._file is not None:
+            self._file.close()
+        path = os.path.join(self.log_dir, f"segment-{first_seq:016d}.seg")
+        self._file = open(path, "ab")
+        with self._lock:
+            self._active_path = path
+            self._committed_size = self._file.tell()
+
+    def submit(self, events: List[Dict[str, Any]]) -> Future:
+        """
+        Queue events (query, result_id, user_id, feedback_type, optional timestamp, source and
+        features) and return a future resolving to the last assigned sequence number once they
+        are fsynced
+        """
+        future: Future = Future()
+        if not events:
+            future.set_result(self.last_seq)
+            return future
+        now = time.time()
+        with self._lock:
+            if self._failed is not None:
+                future.set_exception(IOError(f"Feedback log is unavailable after a failed write: {self._failed}"))
+                return future
+            first_seq = self.last_seq + 1
+            self.last_seq += len(events)
+            records = [
+                FeedbackRecord(first_seq + i, float(event.get("timestamp") or now), str(event["user_id"]),
+                               str(event["query"]), str(event["result_id"]), str(event["feedback_type"]),
+                               str(event.get("source") or ""),
+                               tuple(float(value) for value in event.get("features") or ()))
+                for i, event in enumerate(events)
+            ]
+            # Enqueue under the lock so the writer sees batches in sequence order
+            self._queue.put((b"".join(encode_record(record) for record in records), records, future))
+        return future
+
+    def append(self, events: List[Dict[str, Any]]) -> int:
+        """Write events and wait until they are durable"""
+        return self.submit(events).result()
+
+    def _run(self):
+        stopping = False
+        while not stopping:
+            item = self._queue.get()
+            batch = []
+            # Group commit: take everything that queued up while the last fsync was running
+            while True:
+                if item is None:
+                    stopping = True
+                else:
+                    batch.append(item)
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+            if batch:
+                self._commit(batch)
+        if self._file is not None:
+            self._file.close()
+
+    def _commit(self, batch: List[Tuple[bytes, List[FeedbackRecord], Future]]):
+        if self._failed is not None:
+            for _, _, future in batch:
+                future.set_exception(IOError(f"Feedback log is unavailable after a failed write: {self._failed}"))
+            return
+        start_path, start_size = self._active_path, self._committed_size
+        try:
+            rotated = False
+            for data, records, _ in batch:
+                if self._file.tell() >= self.max_segment_bytes:
+                    self._file.flush()
+                    os.fsync(self._file.fileno())
+                    self._open_segment(records[0].seq)
+                    rotated = True
+                self._file.write(data)
+            self._file.flush()
+            os.fsync(self._file.fileno())
+        except Exception as e:
+            print(f"Error writing feedback log: {e}")
+            self.failed_commit_count += 1
+            self._rollback(start_path, start_size)
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        with self._lock:
+            self._committed_size = self._file.tell()
+            for _, records, _ in batch:
+                self._recent.extend(records)
+                self.record_count += len(records)
+            self.committed_seq = batch[-1][1][-1].seq
+            self.commit_count += 1
+        for _, records, future in batch:
+            future.set_result(records[-1].seq)
+        if rotated:
+            self.enforce_retention()
+
+    def _rollback(self, path: str, size: int):
+        """
+        Cut a failed batch off the log, so partial frames never sit in front of later records
+        (recovery stops at the first bad frame). If even that fails, stop accepting writes.
+        """
+        try:
+            try:
+                self._file.close()
+            except Exception:
+                pass  # Flushing the failed write's buffer may fail again; it is truncated below
+            for segment in self.segments():
+                if segment > path:
+                    os.remove(segment)  # Segments the failed batch rotated into
+            with open(path, "r+b") as f:
+                f.truncate(size)
+                os.fsync(f.fileno())
+            self._file = open(path, "ab")
+            with self._lock:
+                self._active_path = path
+                self._committed_size = size
+        except Exception as e:
+            print(f"Error rolling back feedback log, refusing further writes: {e}")
+            with self._lock:
+                self._failed = e
+
+    def read(self, after_seq: int = 0) -> Iterator[FeedbackRecord]:
+        """Yield durable records with seq greater than after_seq, oldest first"""
+        with self._lock:
+            active_path, committed_size = self._active_path, self._committed_size
+        segments = self.segments()
+        for i, path in enumerate(segments):
+            # Skip segments that end before the requested position
+            if i + 1 < len(segments) and self._first_seq(segments[i + 1]) <= after_seq + 1:
+                continue
+            limit = committed_size if path == active_path else None
+            try:
+                for record, _ in self._scan(path, limit):
+                    if record.seq > after_seq:
+                        yield record
+            except FileNotFoundError:
+                continue  # Removed by retention while we were reading
+
+    def cursor(self, after_seq: int = 0) -> "FeedbackLogCursor":
+        """
+        Incremental reader positioned after after_seq. Retention keeps every segment the cursor
+        has not read past for as long as the cursor is alive.
+        """
+        cursor = FeedbackLogCursor(self, after_seq)
+        with self._lock:
+            self._cursors.add(cursor)
+        return cursor
+
+    def recent(self, limit: int = 10) -> List[FeedbackRecord]:
+        """Most recent durable records, oldest first"""
+        with self._lock:
+            return list(self._recent)[-limit:] if limit > 0 else []
+
+    def enforce_retention(self):
+        """
+        Delete the oldest closed segments beyond the size or age limit that every cursor has
+        read past. Segments kept only for a lagging cursor are counted in retention_deferred.
+        """
+        with self._lock:
+            active_path = self._active_path
+            consumed_seq = min((cursor.seq for cursor in self._cursors), default=None)
+        segments = self.segments()
+        total = sum(os.path.getsize(path) for path in segments)
+        now = time.time()
+        deferred = 0
+        for i, path in enumerate(segments):
+            if path == active_path:
+                break
+            expired = self.retention_seconds is not None and now - os.path.getmtime(path) > self.retention_seconds
+            if total <= self.retention_bytes and not expired:
+                break
+            # A closed segment ends just before the next one starts
+            if consumed_seq is not None and self._first_seq(segments[i + 1]) - 1 > consumed_seq:
+                deferred = sum(1 for segment in segments[i:] if segment != active_path)
+                break
+            total -= os.path.getsize(path)
+            os.remove(path)
+        self.retention_deferred = deferred
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get sequence positions, segment usage and group commit sizes"""
+        segments = self.segments()
+        return {
+            "last_seq": self.last_seq,
+            "committed_seq": self.committed_seq,
+            "segments": len(segments),
+            "bytes": sum(os.path.getsize(path) for path in segments),
+            "commits": self.commit_count,
+            "average_commit_size": self.record_count / self.commit_count if self.commit_count else 0.0,
+            "failed_commits": self.failed_commit_count,
+            "retention_deferred_segments": self.retention_deferred,
+            "writable": self._failed is None,
+            "queued": self._queue.qsize()
+        }
+
+    def close(self, timeout: float = 10.0):
+        """Write everything queued and stop the writer"""
+        if self._thread.is_alive():
+            self._queue.put(None)
+            self._thread.join(timeout)
+
+class FeedbackLogCursor:
+    """Reads a FeedbackLog in order, remembering its segment and byte offset between reads"""
+
+    def __init__(self, log: FeedbackLog, after_seq: int = 0):
+        self.log = log
+        self.seq = after_seq
+        self._path: Optional[str] = None
+        self._offset = 0
+
+    def _locate(self, segments: List[str]):
+        """Position at the start of the segment holding seq + 1"""
+        self._path = segments[0]
+        for path in segments:
+            if FeedbackLog._first_seq(path) <= self.seq + 1:
+                self._path = path
+        self._offset = 0
+
+    def read(self, max_records: int) -> List[FeedbackRecord]:
+        """Up to max_records durable records after the last one returned"""
+        with self.log._lock:
+            active_path, committed_size = self.log._active_path, self.log._committed_size
+        segments = self.log.segments()
+        if not segments:
+            return []
+        if self._path not in segments:
+            # First read, or the segment was deleted by retention
+            self._locate(segments)
+        records: List[FeedbackRecord] = []
+        for path in segments[segments.index(self._path):]:
+            if path != self._path:
+                self._path, self._offset = path, 0
+            limit = committed_size if path == active_path else None
+            try:
+                for record, end in self.log._scan(path, limit, self._offset):
+                    self._offset = end
+                    if record.seq > self.seq:
+                        records.append(record)
+                        self.seq = record.seq
+                        if len(records) >= max_records:
+                            return records
+            except FileNotFoundError:
+                continue
+            if path == active_path:
+                break
+        return records
+
+# Global instance of the feedback log
+feedback_log = FeedbackLog(
+    os.environ.get("FEEDBACK_LOG_DIR", "feedback_log"),
+    retention_bytes=int(os.environ.get("FEEDBACK_LOG_RETENTION_MB", 1024)) * 1024 * 1024
+)
+atexit.register(feedback_log.close)
@@ -0,0 +1,112 @@
+from typing import Dict, Any, Optional
+import threading
+import time
+from services.metrics import metrics_service
+
+class FeedbackBackpressureError(Exception):
+    """Raised when learners are too far behind to accept more feedback"""
+
+    def __init__(self, lag: int, retry_after: float):
+        super().__init__(f"Feedback processing is {lag} events behind")
+        self.lag = lag
+        self.retry_after = retry_after
+
+class FeedbackScheduler:
+    """
+    Background thread that feeds logged feedback to the learners when `batch_size` events are
+    pending or `max_interval` seconds have passed, whichever comes first. Lag is the number of
+    durable events not yet learned from; admission is refused once it exceeds `max_lag`.
+    """
+
+    def __init__(self, service, batch_size: int = 10000, max_interval: float = 1.0, max_lag: int = 1_000_000):
+        self.service = service
+        self.batch_size = batch_size
+        self.max_interval = max_interval
+        self.max_lag = max_lag
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batch_count = 0
+        self.processed_count = 0
+        self.shed_count = 0
+        self.last_batch_time = 0.0
+        self.last_batch_events = 0
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stopped.clear()
+                self._thread = threading.Thread(target=self._run, name="feedback-scheduler", daemon=True)
+                self._thread.start()
+
+    def lag(self) -> int:
+        return self.service.lag()
+
+    def admit(self, count: int = 1):
+        """Check that `count` more events may be accepted; raises FeedbackBackpressureError if not"""
+        lag = self.lag()
+        if lag + count > self.max_lag:
+            self.shed_count += count
+            metrics_service.record_metric("feedback_shed", float(count))
+            # Estimate how long the backlog takes to drain from recent throughput
+            if self.last_batch_time and self.last_batch_events:
+                rate = self.last_batch_events / self.last_batch_time
+            else:
+                rate = self.batch_size
+            raise FeedbackBackpressureError(lag, retry_after=max(1.0, (lag + count - self.max_lag) / rate))
+        if lag + count >= self.batch_size:
+            self._wakeup.set()
+
+    def notify(self):
+        """Wake the scheduler early, e.g. after a bulk write"""
+        if self.lag() >= self.batch_size:
+            self._wakeup.set()
+
+    def run_once(self) -> Dict[str, Any]:
+        """Process up to one batch of pending feedback now"""
+        lag = self.lag()
+        metrics_service.record_metric("feedback_lag", float(lag))
+        if lag <= 0:
+            return {}
+        start_time = time.time()
+        result = self.service.process_pending(self.batch_size)
+        elapsed = time.time() - start_time
+        processed = result.get("processed_count", 0)
+        if processed:
+            self.batch_count += 1
+            self.processed_count += processed
+            self.last_batch_time = elapsed
+            self.last_batch_events = processed
+            metrics_service.record_metric("feedback_batch_size", float(processed))
+            metrics_service.observe_latency("feedback_processing", elapsed)
+        return result
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.max_interval)
+            self._wakeup.clear()
+            try:
+                # Keep draining full batches while behind instead of waiting for the next tick
+                while not self._stopped.is_set() and self.run_once().get("processed_count", 0) >= self.batch_size:
+                    pass
+            except Exception as e:
+                print(f"Error processing feedback: {e}")
+
+    def stop(self, timeout: float = 10.0):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get lag, batch and load-shedding counters"""
+        return {
+            "lag": self.lag(),
+            "max_lag": self.max_lag,
+            "batches": self.batch_count,
+            "processed": self.processed_count,
+            "average_batch_size": self.processed_count / self.batch_count if self.batch_count else 0.0,
+            "last_batch_seconds": self.last_batch_time,
+            "shed": self.shed_count
+        }
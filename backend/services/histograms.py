@@ -0,0 +1,162 @@
+from array import array
+from bisect import bisect_left
+from typing import Dict, Any, List, Optional, Sequence, Tuple
+import math
+import threading
+
+# Bucket boundaries (seconds) exported to Prometheus-style scrapers
+EXPORT_BOUNDS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0]
+
+class LatencyHistogram:
+    """
+    Log-bucketed latency histogram with fixed memory and bounded relative error, plus exact
+    counts for the `export_bounds` used in histogram exposition.
+    Histograms with the same bucket layout can be merged by adding counts.
+    """
+
+    def __init__(self, min_value: float = 1e-6, max_value: float = 600.0, buckets_per_octave: int = 8,
+                 export_bounds: Sequence[float] = EXPORT_BOUNDS):
+        self.min_value = min_value
+        self.max_value = max_value
+        self.buckets_per_octave = buckets_per_octave
+        self._log_growth = math.log(2.0) / buckets_per_octave
+        # Bucket 0 holds values <= min_value, the last bucket holds values > max_value
+        self.bucket_count = int(math.ceil(math.log(max_value / min_value) / self._log_growth)) + 2
+        self.counts = array('q', [0]) * self.bucket_count
+        # Observations in (previous bound, bound]; the last slot holds those above every bound
+        self.export_bounds = tuple(sorted(export_bounds))
+        self.export_counts = array('q', [0]) * (len(self.export_bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.min_seen = math.inf
+        self.max_seen = 0.0
+        self._lock = threading.Lock()
+
+    def _index(self, value: float) -> int:
+        if value <= self.min_value:
+            return 0
+        index = int(math.ceil(math.log(value / self.min_value) / self._log_growth))
+        return min(index, self.bucket_count - 1)
+
+    def upper_bound(self, index: int) -> float:
+        """Largest value that falls in a bucket"""
+        if index >= self.bucket_count - 1:
+            return math.inf
+        return self.min_value * math.exp(index * self._log_growth)
+
+    def record(self, value: float):
+        """Add one observation (seconds)"""
+        value = max(0.0, value)
+        with self._lock:
+            self.counts[self._index(value)] += 1
+            self.export_counts[bisect_left(self.export_bounds, value)] += 1
+            self.count += 1
+            self.total += value
+            self.min_seen = min(self.min_seen, value)
+            self.max_seen = max(self.max_seen, value)
+
+    def merge(self, other: "LatencyHistogram"):
+        """Add another histogram's observations to this one"""
+        if (other.min_value, other.max_value, other.buckets_per_octave, other.export_bounds) != \
+                (self.min_value, self.max_value, self.buckets_per_octave, self.export_bounds):
+            raise ValueError("Cannot merge histograms with different bucket layouts")
+        with self._lock:
+            for i, bucket in enumerate(other.counts):
+                self.counts[i] += bucket
+            for i, bucket in enumerate(other.export_counts):
+                self.export_counts[i] += bucket
+            self.count += other.count
+            self.total += other.total
+            self.min_seen = min(self.min_seen, other.min_seen)
+            self.max_seen = max(self.max_seen, other.max_seen)
+
+    def quantile(self, q: float) -> float:
+        """Approximate quantile (0 < q <= 1); never above the largest observed value"""
+        if self.count == 0:
+            return 0.0
+        rank = max(1, int(math.ceil(q * self.count)))
+        cumulative = 0
+        for i, bucket in enumerate(self.counts):
+            cumulative += bucket
+            if cumulative >= rank:
+                return min(self.upper_bound(i), self.max_seen)
+        return self.max_seen
+
+    def cumulative_counts(self, bounds: Optional[Sequence[float]] = None) -> List[int]:
+        """
+        Exact number of observations at or below each export bound, for histogram exposition.
+        Only the bounds counted at record time can be exported; they never decrease between calls.
+        """
+        if bounds is not None and tuple(bounds) != self.export_bounds:
+            raise ValueError("Bounds must match the histogram's export_bounds")
+        result = []
+        cumulative = 0
+        for bucket in self.export_counts[:-1]:
+            cumulative += bucket
+            result.append(cumulative)
+        return result
+
+    def summary(self) -> Dict[str, float]:
+        """Count, mean and tail percentiles"""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "p50": self.quantile(0.50),
+            "p95": self.quantile(0.95),
+            "p99": self.quantile(0.99),
+            "max": self.max_seen
+        }
+
+def _format_labels(labels: Tuple[Tuple[str, str], ...], extra: Optional[Tuple[str, str]] = None) -> str:
+    items = list(labels) + ([extra] if extra else [])
+    if not items:
+        return ""
+    escaped = [
+        '{}="{}"'.format(key, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+        for key, value in items
+    ]
+    return "{" + ",".join(escaped) + "}"
+
+class HistogramRegistry:
+    """Latency histograms keyed by metric name and label set"""
+
+    def __init__(self):
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], LatencyHistogram] = {}
+        self._lock = threading.Lock()
+
+    def get(self, name: str, labels: Optional[Dict[str, str]] = None) -> LatencyHistogram:
+        """Get or create the histogram for a name and label set"""
+        key = (name, tuple(sorted((labels or {}).items())))
+        histogram = self._histograms.get(key)
+        if histogram is None:
+            with self._lock:
+                histogram = self._histograms.setdefault(key, LatencyHistogram())
+        return histogram
+
+    def observe(self, name: str, seconds: float, labels: Optional[Dict[str, str]] = None):
+        """Record a latency observation"""
+        self.get(name, labels).record(seconds)
+
+    def summary(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Percentile summary of every histogram, grouped by name"""
+        result: Dict[str, List[Dict[str, Any]]] = {}
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            result.setdefault(name, []).append({"labels": dict(labels), **histogram.summary()})
+        return result
+
+    def render_prometheus(self, prefix: str = "ysearch_") -> str:
+        """Render all histograms in the Prometheus text exposition format"""
+        lines: List[str] = []
+        seen_names = set()
+        for (name, labels), histogram in sorted(self._histograms.items()):
+            metric = f"{prefix}{name}_seconds"
+            if metric not in seen_names:
+                seen_names.add(metric)
+                lines.append(f"# HELP {metric} Latency of {name.replace('_', ' ')} in seconds")
+                lines.append(f"# TYPE {metric} histogram")
+            for bound, cumulative in zip(histogram.export_bounds, histogram.cumulative_counts()):
+                lines.append(f"{metric}_bucket{_format_labels(labels, ('le', repr(bound)))} {cumulative}")
+            lines.append(f"{metric}_bucket{_format_labels(labels, ('le', '+Inf'))} {histogram.count}")
+            lines.append(f"{metric}_sum{_format_labels(labels)} {histogram.total}")
+            lines.append(f"{metric}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
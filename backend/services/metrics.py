@@ -1,9 +1,14 @@
 from pydantic import BaseModel
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Deque
+from collections import deque
+import atexit
 import time
 import json
 import os
+import threading
 from datetime import datetime
+from services.metrics_log import SegmentedLog, BackgroundLogWriter
+from services.histograms import HistogramRegistry
 
 class MetricData(BaseModel):
     """Model for system metrics data"""
@@ -29,15 +34,28 @@ class AgentMetrics(BaseModel):
 class MetricsService:
     """Service for tracking and evaluating system metrics"""
     
-    def __init__(self, metrics_file: str = "metrics.json"):
+    def __init__(self, metrics_file: str = "metrics.json", log_dir: Optional[str] = None,
+                 buffer_size: int = 10000):
+        # metrics_file holds the compacted snapshot; updates since then live in the segmented log
         self.metrics_file = metrics_file
-        self.metrics_buffer: List[MetricData] = []
+        self.log_dir = log_dir or os.path.splitext(metrics_file)[0] + "_log"
+        self.metrics_buffer: Deque[MetricData] = deque(maxlen=buffer_size)
         self.search_metrics = SearchMetrics()
         self.agent_metrics: Dict[str, AgentMetrics] = {}
+        # In-memory latency distributions for tail percentiles and scraping
+        self.histograms = HistogramRegistry()
+        self._lock = threading.Lock()
+        self._seq = 0
         self._load_metrics()
+        self._writer = BackgroundLogWriter(
+            SegmentedLog(self.log_dir),
+            snapshot_path=self.metrics_file,
+            snapshot_fn=self._snapshot
+        )
+        atexit.register(self.close)
         
     def _load_metrics(self):
-        """Load metrics from file"""
+        """Recover metrics from the snapshot plus the log tail written after it"""
         if os.path.exists(self.metrics_file):
             try:
                 with open(self.metrics_file, 'r') as f:
@@ -51,21 +69,44 @@ class MetricsService:
                             agent_id: AgentMetrics(**metrics) 
                             for agent_id, metrics in data['agent_metrics'].items()
                         }
+                    self._seq = data.get('last_seq', 0)
             except Exception as e:
                 print(f"Error loading metrics: {e}")
+
+        if os.path.isdir(self.log_dir):
+            try:
+                for record in SegmentedLog(self.log_dir).replay(after_seq=self._seq):
+                    self._apply(record['op'], record['args'])
+                    self._seq = max(self._seq, record['seq'])
+            except Exception as e:
+                print(f"Error replaying metrics log: {e}")
                 
-    def _save_metrics(self):
-        """Save metrics to file"""
-        try:
-            data = {
+    def _snapshot(self) -> Dict[str, Any]:
+        """Consistent copy of the aggregate state for compaction"""
+        with self._lock:
+            return {
                 'search_metrics': self.search_metrics.dict(),
                 'agent_metrics': {agent_id: metrics.dict() for agent_id, metrics in self.agent_metrics.items()},
-                'last_updated': time.time()
+                'last_updated': time.time(),
+                'last_seq': self._seq
             }
-            with open(self.metrics_file, 'w') as f:
-                json.dump(data, f, indent=2)
-        except Exception as e:
-            print(f"Error saving metrics: {e}")
+
+    def _log(self, op: str, *args):
+        """Apply an update to the aggregates and queue it for the append-only log"""
+        with self._lock:
+            self._seq += 1
+            self._apply(op, list(args))
+            record = {'seq': self._seq, 'op': op, 'args': list(args)}
+        self._writer.append(record)
+
+    def _apply(self, op: str, args: List[Any]):
+        """Apply a logged update; shared by live recording and recovery"""
+        if op == 'search':
+            self._apply_search_query(*args)
+        elif op == 'agent':
+            self._apply_agent_processing(*args)
+        elif op == 'personalization':
+            self._apply_personalization(*args)
             
     def record_metric(self, metric_name: str, value: float, tags: Dict[str, str] = {}):
         """Record a metric"""
@@ -77,8 +118,19 @@ class MetricsService:
         )
         self.metrics_buffer.append(metric)
         
-    def record_search_query(self, response_time: float, success: bool = True):
+    def observe_latency(self, name: str, seconds: float, labels: Optional[Dict[str, str]] = None):
+        """Record a latency observation in the histogram for a name and label set"""
+        self.histograms.observe(name, seconds, labels)
+
+    def record_search_query(self, response_time: float, success: bool = True,
+                            labels: Optional[Dict[str, str]] = None):
         """Record search query metrics"""
+        self._log('search', response_time, success)
+        self.observe_latency("search", response_time, {**(labels or {}), "success": str(success)})
+        # Record the metric
+        self.record_metric("search_response_time", response_time, {"type": "search"})
+
+    def _apply_search_query(self, response_time: float, success: bool):
         self.search_metrics.query_count += 1
         
         # Update average response time
@@ -95,12 +147,19 @@ class MetricsService:
         else:
             current_success_count = self.search_metrics.success_rate * (query_count - 1) + 1
             self.search_metrics.success_rate = current_success_count / query_count
-            
-        # Record the metric
-        self.record_metric("search_response_time", response_time, {"type": "search"})
         
     def record_agent_processing(self, agent_id: str, processing_time: float, success: bool = True):
         """Record agent processing metrics"""
+        self._log('agent', agent_id, processing_time, success)
+        self.observe_latency("agent_processing", processing_time, {"agent_id": agent_id})
+        # Record the metric
+        self.record_metric(
+            "agent_processing_time", 
+            processing_time, 
+            {"agent_id": agent_id, "success": str(success)}
+        )
+
+    def _apply_agent_processing(self, agent_id: str, processing_time: float, success: bool):
         if agent_id not in self.agent_metrics:
             self.agent_metrics[agent_id] = AgentMetrics(agent_id=agent_id)
             
@@ -117,40 +176,54 @@ class MetricsService:
         # Update error count
         if not success:
             agent_metric.error_count += 1
-            
-        # Record the metric
-        self.record_metric(
-            "agent_processing_time", 
-            processing_time, 
-            {"agent_id": agent_id, "success": str(success)}
-        )
         
     def record_personalization(self, personalized: bool):
         """Record personalization metrics"""
         if personalized:
-            # Update personalization rate
-            current_rate = self.search_metrics.personalization_rate
-            query_count = self.search_metrics.query_count
-            if query_count > 0:
-                self.search_metrics.personalization_rate = (
-                    (current_rate * (query_count - 1) + 1) / query_count
-                )
-                
+            self._log('personalization', personalized)
         self.record_metric("personalization_used", 1.0 if personalized else 0.0)
+
+    def _apply_personalization(self, personalized: bool):
+        # Update personalization rate
+        current_rate = self.search_metrics.personalization_rate
+        query_count = self.search_metrics.query_count
+        if query_count > 0:
+            self.search_metrics.personalization_rate = (
+                (current_rate * (query_count - 1) + 1) / query_count
+            )
         
     def get_metrics_summary(self) -> Dict[str, Any]:
         """Get a summary of all metrics"""
         return {
             "search_metrics": self.search_metrics.dict(),
             "agent_metrics": {agent_id: metrics.dict() for agent_id, metrics in self.agent_metrics.items()},
+            "latency": self.histograms.summary(),
             "buffer_size": len(self.metrics_buffer),
+            "persisted_updates": self._writer.written_count,
             "last_updated": datetime.now().isoformat()
         }
         
+    def render_prometheus(self) -> str:
+        """Text exposition of counters and latency histograms for standard scrapers"""
+        lines = [
+            "# TYPE ysearch_search_queries_total counter",
+            f"ysearch_search_queries_total {self.search_metrics.query_count}",
+            "# TYPE ysearch_search_success_rate gauge",
+            f"ysearch_search_success_rate {self.search_metrics.success_rate}",
+            "# TYPE ysearch_agent_errors_total counter"
+        ]
+        for agent_id, metrics in sorted(self.agent_metrics.items()):
+            lines.append(f'ysearch_agent_errors_total{{agent_id="{agent_id}"}} {metrics.error_count}')
+        return "\n".join(lines) + "\n" + self.histograms.render_prometheus()
+
     def flush_metrics(self):
-        """Flush metrics to persistent storage"""
-        self._save_metrics()
+        """Ask the background writer to persist queued updates now (does not block)"""
+        self._writer.request_flush()
         self.metrics_buffer.clear()
 
+    def close(self):
+        """Persist everything and write a final snapshot"""
+        self._writer.close()
+
 # Global instance of the metrics service
 metrics_service = MetricsService()
\ No newline at end of file
@@ -0,0 +1,179 @@
+from typing import Dict, Any, List, Callable, Iterator, Optional
+import json
+import os
+import queue
+import tempfile
+import threading
+import time
+
+class SegmentedLog:
+    """
+    Append-only log of JSON records split into segment files named by their first sequence number
+    """
+
+    def __init__(self, log_dir: str, max_segment_bytes: int = 4 * 1024 * 1024):
+        self.log_dir = log_dir
+        self.max_segment_bytes = max_segment_bytes
+        os.makedirs(log_dir, exist_ok=True)
+        self._file = None
+        self._file_size = 0
+
+    def segments(self) -> List[str]:
+        """Segment paths in sequence order"""
+        names = sorted(name for name in os.listdir(self.log_dir) if name.endswith(".log"))
+        return [os.path.join(self.log_dir, name) for name in names]
+
+    def append(self, records: List[Dict[str, Any]]):
+        """Write a batch of records (each with a "seq") to the active segment"""
+        if not records:
+            return
+        if self._file is None or self._file_size >= self.max_segment_bytes:
+            self.rotate(records[0]["seq"])
+        data = "".join(json.dumps(record, separators=(",", ":")) + "\n" for record in records)
+        self._file.write(data)
+        self._file.flush()
+        self._file_size += len(data)
+
+    def rotate(self, next_seq: int):
+        """Close the active segment and start a new one"""
+        self.close()
+        path = os.path.join(self.log_dir, f"segment-{next_seq:016d}.log")
+        self._file = open(path, "a")
+        self._file_size = self._file.tell()
+
+    def close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+
+    def replay(self, after_seq: int = 0) -> Iterator[Dict[str, Any]]:
+        """Yield records with seq greater than after_seq; a torn final line is skipped"""
+        for path in self.segments():
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        break
+                    if record.get("seq", 0) > after_seq:
+                        yield record
+
+    def truncate(self):
+        """Delete every closed segment (their records are covered by a snapshot)"""
+        active = self._file.name if self._file is not None else None
+        for path in self.segments():
+            if path != active:
+                os.remove(path)
+
+def write_snapshot(path: str, data: Dict[str, Any]):
+    """Write a snapshot atomically (temp file, fsync, rename)"""
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w") as f:
+            json.dump(data, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+class BackgroundLogWriter:
+    """
+    Thread that batches records into a SegmentedLog by size or time and periodically compacts
+    the log into a snapshot produced by `snapshot_fn`
+    """
+
+    def __init__(self, log: SegmentedLog, snapshot_path: str, snapshot_fn: Callable[[], Dict[str, Any]],
+                 batch_size: int = 256, flush_interval: float = 1.0, compact_interval: float = 300.0):
+        self.log = log
+        self.snapshot_path = snapshot_path
+        self.snapshot_fn = snapshot_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.compact_interval = compact_interval
+        self._queue: "queue.Queue[Optional[Dict[str, Any]]]" = queue.Queue()
+        self._flush_requested = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="metrics-writer", daemon=True)
+        self.written_count = 0
+        self.compaction_count = 0
+        self._thread.start()
+
+    def append(self, record: Dict[str, Any]):
+        """Queue a record; never blocks on disk I/O"""
+        self._queue.put(record)
+
+    def request_flush(self):
+        """Ask the writer to write queued records now instead of waiting for the batch"""
+        self._flush_requested.set()
+
+    def _drain(self, first: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        batch = [first] if first is not None else []
+        while True:
+            try:
+                record = self._queue.get_nowait()
+            except queue.Empty:
+                return batch
+            if record is not None:
+                batch.append(record)
+
+    def _run(self):
+        batch: List[Dict[str, Any]] = []
+        last_flush = time.time()
+        last_compaction = time.time()
+        while not self._stopped.is_set():
+            try:
+                record = self._queue.get(timeout=min(self.flush_interval, 0.1))
+                if record is not None:
+                    batch.append(record)
+            except queue.Empty:
+                pass
+
+            now = time.time()
+            flush_due = (len(batch) >= self.batch_size or now - last_flush >= self.flush_interval
+                         or self._flush_requested.is_set())
+            if flush_due:
+                self._flush_requested.clear()
+                self._write(batch + self._drain())
+                batch = []
+                last_flush = now
+
+            if now - last_compaction >= self.compact_interval:
+                self._write(batch + self._drain())
+                batch = []
+                self.compact()
+                last_compaction = now
+
+        self._write(batch + self._drain())
+        self.compact()
+        self.log.close()
+
+    def _write(self, batch: List[Dict[str, Any]]):
+        try:
+            self.log.append(batch)
+            self.written_count += len(batch)
+        except Exception as e:
+            print(f"Error writing metrics log: {e}")
+
+    def compact(self):
+        """Snapshot current state, then drop log segments the snapshot covers"""
+        try:
+            snapshot = self.snapshot_fn()
+            write_snapshot(self.snapshot_path, snapshot)
+            # Everything written so far has seq <= the snapshot's last_seq
+            self.log.rotate(snapshot["last_seq"] + 1)
+            self.log.truncate()
+            self.compaction_count += 1
+        except Exception as e:
+            print(f"Error compacting metrics log: {e}")
+
+    def close(self, timeout: float = 10.0):
+        """Write everything queued, compact and stop the thread"""
+        self._stopped.set()
+        self._queue.put(None)
+        self._thread.join(timeout)
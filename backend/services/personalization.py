@@ -1,7 +1,15 @@
 from pydantic import BaseModel
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Sequence, Tuple
+import atexit
+import numpy as np
 import json
 import os
+import threading
+import time
+from services.metrics import metrics_service
+from services.profile_cache import ProfileCache
+from services.profile_store import ProfileStore, WriteBehindFlusher
+from services.compact_profile import CompactProfile, result_interner
 
 class UserProfile(BaseModel):
     """User profile model for personalization"""
@@ -14,68 +22,115 @@ class UserProfile(BaseModel):
 class PersonalizationService:
     """Service for managing user personalization"""
     
-    def __init__(self, data_file: str = "user_profiles.json"):
+    def __init__(self, data_file: str = "user_profiles.json", db_file: str = "user_profiles.db",
+                 flush_interval: float = 1.0,
+                 cache_budget_bytes: int = int(os.environ.get("PROFILE_CACHE_MAX_MB", 256)) * 1024 * 1024):
+        # data_file is the legacy JSON store; it is imported once into the embedded store
         self.data_file = data_file
-        self.profiles: Dict[str, UserProfile] = self._load_profiles()
+        self.store = ProfileStore(db_file)
+        self._lock = threading.Lock()
+        self._migrate_legacy_profiles()
+        # Profiles are held compactly and loaded on first use; UserProfile models are built
+        # only at the API boundary
+        self.profiles = ProfileCache(self._load_profile, self._write_back, cache_budget_bytes)
+        self.flusher = WriteBehindFlusher(self.store, self._serialize_profile, flush_interval=flush_interval)
+        atexit.register(self.close)
         
-    def _load_profiles(self) -> Dict[str, UserProfile]:
-        """Load user profiles from file"""
-        if os.path.exists(self.data_file):
-            try:
-                with open(self.data_file, 'r') as f:
-                    data = json.load(f)
-                    return {user_id: UserProfile(**profile) for user_id, profile in data.items()}
-            except Exception:
-                return {}
-        return {}
-        
-    def _save_profiles(self):
-        """Save user profiles to file"""
+    def _migrate_legacy_profiles(self):
+        """Import profiles from the legacy JSON file into an empty store"""
+        if not os.path.exists(self.data_file) or self.store.count() > 0:
+            return
         try:
-            # Convert UserProfile objects to dictionaries
-            data = {user_id: profile.dict() for user_id, profile in self.profiles.items()}
-            with open(self.data_file, 'w') as f:
-                json.dump(data, f, indent=2)
+            with open(self.data_file, 'r') as f:
+                data = json.load(f)
+            self.store.save_many([
+                (user_id, UserProfile(**profile).dict()) for user_id, profile in data.items()
+            ])
         except Exception as e:
-            print(f"Error saving profiles: {e}")
+            print(f"Error migrating profiles: {e}")
+
+    def _load_profile(self, user_id: str) -> Optional[CompactProfile]:
+        """Fault one profile in, preferring a written-back copy the store does not have yet"""
+        start_time = time.time()
+        try:
+            data = self.flusher.pending_record(user_id) or self.store.load(user_id)
+        except Exception as e:
+            print(f"Error loading profile {user_id}: {e}")
+            return None
+        finally:
+            metrics_service.observe_latency("profile_load", time.time() - start_time)
+        return CompactProfile.from_dict(data) if data is not None else None
+
+    def _write_back(self, user_id: str, profile: CompactProfile):
+        """Keep unsaved changes of a profile evicted from the cache"""
+        if self.flusher.is_dirty(user_id):
+            self.flusher.stage_record(user_id, profile.to_dict())
+        
+    def _serialize_profile(self, user_id: str) -> Optional[Dict]:
+        """Snapshot one profile for the write-behind flusher"""
+        with self._lock:
+            profile = self.profiles.peek(user_id)
+            return profile.to_dict() if profile is not None else None
+
+    def _mark_dirty(self, user_id: str):
+        """Queue a modified profile for write-behind; called with the lock held"""
+        self.flusher.mark_dirty(user_id)
+        self.profiles.resize(user_id)
+
+    def flush(self):
+        """Write all modified profiles now"""
+        self.flusher.flush()
+
+    def close(self):
+        """Flush pending profile writes and stop the flusher"""
+        self.flusher.close()
+
+    def get_cache_stats(self):
+        """Profile cache occupancy and hit/miss counters"""
+        with self._lock:
+            return {**self.profiles.get_stats(), "pending_writes": self.flusher.pending()}
+
+    def _get_profile(self, user_id: str) -> CompactProfile:
+        # Callers hold the lock, so loads and evictions never race with a mutation
+        return self.profiles.get_or_create(user_id, lambda: CompactProfile(user_id))
             
+    def get_compact_profile(self, user_id: str) -> CompactProfile:
+        """Get or create the internal profile used on the request path"""
+        with self._lock:
+            return self._get_profile(user_id)
+
     def get_user_profile(self, user_id: str) -> UserProfile:
-        """Get or create user profile"""
-        if user_id not in self.profiles:
-            self.profiles[user_id] = UserProfile(user_id=user_id)
-        return self.profiles[user_id]
+        """Get or create user profile (API model, built from the compact profile)"""
+        with self._lock:
+            return UserProfile(**self._get_profile(user_id).to_dict())
         
     def update_preferences(self, user_id: str, preferences: Dict[str, float]):
         """Update user preferences"""
-        profile = self.get_user_profile(user_id)
-        profile.preferences.update(preferences)
-        self._save_profiles()
+        with self._lock:
+            self._get_profile(user_id).preferences.update(preferences)
+            self._mark_dirty(user_id)
         
     def add_search_history(self, user_id: str, query: str):
-        """Add search query to user history"""
-        profile = self.get_user_profile(user_id)
-        profile.search_history.append(query)
-        # Keep only the last 100 searches
-        profile.search_history = profile.search_history[-100:]
-        self._save_profiles()
+        """Add search query to user history (ring buffer keeps the last 100 searches)"""
+        with self._lock:
+            self._get_profile(user_id).add_search(query)
+            self._mark_dirty(user_id)
         
     def record_result_click(self, user_id: str, result_id: str):
-        """Record when user clicks on a search result"""
-        profile = self.get_user_profile(user_id)
-        profile.clicked_results.append(result_id)
-        # Keep only the last 1000 clicks
-        profile.clicked_results = profile.clicked_results[-1000:]
-        self._save_profiles()
+        """Record when user clicks on a search result (ring buffer keeps the last 1000 clicks)"""
+        with self._lock:
+            self._get_profile(user_id).add_click(result_id)
+            self._mark_dirty(user_id)
         
     def record_feedback(self, user_id: str, result_id: str, score: float):
         """Record user feedback for a result"""
-        profile = self.get_user_profile(user_id)
-        profile.feedback_scores[result_id] = score
-        self._save_profiles()
+        with self._lock:
+            self._get_profile(user_id).set_feedback(result_id, score)
+            self._mark_dirty(user_id)
         
     def get_personalized_score(self, user_id: str, base_score: float, result_id: str, categories: List[str]) -> float:
         """Calculate personalized score based on user profile"""
-        profile = self.get_user_profile(user_id)
+        profile = self.get_compact_profile(user_id)
         
         # Start with base score
         personalized_score = base_score
@@ -87,8 +142,8 @@ class PersonalizationService:
                 preference_boost += profile.preferences[category] * 0.1
                 
         # Adjust based on past feedback
-        if result_id in profile.feedback_scores:
-            feedback_multiplier = profile.feedback_scores[result_id]
+        feedback_multiplier = profile.get_feedback(result_id)
+        if feedback_multiplier is not None:
             personalized_score *= (1 + feedback_multiplier * 0.2)
             
         # Apply preference boost
@@ -99,5 +154,57 @@ class PersonalizationService:
         
         return personalized_score
 
+    def get_personalized_scores(self, user_id: str, base_scores: np.ndarray, result_ids: Sequence[str],
+                                category_matrix: np.ndarray, categories: List[str],
+                                profile: Optional[CompactProfile] = None) -> np.ndarray:
+        """
+        Vectorized get_personalized_score over a whole candidate set.
+        category_matrix[i, j] is 1 when result i belongs to categories[j].
+        """
+        profile = profile or self.get_compact_profile(user_id)
+        base_scores = np.asarray(base_scores, dtype=np.float64)
+
+        # Preference boost: one weight per category, summed over each result's categories
+        category_weights = np.array(
+            [profile.preferences.get(category, 0.0) * 0.1 for category in categories], dtype=np.float64
+        )
+        preference_boost = np.asarray(category_matrix, dtype=np.float64) @ category_weights
+
+        # Feedback multiplier: join interned result ids against the user's sorted feedback arrays
+        feedback_factor = np.ones(len(base_scores), dtype=np.float64)
+        # Copy under the lock: a zero-copy view would block concurrent feedback inserts
+        # (arrays exporting buffers cannot be resized)
+        with self._lock:
+            feedback_ids = np.array(profile.feedback_ids, dtype=np.int32)
+            feedback_values = np.array(profile.feedback_scores, dtype=np.float64)
+        if len(feedback_ids) and len(result_ids):
+            ids = np.fromiter((result_interner.lookup(result_id) for result_id in result_ids),
+                              dtype=np.int32, count=len(result_ids))
+            positions = np.minimum(np.searchsorted(feedback_ids, ids), len(feedback_ids) - 1)
+            matched = feedback_ids[positions] == ids
+            feedback_factor = np.where(matched, 1 + feedback_values[positions] * 0.2, 1.0)
+
+        return np.clip(base_scores * feedback_factor * (1 + preference_boost), 0.0, 1.0)
+
+    def rank_personalized(self, user_id: str, base_scores: np.ndarray, result_ids: Sequence[str],
+                          category_matrix: np.ndarray, categories: List[str],
+                          top_k: Optional[int] = None,
+                          profile: Optional[CompactProfile] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Score a candidate set and return (indices, scores) of the top_k results, best first
+        """
+        scores = self.get_personalized_scores(user_id, base_scores, result_ids, category_matrix,
+                                              categories, profile)
+        count = len(scores)
+        if top_k is not None and top_k <= 0:
+            indices = np.empty(0, dtype=np.int64)
+        elif top_k is None or top_k >= count:
+            indices = np.argsort(-scores, kind="stable")
+        else:
+            # Partial sort: select the top_k in O(n), then order only those
+            candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+            indices = candidates[np.argsort(-scores[candidates], kind="stable")]
+        return indices, scores[indices]
+
 # Global instance of the personalization service
 personalization_service = PersonalizationService()
\ No newline at end of file
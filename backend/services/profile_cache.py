@@ -0,0 +1,98 @@
+from collections import OrderedDict
+from typing import Dict, Any, Callable, Optional
+from services.compact_profile import CompactProfile, interned_bytes
+
+class ProfileCache:
+    """
+    LRU cache of compact profiles bounded by an estimated memory budget, which covers the
+    cached profiles and the interned strings they share.
+    Misses fault profiles in through `loader`; each evicted profile is passed to `on_evict`
+    so unsaved changes can be written back. Not thread-safe: the owner serializes access.
+    """
+
+    def __init__(self, loader: Callable[[str], Optional[CompactProfile]],
+                 on_evict: Callable[[str, CompactProfile], None],
+                 memory_budget_bytes: int = 256 * 1024 * 1024,
+                 shared_bytes: Callable[[], int] = interned_bytes):
+        self.loader = loader
+        self.on_evict = on_evict
+        self.memory_budget_bytes = memory_budget_bytes
+        self.shared_bytes = shared_bytes
+        self._entries: "OrderedDict[str, CompactProfile]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self.bytes_used = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, user_id: str) -> bool:
+        return user_id in self._entries
+
+    def peek(self, user_id: str) -> Optional[CompactProfile]:
+        """Cached profile without loading it or changing its recency"""
+        return self._entries.get(user_id)
+
+    def get(self, user_id: str) -> Optional[CompactProfile]:
+        """Cached profile, loading it on a miss; None if the user has no stored profile"""
+        profile = self._entries.get(user_id)
+        if profile is not None:
+            self.hits += 1
+            self._entries.move_to_end(user_id)
+            return profile
+        self.misses += 1
+        profile = self.loader(user_id)
+        if profile is not None:
+            self._insert(user_id, profile)
+        return profile
+
+    def get_or_create(self, user_id: str, factory: Callable[[], CompactProfile]) -> CompactProfile:
+        """Cached or stored profile, or a new one from `factory`"""
+        profile = self.get(user_id)
+        if profile is None:
+            profile = factory()
+            self._insert(user_id, profile)
+        return profile
+
+    def resize(self, user_id: str):
+        """Re-estimate a profile's size after it changed, evicting others if over budget"""
+        profile = self._entries.get(user_id)
+        if profile is None:
+            return
+        size = profile.estimated_size()
+        self.bytes_used += size - self._sizes[user_id]
+        self._sizes[user_id] = size
+        self._evict_over_budget()
+
+    def _insert(self, user_id: str, profile: CompactProfile):
+        size = profile.estimated_size()
+        self._entries[user_id] = profile
+        self._sizes[user_id] = size
+        self.bytes_used += size
+        self._evict_over_budget()
+
+    def _evict_over_budget(self):
+        # Always keep the most recently used profile, even if it alone exceeds the budget
+        while self.bytes_used + self.shared_bytes() > self.memory_budget_bytes and len(self._entries) > 1:
+            user_id, profile = self._entries.popitem(last=False)
+            self.bytes_used -= self._sizes.pop(user_id)
+            self.evictions += 1
+            self.on_evict(user_id, profile)
+            # Dropping the last reference releases its interned strings before the next check
+            del profile
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get occupancy and hit/miss counters"""
+        lookups = self.hits + self.misses
+        return {
+            "profiles": len(self._entries),
+            "bytes_used": self.bytes_used,
+            "shared_bytes": self.shared_bytes(),
+            "memory_budget_bytes": self.memory_budget_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions
+        }
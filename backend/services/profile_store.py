@@ -0,0 +1,144 @@
+from typing import Dict, Any, List, Optional, Callable, Iterator, Tuple
+import json
+import sqlite3
+import threading
+import time
+
+class ProfileStore:
+    """Embedded SQLite store (WAL mode) with one record per user profile"""
+
+    def __init__(self, path: str = "user_profiles.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS profiles ("
+            "user_id TEXT PRIMARY KEY, data TEXT NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def load(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Load one profile record"""
+        with self._lock:
+            row = self._conn.execute("SELECT data FROM profiles WHERE user_id = ?", (user_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def load_all(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """Iterate over every stored profile"""
+        with self._lock:
+            rows = self._conn.execute("SELECT user_id, data FROM profiles").fetchall()
+        for user_id, data in rows:
+            yield user_id, json.loads(data)
+
+    def save_many(self, records: List[Tuple[str, Dict[str, Any]]]):
+        """Upsert a batch of profiles in one transaction"""
+        if not records:
+            return
+        now = time.time()
+        rows = [(user_id, json.dumps(data), now) for user_id, data in records]
+        with self._lock:
+            with self._conn:
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO profiles (user_id, data, updated_at) VALUES (?, ?, ?)", rows
+                )
+
+    def count(self) -> int:
+        """Number of stored profiles"""
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM profiles").fetchone()[0]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+class WriteBehindFlusher:
+    """
+    Collects the ids of modified profiles and writes them to a ProfileStore in batches,
+    so a profile update costs O(1) on the request path regardless of user count
+    """
+
+    def __init__(self, store: ProfileStore, serialize: Callable[[str], Optional[Dict[str, Any]]],
+                 flush_interval: float = 1.0, max_batch: int = 500):
+        self.store = store
+        self.serialize = serialize
+        self.flush_interval = flush_interval
+        self.max_batch = max_batch
+        self._dirty: set = set()
+        # Serialized records of profiles evicted from memory before they were written
+        self._records: Dict[str, Dict[str, Any]] = {}
+        self._inflight: Dict[str, Dict[str, Any]] = {}
+        self._serializing: set = set()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self.flushed_count = 0
+        self._thread = threading.Thread(target=self._run, name="profile-flusher", daemon=True)
+        self._thread.start()
+
+    def mark_dirty(self, user_id: str):
+        """Schedule a profile to be written"""
+        with self._lock:
+            self._dirty.add(user_id)
+            if len(self._dirty) >= self.max_batch:
+                self._wakeup.set()
+
+    def stage_record(self, user_id: str, data: Dict[str, Any]):
+        """Hand over an already-serialized profile (e.g. one being evicted) for the next flush"""
+        with self._lock:
+            self._dirty.discard(user_id)
+            self._records[user_id] = data
+            if len(self._records) >= self.max_batch:
+                self._wakeup.set()
+
+    def is_dirty(self, user_id: str) -> bool:
+        """Whether a profile has changes not yet captured by a flush"""
+        return user_id in self._dirty or user_id in self._serializing
+
+    def pending_record(self, user_id: str) -> Optional[Dict[str, Any]]:
+        """Staged record not yet durable in the store; newer than what the store holds"""
+        with self._lock:
+            return self._records.get(user_id) or self._inflight.get(user_id)
+
+    def pending(self) -> int:
+        return len(self._dirty) + len(self._records)
+
+    def flush(self):
+        """Write all dirty and staged profiles now"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, set()
+            records, self._records = self._records, {}
+            self._inflight.update(records)
+            self._serializing = dirty
+        for user_id in dirty:
+            data = self.serialize(user_id)
+            if data is not None:
+                records[user_id] = data
+        self._serializing = set()
+        try:
+            self.store.save_many(list(records.items()))
+            self.flushed_count += len(records)
+            with self._lock:
+                for user_id in records:
+                    self._inflight.pop(user_id, None)
+        except Exception as e:
+            print(f"Error saving profiles: {e}")
+            with self._lock:
+                for user_id, data in records.items():
+                    self._inflight.pop(user_id, None)
+                    self._records.setdefault(user_id, data)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.wait(self.flush_interval)
+            self._wakeup.clear()
+            if self._dirty or self._records:
+                self.flush()
+
+    def close(self):
+        """Stop the flusher after writing everything still dirty"""
+        self._stopped.set()
+        self._wakeup.set()
+        self._thread.join()
+        self.flush()
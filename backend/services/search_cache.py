@@ -0,0 +1,165 @@
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Callable, Awaitable, Tuple
+import asyncio
+import json
+import os
+import re
+import threading
+import time
+from services.metrics import metrics_service
+
+def normalize_query(query: str) -> str:
+    """Normalize a query for cache and coalescing keys"""
+    return re.sub(r"\s+", " ", query.strip().lower())
+
+class InMemoryCacheBackend:
+    """In-process LRU backend; entries are stored as-is. Async only to share the Redis interface."""
+
+    def __init__(self, max_entries: int = 10000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    async def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            item = self._entries.get(key)
+            if item is None:
+                return None
+            expires_at, value = item
+            if expires_at <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    async def set(self, key: str, value: Any, ttl: float):
+        with self._lock:
+            self._entries[key] = (time.time() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    async def delete(self, key: str):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+class RedisCacheBackend:
+    """
+    Backend for any asyncio Redis-protocol client (redis.asyncio or a compatible stand-in), so
+    cache round trips never block the event loop.
+    LRU eviction is delegated to the server's maxmemory-policy (e.g. allkeys-lru).
+    """
+
+    def __init__(self, client, prefix: str = "ysearch:cache:"):
+        self.client = client
+        self.prefix = prefix
+
+    async def get(self, key: str) -> Optional[Any]:
+        raw = await self.client.get(self.prefix + key)
+        if raw is None:
+            return None
+        return json.loads(raw)
+
+    async def set(self, key: str, value: Any, ttl: float):
+        await self.client.set(self.prefix + key, json.dumps(value), px=max(1, int(ttl * 1000)))
+
+    async def delete(self, key: str):
+        await self.client.delete(self.prefix + key)
+
+class SearchResultCache:
+    """
+    Shared cache of unpersonalized candidate sets with TTL and stale-while-revalidate.
+    Per-user personalization is applied on top of cached candidates by the caller.
+    """
+
+    def __init__(self, backend=None, ttl: float = 300.0, stale_ttl: float = 600.0):
+        self.backend = backend if backend is not None else InMemoryCacheBackend()
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl  # How long past its TTL an entry may still be served while refreshing
+        self._refreshing: Dict[str, asyncio.Task] = {}
+        self.stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refresh_errors": 0}
+
+    def make_key(self, query: str, variant: str, pipeline_version: str) -> str:
+        """Cache key from the normalized query, pipeline variant and pipeline version"""
+        return f"{variant}:{pipeline_version}:{normalize_query(query)}"
+
+    async def _store(self, key: str, value: Dict[str, Any]):
+        # Partial candidate sets (a source missed its deadline) are stale at once, so the next
+        # lookup serves them but triggers a refresh
+        ttl = self.ttl if value.get("complete", True) else 0.0
+        entry = {"value": value, "fresh_until": time.time() + ttl}
+        await self.backend.set(key, entry, self.ttl + self.stale_ttl)
+
+    async def get_or_compute(self, key: str,
+                             compute: Callable[[], Awaitable[Dict[str, Any]]]) -> Tuple[Dict[str, Any], str]:
+        """
+        Return (value, status) where status is "hit", "stale" or "miss".
+        Stale entries are served immediately and refreshed in the background.
+        """
+        entry = await self.backend.get(key)
+        if entry is not None:
+            if entry["fresh_until"] > time.time():
+                self.stats["hits"] += 1
+                metrics_service.record_metric("search_cache_lookup", 1.0, {"status": "hit"})
+                return entry["value"], "hit"
+
+            self.stats["stale_hits"] += 1
+            metrics_service.record_metric("search_cache_lookup", 1.0, {"status": "stale"})
+            self._schedule_refresh(key, compute)
+            return entry["value"], "stale"
+
+        self.stats["misses"] += 1
+        metrics_service.record_metric("search_cache_lookup", 0.0, {"status": "miss"})
+        value = await compute()
+        await self._store(key, value)
+        return value, "miss"
+
+    def _schedule_refresh(self, key: str, compute: Callable[[], Awaitable[Dict[str, Any]]]):
+        """Start at most one background refresh per key"""
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                await self._store(key, await compute())
+            except Exception as e:
+                self.stats["refresh_errors"] += 1
+                print(f"Error refreshing cache entry {key}: {e}")
+            finally:
+                self._refreshing.pop(key, None)
+
+        self._refreshing[key] = asyncio.create_task(refresh())
+
+    async def invalidate(self, key: str):
+        """Drop a cached entry"""
+        await self.backend.delete(key)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss statistics"""
+        lookups = self.stats["hits"] + self.stats["stale_hits"] + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": (self.stats["hits"] + self.stats["stale_hits"]) / lookups if lookups else 0.0,
+            "refreshing": len(self._refreshing)
+        }
+
+def _create_backend():
+    """Use Redis when REDIS_URL is configured and the client is installed, else in-process"""
+    redis_url = os.environ.get("REDIS_URL")
+    if redis_url:
+        try:
+            import redis.asyncio
+            return RedisCacheBackend(redis.asyncio.Redis.from_url(redis_url))
+        except ImportError:
+            print("REDIS_URL is set but redis is not installed; using in-process search cache")
+    return InMemoryCacheBackend(max_entries=int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", 10000)))
+
+# Global instance of the search result cache
+search_cache = SearchResultCache(
+    backend=_create_backend(),
+    ttl=float(os.environ.get("SEARCH_CACHE_TTL", 300)),
+    stale_ttl=float(os.environ.get("SEARCH_CACHE_STALE_TTL", 600))
+)
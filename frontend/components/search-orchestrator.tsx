@@ -3,7 +3,6 @@
 import type React from "react"
 
 import { useCallback, useEffect, useMemo, useState } from "react"
-import useSWR from "swr"
 import { cn } from "@/lib/utils"
 import { usePathname, useRouter, useSearchParams } from "next/navigation"
 import { SearchInput } from "@/components/symphony/search-input"
@@ -21,10 +20,104 @@ type SearchResult = {
 
 type Mode = "auto" | "personalized" | "neutral"
 
-const fetcher = async (url: string) => {
-  const res = await fetch(url)
-  if (!res.ok) throw new Error("Failed to fetch")
-  return (await res.json()) as { results: SearchResult[]; tookMs: number }
+type StreamStage = "idle" | "reasoning" | "candidates" | "ranked" | "personalized" | "done"
+
+type StreamEvent = {
+  event: "enhanced_query" | "candidates" | "ranked" | "personalized" | "done" | "error"
+  elapsed: number
+  results?: Record<string, any>[]
+  enhanced_query?: string
+  refined_query?: string
+  message?: string
+}
+
+const STAGE_AFTER_EVENT: Partial<Record<StreamEvent["event"], StreamStage>> = {
+  enhanced_query: "candidates",
+  candidates: "candidates",
+  ranked: "ranked",
+  personalized: "personalized",
+  done: "done",
+}
+
+function toSearchResult(raw: Record<string, any>, i: number, signal: string): SearchResult {
+  const score = typeof raw.score === "number" ? raw.score : raw.relevance_score ?? 0
+  return {
+    id: String(raw.id ?? `${signal}-${i}`),
+    title: raw.title ?? "",
+    snippet: raw.snippet ?? raw.description ?? "",
+    url: raw.url ?? "#",
+    signals: [raw.source, signal].filter(Boolean),
+    score: score <= 1 ? score * 100 : score,
+  }
+}
+
+/**
+ * Consumes the NDJSON search stream, replacing results as each stage (raw candidates, ranked,
+ * personalized) arrives so the first results render before the pipeline finishes.
+ */
+function useSearchStream(url: string | null) {
+  const [results, setResults] = useState<SearchResult[]>([])
+  const [stage, setStage] = useState<StreamStage>("idle")
+  const [enhancedQuery, setEnhancedQuery] = useState<string | null>(null)
+  const [tookMs, setTookMs] = useState(0)
+  const [firstResultMs, setFirstResultMs] = useState<number | null>(null)
+  const [error, setError] = useState<Error | null>(null)
+
+  useEffect(() => {
+    setResults([])
+    setEnhancedQuery(null)
+    setTookMs(0)
+    setFirstResultMs(null)
+    setError(null)
+    if (!url) {
+      setStage("idle")
+      return
+    }
+    setStage("reasoning")
+
+    const controller = new AbortController()
+    const handle = (event: StreamEvent) => {
+      if (event.event === "error") throw new Error(event.message || "Search failed")
+      if (event.event === "enhanced_query") {
+        setEnhancedQuery(event.enhanced_query || event.refined_query || null)
+      } else if (event.results) {
+        const signal = event.event
+        setResults(event.results.map((r, i) => toSearchResult(r, i, signal)))
+        if (event.results.length > 0) setFirstResultMs((ms) => ms ?? Math.round(event.elapsed * 1000))
+      }
+      setTookMs(Math.round(event.elapsed * 1000))
+      const next = STAGE_AFTER_EVENT[event.event]
+      if (next) setStage(next)
+    }
+
+    ;(async () => {
+      const res = await fetch(url, { signal: controller.signal })
+      if (!res.ok || !res.body) throw new Error("Failed to fetch")
+      const reader = res.body.getReader()
+      const decoder = new TextDecoder()
+      let buffered = ""
+      while (true) {
+        const { value, done } = await reader.read()
+        if (done) break
+        buffered += decoder.decode(value, { stream: true })
+        const lines = buffered.split("\n")
+        buffered = lines.pop() ?? ""
+        for (const line of lines) {
+          if (line.trim()) handle(JSON.parse(line) as StreamEvent)
+        }
+      }
+      if (buffered.trim()) handle(JSON.parse(buffered) as StreamEvent)
+      setStage("done")
+    })().catch((e: Error) => {
+      if (controller.signal.aborted) return
+      setError(e)
+      setStage("done")
+    })
+
+    return () => controller.abort()
+  }, [url])
+
+  return { results, stage, enhancedQuery, tookMs, firstResultMs, error, isLoading: stage !== "idle" && stage !== "done" }
 }
 
 export default function SearchOrchestrator() {
@@ -57,13 +150,12 @@ export default function SearchOrchestrator() {
 
   const key =
     query.trim().length > 0
-      ? `/api/search?q=${encodeURIComponent(query.trim())}&type=${filters.type}&time=${filters.time}&safe=${
+      ? `/api/search/stream?q=${encodeURIComponent(query.trim())}&type=${filters.type}&time=${filters.time}&safe=${
           filters.safe ? 1 : 0
-        }&mode=${mode}`
+        }&mode=${mode}&format=ndjson`
       : null
 
-  const { data, isLoading, error } = useSWR(key, fetcher, { revalidateOnFocus: false })
-  const results = data?.results ?? []
+  const { results, stage, tookMs, firstResultMs, error, isLoading } = useSearchStream(key)
 
   useEffect(() => {
     const isEditable = (el: Element | null) =>
@@ -107,16 +199,20 @@ export default function SearchOrchestrator() {
 
   const liveMessage = useMemo(() => {
     if (!query) return "Idle"
-    if (isLoading) return "Searching..."
-    return `Showing ${results.length} results in ${data?.tookMs ?? 0} ms for ${query}`
-  }, [query, isLoading, results.length, data?.tookMs])
+    if (isLoading) return results.length > 0 ? `Showing ${results.length} early results, refining...` : "Searching..."
+    return `Showing ${results.length} results in ${tookMs} ms for ${query}`
+  }, [query, isLoading, results.length, tookMs])
 
   const statusText = useMemo(() => {
     if (error) return "Something went off-tempo."
-    if (isLoading && query) return "Scoring the orchestra…"
+    if (isLoading && query) {
+      if (stage === "reasoning") return "Tuning the query…"
+      if (stage === "candidates") return "Scoring the orchestra…"
+      return `First results in ${firstResultMs ?? tookMs} ms — personalizing…`
+    }
     if (!isLoading && query && results.length === 0) return "No results — try refining terms."
     return ""
-  }, [error, isLoading, results.length, query])
+  }, [error, isLoading, results.length, query, stage, firstResultMs, tookMs])
 
   const submitQuery = useCallback(
     (q: string) => {
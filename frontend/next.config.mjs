@@ -9,6 +9,16 @@ const nextConfig = {
   images: {
     unoptimized: true,
   },
+  // Proxy /api/* to the FastAPI backend (e.g. /api/search/stream -> /search/stream)
+  async rewrites() {
+    const backendUrl = process.env.BACKEND_URL || 'http://localhost:8000'
+    return [
+      {
+        source: '/api/:path*',
+        destination: `${backendUrl}/:path*`,
+      },
+    ]
+  },
   async headers() {
     return [
       {
@@ -0,0 +1,135 @@
+"""
+Incrementally maintained sliding-window aggregates over GEPA feedback
+"""
+import os
+import threading
+from collections import deque
+from itertools import islice
+from typing import Callable, Deque, Dict, Any, List, Optional, Tuple
+
+DEFAULT_PATTERN_WINDOW = int(os.environ.get("GEPA_PATTERN_WINDOW", 100))
+DEFAULT_SCORE_WINDOW = int(os.environ.get("GEPA_SCORE_WINDOW", 10))
+
+# Feedback types that mark a result as successful
+SUCCESS_TYPES = ('click', 'like')
+
+class FeedbackWindow:
+    """
+    Query counts and successful results over the last `pattern_window` feedback entries, and the
+    mean quality score over the last `score_window`. Aggregates are updated as entries arrive and
+    expire, so adding an entry costs O(its feedback events) and reads do not depend on the
+    window sizes. Safe to use from several threads.
+    """
+
+    def __init__(self, quality: Callable[[List[Dict]], float], pattern_window: int = DEFAULT_PATTERN_WINDOW,
+                 score_window: int = DEFAULT_SCORE_WINDOW):
+        self.quality = quality
+        self.pattern_window = pattern_window
+        self.score_window = score_window
+        self.total_entries = 0
+        self._lock = threading.Lock()
+
+        # (query, number of successful results it added) per entry in the pattern window
+        self._pattern_entries: Deque[Tuple[str, int]] = deque()
+        self.popular_queries: Dict[str, int] = {}
+        # Queries grouped by count (dicts as insertion-ordered sets) so the top counts are
+        # found without sorting; counts only move by one, so the max moves by at most one
+        self._count_buckets: Dict[int, Dict[str, None]] = {}
+        self._max_count = 0
+        self.successful_results: Deque[Dict[str, Any]] = deque()
+
+        self._scores: Deque[float] = deque()
+        self._score_sum = 0.0
+        self._evictions_since_resum = 0
+
+    def add(self, query: str, feedback: List[Dict]):
+        """Account for one feedback entry, expiring the oldest if a window is full"""
+        successes = [
+            {'query': query, 'result_id': f.get('result_id'), 'feedback_type': f.get('type')}
+            for f in feedback if f.get('type') in SUCCESS_TYPES
+        ]
+        score = self.quality(feedback)
+        with self._lock:
+            self.total_entries += 1
+            self._add_patterns(query, successes)
+            self._add_score(score)
+
+    def _add_patterns(self, query: str, successes: List[Dict[str, Any]]):
+        self._pattern_entries.append((query, len(successes)))
+        self._move_count(query, 1)
+        self.successful_results.extend(successes)
+        while len(self._pattern_entries) > self.pattern_window:
+            old_query, old_successes = self._pattern_entries.popleft()
+            self._move_count(old_query, -1)
+            for _ in range(old_successes):
+                self.successful_results.popleft()
+
+    def _move_count(self, query: str, delta: int):
+        old = self.popular_queries.get(query, 0)
+        new = old + delta
+        if old:
+            bucket = self._count_buckets[old]
+            del bucket[query]
+            if not bucket:
+                del self._count_buckets[old]
+                if old == self._max_count and new < old:
+                    self._max_count = new
+        if new:
+            self.popular_queries[query] = new
+            self._count_buckets.setdefault(new, {})[query] = None
+            self._max_count = max(self._max_count, new)
+        else:
+            del self.popular_queries[query]
+
+    def _add_score(self, score: float):
+        self._scores.append(score)
+        self._score_sum += score
+        while len(self._scores) > self.score_window:
+            self._score_sum -= self._scores.popleft()
+            self._evictions_since_resum += 1
+        # Re-sum once per window's worth of evictions so floating-point drift stays bounded
+        if self._evictions_since_resum >= self.score_window:
+            self._score_sum = sum(self._scores)
+            self._evictions_since_resum = 0
+
+    def __len__(self) -> int:
+        return len(self._pattern_entries)
+
+    def patterns(self, max_items: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Copy of the pattern aggregates. With max_items, only the max_items most frequent queries
+        and most recent successful results are copied, so the cost does not grow with the window.
+        """
+        with self._lock:
+            if not self._pattern_entries:
+                return {}
+            if max_items is None:
+                popular_queries = dict(self.popular_queries)
+                successful_results = list(self.successful_results)
+            else:
+                popular_queries = self._top_queries(max_items)
+                successful_results = list(islice(reversed(self.successful_results), max_items))[::-1]
+        return {
+            'popular_queries': popular_queries,
+            'successful_results': successful_results,
+            'user_preferences': {},
+            'temporal_patterns': {}
+        }
+
+    def _top_queries(self, max_items: int) -> Dict[str, int]:
+        top: Dict[str, int] = {}
+        count = self._max_count
+        while count > 0 and len(top) < max_items:
+            for query in islice(self._count_buckets.get(count, ()), max_items - len(top)):
+                top[query] = count
+            count -= 1
+        return top
+
+    def performance_score(self) -> float:
+        """Mean feedback quality over the score window (0.5 when there is none)"""
+        with self._lock:
+            if not self._scores:
+                return 0.5
+            return self._score_sum / len(self._scores)
+
+__all__ = ['FeedbackWindow', 'DEFAULT_PATTERN_WINDOW', 'DEFAULT_SCORE_WINDOW']
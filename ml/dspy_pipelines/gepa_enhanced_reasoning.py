@@ -3,16 +3,41 @@ Enhanced DSPy Pipeline with GEPA Optimizers for Online Search Result Optimizatio
 """
 import dspy
 from dspy import GEPA
+from ml.dspy_pipelines.predictor_cache import MemoizedPredictor
+from ml.dspy_pipelines.micro_batcher import MicroBatchedPredictor
+from ml.dspy_pipelines.feedback_window import FeedbackWindow, DEFAULT_PATTERN_WINDOW, DEFAULT_SCORE_WINDOW
+from ml.dspy_pipelines.query_classifier import QueryClassifierCascade, load_model
+from ml.dspy_pipelines.stats_snapshot import StatsSnapshot, StatsSnapshotter
+from ml.dspy_pipelines.prompt_encoding import (
+    DEFAULT_RESULTS_TOKEN_BUDGET, DEFAULT_CONTEXT_TOKEN_BUDGET, encode_results, encode_context, decode_order
+)
 from typing import List, Optional, Dict, Any
+from collections import deque
+from dataclasses import dataclass
+import threading
 import time
 
+# Predictors that GEPA optimizes and that are published as versioned snapshots
+PREDICTOR_NAMES = ['query_enhancer', 'result_ranker', 'result_optimizer']
+
+# Pipeline variants and their learning parameters, shared by serving and the optimizer worker
+PIPELINE_CONFIGS = {
+    'general': {},
+    'academic': {'learning_rate': 0.005},
+    'commercial': {'learning_rate': 0.02},
+    'news': {'optimization_steps': 5}
+}
+
+# Pattern entries included in prompts (encode_context keeps this many per field)
+PROMPT_PATTERN_ITEMS = 5
+
 class SearchOptimizationSignature(dspy.Signature):
     """Signature for optimizing search results based on user feedback"""
     query = dspy.InputField(desc="The search query")
-    initial_results = dspy.InputField(desc="Initial search results from the search agent")
+    initial_results = dspy.InputField(desc="Ranked search results, one per line as 'ID | title | snippet | source'")
     user_context = dspy.InputField(desc="User preferences and historical behavior")
     user_feedback = dspy.InputField(desc="Previous user feedback on similar queries")
-    optimized_results = dspy.OutputField(desc="Re-ranked and optimized search results")
+    optimized_results = dspy.OutputField(desc="Result IDs in re-ranked order, comma-separated (e.g. r3, r1, r2)")
 
 class QueryEnhancementSignature(dspy.Signature):
     """Signature for enhancing queries with learned patterns"""
@@ -24,22 +49,46 @@ class QueryEnhancementSignature(dspy.Signature):
 class ResultRankingSignature(dspy.Signature):
     """Signature for intelligent result ranking"""
     query = dspy.InputField(desc="The search query")
-    results = dspy.InputField(desc="List of search results to rank")
+    results = dspy.InputField(desc="Search results to rank, one per line as 'ID | title | snippet | source'")
     personalization_data = dspy.InputField(desc="User personalization data")
-    ranked_results = dspy.OutputField(desc="Results ranked by relevance and personalization")
+    ranked_results = dspy.OutputField(desc="Result IDs ranked by relevance and personalization, comma-separated (e.g. r3, r1, r2)")
+
+@dataclass(frozen=True)
+class PredictorSet:
+    """Immutable group of predictors that forward() reads as one unit"""
+    version: int
+    query_enhancer: Any
+    result_ranker: Any
+    result_optimizer: Any
 
 class GEPAEnhancedSearchPipeline(dspy.Module):
     """
     Enhanced search pipeline with GEPA optimization for continuous learning
     """
     
-    def __init__(self, learning_rate: float = 0.01, optimization_steps: int = 10):
+    def __init__(self, learning_rate: float = 0.01, optimization_steps: int = 10,
+                 memoize: bool = True, micro_batch: bool = True,
+                 results_token_budget: int = DEFAULT_RESULTS_TOKEN_BUDGET,
+                 context_token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET,
+                 pattern_window: int = DEFAULT_PATTERN_WINDOW, score_window: int = DEFAULT_SCORE_WINDOW):
         super().__init__()
         
+        # Per-call prompt budgets for encoded result lists and for each context field group
+        self.results_token_budget = results_token_budget
+        self.context_token_budget = context_token_budget
+
+        # Serve repeated predictor calls from the persistent memo store
+        self.memoize = memoize
+        # Batch LM calls from concurrent requests
+        self.micro_batch = micro_batch
+
         # Core pipeline components
-        self.query_enhancer = dspy.Predict(QueryEnhancementSignature)
-        self.result_optimizer = dspy.Predict(SearchOptimizationSignature)
-        self.result_ranker = dspy.Predict(ResultRankingSignature)
+        self._install_predictors(
+            query_enhancer=dspy.Predict(QueryEnhancementSignature),
+            result_ranker=dspy.Predict(ResultRankingSignature),
+            result_optimizer=dspy.Predict(SearchOptimizationSignature),
+            version=0
+        )
         
         # GEPA optimizer for online learning
         self.gepa_optimizer = GEPA(
@@ -51,8 +100,10 @@ class GEPAEnhancedSearchPipeline(dspy.Module):
         self.learning_rate = learning_rate
         self.optimization_steps = optimization_steps
         
-        # Storage for feedback and optimization
-        self.feedback_history = []
+        # Storage for feedback and optimization; patterns and the performance score are
+        # aggregated incrementally over the last pattern_window / score_window entries
+        self.feedback_history = deque(maxlen=max(pattern_window, score_window))
+        self.feedback_window = FeedbackWindow(self._feedback_quality, pattern_window, score_window)
         self.performance_metrics = {}
         
     def _search_quality_metric(self, gold, pred, trace, pred_name, pred_trace):
@@ -63,7 +114,15 @@ class GEPAEnhancedSearchPipeline(dspy.Module):
         try:
             # Extract feedback from gold (expected) data
             actual_feedback = gold.get('feedback', []) if hasattr(gold, 'get') else []
-            
+            return self._feedback_quality(actual_feedback)
+        except Exception:
+            return 0.5  # Return neutral score on any error
+
+    def _feedback_quality(self, actual_feedback: List[Dict]) -> float:
+        """
+        Quality score for a list of feedback events, used by the metric and performance score
+        """
+        try:
             if not actual_feedback:
                 return 0.5  # Neutral score for no feedback
                 
@@ -85,33 +144,49 @@ class GEPAEnhancedSearchPipeline(dspy.Module):
     def forward(self, query: str, initial_results: List[Dict], user_context: Dict, 
                 user_feedback: Optional[List[Dict]] = None):
         """
-        Process a search query with GEPA-optimized result enhancement
+        Process a search query with GEPA-optimized result enhancement.
+        optimized_results holds the LM's ranking as compact result IDs; decode it against
+        initial_results with prompt_encoding.decode_ranking. With no initial_results only the
+        query is enhanced.
         """
+        # Read the active predictors once so a concurrent snapshot swap cannot mix versions
+        predictors = self._predictors
+        patterns = self._extract_feedback_patterns(max_items=PROMPT_PATTERN_ITEMS)
+        context = encode_context(user_context, self.context_token_budget)
+
         # Enhance the query based on user patterns
-        enhanced_query_result = self.query_enhancer(
+        enhanced_query_result = predictors.query_enhancer(
             original_query=query,
-            user_history=str(user_context.get('search_history', [])),
-            feedback_patterns=str(self._extract_feedback_patterns())
-        )
-        
-        # Rank initial results with personalization
-        ranking_result = self.result_ranker(
-            query=enhanced_query_result.enhanced_query,
-            results=str(initial_results),
-            personalization_data=str(user_context)
+            user_history=encode_context(user_context, self.context_token_budget, fields=('search_history',)),
+            feedback_patterns=encode_context(patterns, self.context_token_budget, fields=tuple(patterns))
         )
         
-        # Optimize results using GEPA if feedback is available
-        if user_feedback:
-            optimized_result = self.result_optimizer(
+        if not initial_results:
+            # Query enhancement only (e.g. the reasoning stage, which runs before search);
+            # skip the ranking predictors rather than spend LM calls on an empty list
+            final_results = ''
+        else:
+            # Rank initial results with personalization
+            ranking_result = predictors.result_ranker(
                 query=enhanced_query_result.enhanced_query,
-                initial_results=ranking_result.ranked_results,
-                user_context=str(user_context),
-                user_feedback=str(user_feedback)
+                results=encode_results(initial_results, self.results_token_budget).text,
+                personalization_data=context
             )
-            final_results = optimized_result.optimized_results
-        else:
-            final_results = ranking_result.ranked_results
+            
+            # Optimize results using GEPA if feedback is available
+            if user_feedback:
+                # Re-encode in ranked order; IDs stay tied to positions in initial_results
+                order = decode_order(ranking_result.ranked_results, len(initial_results))
+                optimized_result = predictors.result_optimizer(
+                    query=enhanced_query_result.enhanced_query,
+                    initial_results=encode_results(initial_results, self.results_token_budget, order).text,
+                    user_context=context,
+                    user_feedback=encode_context({'feedback': user_feedback}, self.context_token_budget,
+                                                 fields=('feedback',), max_items=20)
+                )
+                final_results = optimized_result.optimized_results
+            else:
+                final_results = ranking_result.ranked_results
         
         return dspy.Prediction(
             enhanced_query=enhanced_query_result.enhanced_query,
@@ -124,7 +199,16 @@ class GEPAEnhancedSearchPipeline(dspy.Module):
         """
         Online learning from user feedback using GEPA optimization
         """
-        # Store feedback for pattern analysis
+        self.record_feedback(query, results, feedback, user_context)
+        
+        # Optimize pipeline using GEPA
+        self._optimize_with_gepa(query, results, feedback, user_context)
+
+    def record_feedback(self, query: str, results: List[Dict],
+                        feedback: List[Dict], user_context: Dict):
+        """
+        Store feedback for pattern analysis without optimizing
+        """
         self.feedback_history.append({
             'query': query,
             'results': results,
@@ -132,29 +216,37 @@ class GEPAEnhancedSearchPipeline(dspy.Module):
             'timestamp': time.time(),
             'user_context': user_context
         })
-        
-        # Optimize pipeline using GEPA
-        self._optimize_with_gepa(query, results, feedback, user_context)
+        self.feedback_window.add(query, feedback)
     
     def _optimize_with_gepa(self, query: str, results: List[Dict], 
                            feedback: List[Dict], user_context: Dict):
         """
         Use GEPA to optimize the pipeline based on feedback
         """
-        # Create training example
-        example = dspy.Example(
+        self.optimize([self._build_example(query, results, feedback, user_context)])
+
+    def _build_example(self, query: str, results: List[Dict],
+                       feedback: List[Dict], user_context: Dict):
+        """
+        Create a GEPA training example from a feedback entry
+        """
+        return dspy.Example(
             query=query,
             initial_results=results,
             user_context=user_context,
             user_feedback=feedback,
-            expected_quality=self._search_quality_metric(results, feedback)
+            expected_quality=self._feedback_quality(feedback)
         )
-        
+
+    def optimize(self, examples: List[Any]):
+        """
+        Run GEPA over a batch of training examples and adopt the optimized predictors
+        """
         # Optimize the pipeline
         optimized_pipeline = self.gepa_optimizer.compile(
             student=self,
-            trainset=[example],
-            valset=[example],
+            trainset=examples,
+            valset=examples,
             num_trials=self.optimization_steps
         )
         
@@ -166,70 +258,73 @@ class GEPAEnhancedSearchPipeline(dspy.Module):
         Update current pipeline with optimized parameters
         """
         # Update the predictors with optimized versions
-        if hasattr(optimized_pipeline, 'query_enhancer'):
-            self.query_enhancer = optimized_pipeline.query_enhancer
-        if hasattr(optimized_pipeline, 'result_optimizer'):
-            self.result_optimizer = optimized_pipeline.result_optimizer
-        if hasattr(optimized_pipeline, 'result_ranker'):
-            self.result_ranker = optimized_pipeline.result_ranker
-    
-    def _extract_feedback_patterns(self) -> Dict[str, Any]:
+        self._install_predictors(
+            query_enhancer=getattr(optimized_pipeline, 'query_enhancer', self.query_enhancer),
+            result_ranker=getattr(optimized_pipeline, 'result_ranker', self.result_ranker),
+            result_optimizer=getattr(optimized_pipeline, 'result_optimizer', self.result_optimizer),
+            version=self.predictor_version
+        )
+
+    def _install_predictors(self, query_enhancer, result_ranker, result_optimizer, version: int):
         """
-        Extract patterns from historical feedback for learning
+        Swap in a new set of predictors with a single reference assignment
         """
-        if not self.feedback_history:
-            return {}
-        
-        patterns = {
-            'popular_queries': {},
-            'successful_results': [],
-            'user_preferences': {},
-            'temporal_patterns': {}
+        # Named attributes keep the predictors visible to DSPy (save/load, GEPA compile)
+        self.query_enhancer = query_enhancer
+        self.result_ranker = result_ranker
+        self.result_optimizer = result_optimizer
+        self.predictor_version = version
+        if self.micro_batch:
+            query_enhancer = MicroBatchedPredictor(query_enhancer)
+            result_ranker = MicroBatchedPredictor(result_ranker)
+            result_optimizer = MicroBatchedPredictor(result_optimizer)
+        if self.memoize:
+            query_enhancer = MemoizedPredictor(query_enhancer)
+            result_ranker = MemoizedPredictor(result_ranker)
+            result_optimizer = MemoizedPredictor(result_optimizer)
+        self._predictors = PredictorSet(version, query_enhancer, result_ranker, result_optimizer)
+
+    def export_predictors(self) -> Dict[str, Any]:
+        """
+        Serialize the current predictor state for publishing as a snapshot
+        """
+        return {name: getattr(self, name).dump_state() for name in PREDICTOR_NAMES}
+
+    def apply_snapshot(self, version: int, predictor_states: Dict[str, Any]):
+        """
+        Load a published predictor snapshot and swap it in atomically
+        """
+        predictors = {
+            'query_enhancer': dspy.Predict(QueryEnhancementSignature),
+            'result_ranker': dspy.Predict(ResultRankingSignature),
+            'result_optimizer': dspy.Predict(SearchOptimizationSignature)
         }
-        
-        for feedback_entry in self.feedback_history[-100:]:  # Last 100 entries
-            query = feedback_entry['query']
-            feedback = feedback_entry['feedback']
-            
-            # Track popular queries
-            patterns['popular_queries'][query] = patterns['popular_queries'].get(query, 0) + 1
-            
-            # Track successful results
-            for f in feedback:
-                if f.get('type') in ['click', 'like']:
-                    patterns['successful_results'].append({
-                        'query': query,
-                        'result_id': f.get('result_id'),
-                        'feedback_type': f.get('type')
-                    })
-        
-        return patterns
+        for name, predictor in predictors.items():
+            if name in predictor_states:
+                predictor.load_state(predictor_states[name])
+        self._install_predictors(version=version, **predictors)
+    
+    def _extract_feedback_patterns(self, max_items: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Patterns from recent feedback for learning (at most max_items per pattern if given)
+        """
+        return self.feedback_window.patterns(max_items)
     
     def _calculate_performance_score(self) -> float:
         """
         Calculate overall pipeline performance score
         """
-        if not self.feedback_history:
-            return 0.5  # Neutral score
-        
-        recent_feedback = self.feedback_history[-10:]  # Last 10 interactions
-        total_score = 0.0
-        
-        for entry in recent_feedback:
-            feedback = entry['feedback']
-            score = self._search_quality_metric(entry['results'], feedback)
-            total_score += score
-        
-        return total_score / len(recent_feedback) if recent_feedback else 0.5
+        return self.feedback_window.performance_score()
     
     def get_optimization_stats(self) -> Dict[str, Any]:
         """
         Get statistics about the optimization process
         """
         return {
-            'total_feedback_entries': len(self.feedback_history),
+            'total_feedback_entries': self.feedback_window.total_entries,
             'current_performance': self._calculate_performance_score(),
             'optimization_iterations': len(self.performance_metrics),
+            'predictor_version': self.predictor_version,
             'learning_rate': self.learning_rate,
             'recent_patterns': self._extract_feedback_patterns()
         }
@@ -239,55 +334,125 @@ class AdaptiveGEPASearchOrchestrator:
     Orchestrator that manages multiple GEPA-enhanced pipelines for different query types
     """
     
-    def __init__(self):
+    def __init__(self, optimizer=None, snapshot_refresh_interval: float = 5.0):
         self.pipelines = {
-            'general': GEPAEnhancedSearchPipeline(),
-            'academic': GEPAEnhancedSearchPipeline(learning_rate=0.005),
-            'commercial': GEPAEnhancedSearchPipeline(learning_rate=0.02),
-            'news': GEPAEnhancedSearchPipeline(optimization_steps=5)
+            name: GEPAEnhancedSearchPipeline(**config)
+            for name, config in PIPELINE_CONFIGS.items()
         }
         
+        # LM tier of the routing cascade; only consulted when the trained model is unsure
         self.query_classifier = dspy.Predict("query -> query_type")
+        self.classifier = QueryClassifierCascade(model=load_model(), lm=self._classify_with_lm)
+
+        # Background optimizer (see gepa_optimizer_worker); compilation never runs inline
+        self.optimizer = optimizer
+        self.snapshot_refresh_interval = snapshot_refresh_interval
+        self._last_snapshot_check = 0.0
+        self._snapshot_lock = threading.Lock()
+
+        # System stats are served from a snapshot refreshed in the background
+        self.stats_snapshots = StatsSnapshotter(self._compute_system_stats, self._stats_change_token)
     
     def process_search(self, query: str, initial_results: List[Dict], 
                       user_context: Dict, user_feedback: Optional[List[Dict]] = None):
         """
         Route query to appropriate GEPA-enhanced pipeline
         """
+        self._refresh_predictors()
+
         # Classify query type
         query_type = self._classify_query(query)
         
         # Get appropriate pipeline
-        pipeline = self.pipelines.get(query_type, self.pipelines['general'])
+        if query_type not in self.pipelines:
+            query_type = 'general'
+        pipeline = self.pipelines[query_type]
         
         # Process with GEPA optimization
         result = pipeline.forward(query, initial_results, user_context, user_feedback)
         
-        # Learn from feedback if provided
+        # Hand feedback to the background optimizer instead of compiling in the request path
         if user_feedback:
-            pipeline.learn_from_feedback(query, initial_results, user_feedback, user_context)
+            pipeline.record_feedback(query, initial_results, user_feedback, user_context)
+            if self.optimizer is not None:
+                self.optimizer.submit(query_type, query, initial_results, user_feedback, user_context)
         
         return result
+
+    def _refresh_predictors(self):
+        """
+        Swap in predictor snapshots published by the optimizer worker, at most once per interval.
+        Called from executor threads: one thread checks while the others go on with the current
+        predictors.
+        """
+        if self.optimizer is None:
+            return
+        if not self._snapshot_lock.acquire(blocking=False):
+            return
+        try:
+            now = time.time()
+            if now - self._last_snapshot_check < self.snapshot_refresh_interval:
+                return
+            self._last_snapshot_check = now
+
+            store = self.optimizer.snapshot_store
+            for pipeline_name, pipeline in self.pipelines.items():
+                try:
+                    version = store.latest_version(pipeline_name)
+                    if version <= pipeline.predictor_version:
+                        continue
+                    snapshot = store.load(pipeline_name, version)
+                    if snapshot:
+                        pipeline.apply_snapshot(snapshot['version'], snapshot['predictors'])
+                except Exception as e:
+                    print(f"Error loading predictor snapshot for {pipeline_name}: {e}")
+        finally:
+            self._snapshot_lock.release()
     
     def _classify_query(self, query: str) -> str:
         """
         Classify query type for pipeline selection
         """
-        # Simple keyword-based classification (can be enhanced with ML)
-        query_lower = query.lower()
-        
-        if any(word in query_lower for word in ['research', 'paper', 'study', 'academic']):
-            return 'academic'
-        elif any(word in query_lower for word in ['buy', 'price', 'shop', 'purchase']):
-            return 'commercial'
-        elif any(word in query_lower for word in ['news', 'latest', 'breaking', 'today']):
-            return 'news'
-        else:
-            return 'general'
+        return self.classifier.classify(query)
+
+    def _classify_with_lm(self, query: str) -> str:
+        """
+        LM classification into one of the pipeline names
+        """
+        options = ", ".join(self.pipelines)
+        query_type = self.query_classifier(query=f"{query}\n(answer with one of: {options})").query_type
+        return str(query_type).strip().lower()
     
+    def get_pipeline_version(self) -> str:
+        """
+        Combined predictor version of all pipelines, used to key cached results
+        """
+        return ".".join(str(self.pipelines[name].predictor_version) for name in sorted(self.pipelines))
+
     def get_system_stats(self) -> Dict[str, Any]:
         """
-        Get comprehensive system statistics
+        Get comprehensive system statistics (from the latest snapshot; do not modify)
+        """
+        return self.stats_snapshots.get().stats
+
+    def get_stats_snapshot(self) -> StatsSnapshot:
+        """
+        Latest versioned system stats snapshot
+        """
+        return self.stats_snapshots.get()
+
+    def _stats_change_token(self):
+        """
+        Cheap fingerprint of the inputs to the system stats: predictor versions and feedback counts
+        """
+        return tuple(
+            (pipeline.predictor_version, pipeline.feedback_window.total_entries)
+            for pipeline in self.pipelines.values()
+        )
+
+    def _compute_system_stats(self) -> Dict[str, Any]:
+        """
+        Compute comprehensive system statistics
         """
         stats = {}
         for pipeline_name, pipeline in self.pipelines.items():
@@ -296,6 +461,8 @@ class AdaptiveGEPASearchOrchestrator:
         return {
             'pipeline_stats': stats,
             'total_pipelines': len(self.pipelines),
+            'optimizer': self.optimizer.get_stats() if self.optimizer is not None else None,
+            'query_classifier': self.classifier.get_stats(),
             'system_status': 'active'
         }
 
@@ -0,0 +1,216 @@
+"""
+Background GEPA optimizer worker and versioned predictor snapshots
+
+Serving processes push feedback to the worker and periodically pick up the
+predictor snapshots it publishes; GEPA compilation never runs in a search request.
+"""
+import json
+import multiprocessing
+import os
+import queue
+import tempfile
+import threading
+import time
+from typing import Dict, Any, List, Optional
+
+DEFAULT_SNAPSHOT_DIR = os.environ.get("GEPA_SNAPSHOT_DIR", "gepa_snapshots")
+
+_STOP = "__stop__"
+
+class PredictorSnapshotStore:
+    """
+    Directory of versioned predictor snapshots, one subdirectory per pipeline.
+    Files are written to a temp path and renamed, so readers never see partial snapshots.
+    """
+
+    def __init__(self, root_dir: str = DEFAULT_SNAPSHOT_DIR):
+        self.root_dir = root_dir
+
+    def _pipeline_dir(self, pipeline_name: str) -> str:
+        return os.path.join(self.root_dir, pipeline_name)
+
+    def _write_atomic(self, path: str, content: str):
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def latest_version(self, pipeline_name: str) -> int:
+        """Latest published version for a pipeline, 0 if none"""
+        try:
+            with open(os.path.join(self._pipeline_dir(pipeline_name), "LATEST"), 'r') as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def publish(self, pipeline_name: str, predictor_states: Dict[str, Any]) -> int:
+        """Write a new snapshot and then advance the LATEST pointer"""
+        version = self.latest_version(pipeline_name) + 1
+        snapshot = {
+            "pipeline": pipeline_name,
+            "version": version,
+            "created_at": time.time(),
+            "predictors": predictor_states
+        }
+        pipeline_dir = self._pipeline_dir(pipeline_name)
+        self._write_atomic(os.path.join(pipeline_dir, f"v{version}.json"), json.dumps(snapshot))
+        self._write_atomic(os.path.join(pipeline_dir, "LATEST"), str(version))
+        return version
+
+    def load(self, pipeline_name: str, version: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Load a snapshot (latest by default)"""
+        version = version or self.latest_version(pipeline_name)
+        if not version:
+            return None
+        path = os.path.join(self._pipeline_dir(pipeline_name), f"v{version}.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            return json.load(f)
+
+    def prune(self, pipeline_name: str, keep: int = 5):
+        """Remove all but the newest `keep` snapshots"""
+        latest = self.latest_version(pipeline_name)
+        for version in range(1, max(0, latest - keep) + 1):
+            path = os.path.join(self._pipeline_dir(pipeline_name), f"v{version}.json")
+            if os.path.exists(path):
+                os.remove(path)
+
+def _configure_lm():
+    """Configure DSPy in the worker process (settings are not inherited across processes)"""
+    import dspy
+    lm_name = os.environ.get("DSPY_LM")
+    if lm_name:
+        dspy.configure(lm=dspy.LM(lm_name))
+
+def run_optimizer_worker(feedback_queue, snapshot_dir: str, batch_size: int = 32,
+                         batch_interval: float = 60.0, keep_snapshots: int = 5):
+    """
+    Worker process entry point: batch feedback per pipeline, compile with GEPA, publish snapshots
+    """
+    from ml.dspy_pipelines.gepa_enhanced_reasoning import GEPAEnhancedSearchPipeline, PIPELINE_CONFIGS
+
+    _configure_lm()
+    store = PredictorSnapshotStore(snapshot_dir)
+
+    # Resume from the latest published predictors
+    pipelines = {}
+    for name, config in PIPELINE_CONFIGS.items():
+        # Memoization would hide candidate prompts from GEPA, so the worker always calls the LM
+        pipeline = GEPAEnhancedSearchPipeline(memoize=False, micro_batch=False, **config)
+        snapshot = store.load(name)
+        if snapshot:
+            pipeline.apply_snapshot(snapshot['version'], snapshot['predictors'])
+        pipelines[name] = pipeline
+
+    pending: Dict[str, List[Dict[str, Any]]] = {name: [] for name in pipelines}
+    last_run = time.time()
+    running = True
+
+    while running:
+        try:
+            item = feedback_queue.get(timeout=1.0)
+        except queue.Empty:
+            item = None
+
+        if item == _STOP:
+            running = False
+        elif item is not None:
+            pending.setdefault(item['pipeline'], []).append(item)
+
+        batch_ready = any(len(items) >= batch_size for items in pending.values())
+        interval_elapsed = time.time() - last_run >= batch_interval
+        if not (batch_ready or interval_elapsed or not running):
+            continue
+        last_run = time.time()
+
+        for name, items in pending.items():
+            if not items or name not in pipelines:
+                continue
+            pending[name] = []
+            pipeline = pipelines[name]
+            try:
+                examples = []
+                for entry in items:
+                    pipeline.record_feedback(entry['query'], entry['results'],
+                                             entry['feedback'], entry['user_context'])
+                    examples.append(pipeline._build_example(entry['query'], entry['results'],
+                                                            entry['feedback'], entry['user_context']))
+                pipeline.optimize(examples)
+                store.publish(name, pipeline.export_predictors())
+                store.prune(name, keep=keep_snapshots)
+            except Exception as e:
+                print(f"GEPA optimization failed for {name}: {e}")
+
+class GEPAOptimizerClient:
+    """Serving-side handle that feeds the optimizer worker and exposes its snapshots"""
+
+    def __init__(self, snapshot_dir: str = DEFAULT_SNAPSHOT_DIR, batch_size: int = 32,
+                 batch_interval: float = 60.0, max_queue_size: int = 10000):
+        self.snapshot_store = PredictorSnapshotStore(snapshot_dir)
+        self.batch_size = batch_size
+        self.batch_interval = batch_interval
+        self._context = multiprocessing.get_context("spawn")
+        self._queue = self._context.Queue(maxsize=max_queue_size)
+        self._process = None
+        self._start_lock = threading.Lock()
+        self.submitted_count = 0
+        self.dropped_count = 0
+
+    def start(self):
+        """Start the worker process if it is not already running"""
+        with self._start_lock:
+            if self._process is not None and self._process.is_alive():
+                return
+            self._process = self._context.Process(
+                target=run_optimizer_worker,
+                args=(self._queue, self.snapshot_store.root_dir, self.batch_size, self.batch_interval),
+                name="gepa-optimizer",
+                daemon=True
+            )
+            self._process.start()
+
+    def submit(self, pipeline_name: str, query: str, results: List[Dict],
+               feedback: List[Dict], user_context: Dict) -> bool:
+        """Queue feedback for optimization; drops it rather than blocking when the queue is full"""
+        self.start()
+        try:
+            self._queue.put_nowait({
+                "pipeline": pipeline_name,
+                "query": query,
+                "results": results,
+                "feedback": feedback,
+                "user_context": user_context
+            })
+            self.submitted_count += 1
+            return True
+        except queue.Full:
+            self.dropped_count += 1
+            return False
+
+    def stop(self, timeout: float = 30.0):
+        """Ask the worker to flush pending feedback and exit"""
+        if self._process is None:
+            return
+        self._queue.put(_STOP)
+        self._process.join(timeout)
+        if self._process.is_alive():
+            self._process.terminate()
+        self._process = None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get worker liveness and queue counters"""
+        return {
+            "worker_alive": self._process is not None and self._process.is_alive(),
+            "submitted": self.submitted_count,
+            "dropped": self.dropped_count
+        }
+
+__all__ = ['PredictorSnapshotStore', 'GEPAOptimizerClient', 'run_optimizer_worker']
@@ -0,0 +1,131 @@
+"""
+Micro-batching of DSPy predictor calls across concurrent requests
+"""
+import dspy
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+DEFAULT_BATCH_WINDOW = float(os.environ.get("PREDICTOR_BATCH_WINDOW_MS", 10)) / 1000.0
+DEFAULT_BATCH_MAX_SIZE = int(os.environ.get("PREDICTOR_BATCH_MAX_SIZE", 16))
+
+class MicroBatcher:
+    """
+    Collects predictor calls from many threads for up to `max_wait` seconds (or `max_batch_size`
+    calls), then sends each predictor's calls to the LM backend as one batched call.
+    """
+
+    def __init__(self, max_wait: float = DEFAULT_BATCH_WINDOW, max_batch_size: int = DEFAULT_BATCH_MAX_SIZE,
+                 max_parallel_batches: int = 4):
+        self.max_wait = max_wait
+        self.max_batch_size = max_batch_size
+        self._queue: "queue.Queue[Tuple[Any, Dict[str, Any], Future]]" = queue.Queue()
+        self._pool = ThreadPoolExecutor(max_workers=max_parallel_batches, thread_name_prefix="predictor-batch")
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self.batch_count = 0
+        self.item_count = 0
+
+    def _ensure_started(self):
+        with self._start_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._dispatch_loop, name="micro-batcher", daemon=True)
+                self._thread.start()
+
+    def submit(self, predictor, inputs: Dict[str, Any]) -> Future:
+        """Queue a predictor call and return a future for its prediction"""
+        self._ensure_started()
+        future: Future = Future()
+        self._queue.put((predictor, inputs, future))
+        return future
+
+    def _dispatch_loop(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+
+            # Demultiplex by predictor; each group becomes one backend call
+            groups: Dict[int, List[Tuple[Any, Dict[str, Any], Future]]] = {}
+            for item in batch:
+                groups.setdefault(id(item[0]), []).append(item)
+            for items in groups.values():
+                self.batch_count += 1
+                self.item_count += len(items)
+                self._pool.submit(self._run_group, items)
+
+    def _run_group(self, items: List[Tuple[Any, Dict[str, Any], Future]]):
+        predictor = items[0][0]
+        if len(items) > 1 and hasattr(predictor, "batch"):
+            try:
+                examples = [dspy.Example(**inputs).with_inputs(*inputs.keys()) for _, inputs, _ in items]
+                predictions = predictor.batch(examples, num_threads=len(items), disable_progress_bar=True)
+                pending = []
+                for item, prediction in zip(items, predictions):
+                    if prediction is None:
+                        pending.append(item)  # Failed inside the batch; retry alone to surface the error
+                    else:
+                        item[2].set_result(prediction)
+                items = pending
+            except Exception as e:
+                print(f"Batched predictor call failed, falling back to single calls: {e}")
+
+        for _, inputs, future in items:
+            if future.done():
+                continue
+            try:
+                future.set_result(predictor(**inputs))
+            except Exception as e:
+                future.set_exception(e)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get batch count and average batch size"""
+        return {
+            "batches": self.batch_count,
+            "calls": self.item_count,
+            "average_batch_size": self.item_count / self.batch_count if self.batch_count else 0.0,
+            "queued": self._queue.qsize(),
+            "window_ms": self.max_wait * 1000.0,
+            "max_batch_size": self.max_batch_size
+        }
+
+_default_batcher: Optional[MicroBatcher] = None
+_default_batcher_lock = threading.Lock()
+
+def get_default_batcher() -> MicroBatcher:
+    """Shared micro-batcher, created on first use"""
+    global _default_batcher
+    with _default_batcher_lock:
+        if _default_batcher is None:
+            _default_batcher = MicroBatcher()
+        return _default_batcher
+
+class MicroBatchedPredictor:
+    """Predictor wrapper that routes calls through a micro-batcher and blocks for the result"""
+
+    def __init__(self, predictor, batcher: Optional[MicroBatcher] = None):
+        self.predictor = predictor
+        self.batcher = batcher
+
+    @property
+    def signature(self):
+        return self.predictor.signature
+
+    def dump_state(self):
+        return self.predictor.dump_state()
+
+    def __call__(self, **kwargs):
+        batcher = self.batcher or get_default_batcher()
+        return batcher.submit(self.predictor, kwargs).result()
+
+__all__ = ['MicroBatcher', 'MicroBatchedPredictor', 'get_default_batcher']
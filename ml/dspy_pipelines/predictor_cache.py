@@ -0,0 +1,171 @@
+"""
+Persistent, content-addressed memoization for dspy.Predict calls
+"""
+import dspy
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Any, Optional
+
+DEFAULT_MEMO_PATH = os.environ.get("PREDICTOR_MEMO_PATH", "predictor_memo.db")
+DEFAULT_MEMO_MAX_BYTES = int(os.environ.get("PREDICTOR_MEMO_MAX_BYTES", 256 * 1024 * 1024))
+DEFAULT_ACCESS_FLUSH_SIZE = 256
+DEFAULT_ACCESS_FLUSH_INTERVAL = 5.0
+
+class PredictorMemoStore:
+    """
+    Embedded SQLite store of predictor outputs with a total size cap and LRU eviction.
+    Hits only read: their access times are buffered and written in one batch every
+    `access_flush_size` hits or `access_flush_interval` seconds, and before eviction.
+    """
+
+    def __init__(self, path: str = DEFAULT_MEMO_PATH, max_bytes: int = DEFAULT_MEMO_MAX_BYTES,
+                 access_flush_size: int = DEFAULT_ACCESS_FLUSH_SIZE,
+                 access_flush_interval: float = DEFAULT_ACCESS_FLUSH_INTERVAL):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.access_flush_size = access_flush_size
+        self.access_flush_interval = access_flush_interval
+        self._pending_access: Dict[str, float] = {}
+        self._last_access_flush = time.time()
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS memo ("
+            "key TEXT PRIMARY KEY, signature TEXT, value TEXT, size INTEGER, last_access REAL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS memo_last_access ON memo(last_access)")
+        self.total_bytes = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM memo").fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return stored outputs for a key and mark it recently used"""
+        with self._lock:
+            row = self._conn.execute("SELECT value FROM memo WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            now = time.time()
+            self._pending_access[key] = now
+            if (len(self._pending_access) >= self.access_flush_size
+                    or now - self._last_access_flush >= self.access_flush_interval):
+                self._flush_access()
+            self.hits += 1
+            return json.loads(row[0])
+
+    def put(self, key: str, signature: str, outputs: Dict[str, Any]):
+        """Store outputs, evicting least recently used entries beyond the size cap"""
+        value = json.dumps(outputs, default=str)
+        size = len(key) + len(value)
+        with self._lock:
+            previous = self._conn.execute("SELECT size FROM memo WHERE key = ?", (key,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO memo (key, signature, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, signature, value, size, time.time())
+            )
+            self._pending_access.pop(key, None)
+            self.total_bytes += size - (previous[0] if previous else 0)
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+    def flush_access(self):
+        """Write buffered access times now"""
+        with self._lock:
+            self._flush_access()
+
+    def _flush_access(self):
+        if self._pending_access:
+            self._conn.executemany(
+                "UPDATE memo SET last_access = ? WHERE key = ?",
+                [(access, key) for key, access in self._pending_access.items()]
+            )
+            self._pending_access.clear()
+        self._last_access_flush = time.time()
+
+    def _evict(self):
+        """Drop the oldest entries until the store is back under 90% of its cap"""
+        self._flush_access()
+        target = int(self.max_bytes * 0.9)
+        cursor = self._conn.execute("SELECT key, size FROM memo ORDER BY last_access")
+        evicted = []
+        for key, size in cursor:
+            if self.total_bytes <= target:
+                break
+            evicted.append((key,))
+            self.total_bytes -= size
+        cursor.close()
+        self._conn.executemany("DELETE FROM memo WHERE key = ?", evicted)
+        self.evictions += len(evicted)
+
+    def clear(self):
+        """Remove every entry"""
+        with self._lock:
+            self._conn.execute("DELETE FROM memo")
+            self._pending_access.clear()
+            self.total_bytes = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get hit/miss, eviction and size statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes
+        }
+
+_default_store: Optional[PredictorMemoStore] = None
+_default_store_lock = threading.Lock()
+
+def get_default_memo_store() -> PredictorMemoStore:
+    """Shared memo store, opened on first use"""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = PredictorMemoStore()
+        return _default_store
+
+class MemoizedPredictor:
+    """
+    Wraps a predictor so identical calls are answered from the memo store.
+    The key covers the signature, the predictor's current state (instructions and demos),
+    the configured LM and the inputs, so entries from before a GEPA update are never served.
+    """
+
+    def __init__(self, predictor, store: Optional[PredictorMemoStore] = None):
+        self.predictor = predictor
+        self.store = store
+
+    def _fingerprint(self, inputs: Dict[str, Any]) -> str:
+        lm = dspy.settings.lm
+        payload = {
+            "signature": self.predictor.signature.__name__,
+            "state": self.predictor.dump_state(),
+            "lm": getattr(lm, "model", None),
+            "inputs": inputs
+        }
+        return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+    def __call__(self, **kwargs):
+        store = self.store or get_default_memo_store()
+        key = self._fingerprint(kwargs)
+
+        outputs = store.get(key)
+        if outputs is not None:
+            return dspy.Prediction(**outputs)
+
+        prediction = self.predictor(**kwargs)
+        outputs = {name: prediction.get(name) for name in self.predictor.signature.output_fields}
+        store.put(key, self.predictor.signature.__name__, outputs)
+        return prediction
+
+__all__ = ['PredictorMemoStore', 'MemoizedPredictor', 'get_default_memo_store']
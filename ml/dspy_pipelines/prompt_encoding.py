@@ -0,0 +1,118 @@
+"""
+Compact, token-budgeted encoding of search results and context for LM prompts
+"""
+import json
+import os
+import re
+from dataclasses import dataclass
+from typing import Dict, Any, List, Optional, Sequence
+
+DEFAULT_RESULTS_TOKEN_BUDGET = int(os.environ.get("PROMPT_RESULTS_TOKEN_BUDGET", 600))
+DEFAULT_CONTEXT_TOKEN_BUDGET = int(os.environ.get("PROMPT_CONTEXT_TOKEN_BUDGET", 120))
+
+# Result fields sent to the LM, in order; everything else (urls, scores, ids) stays server-side
+RESULT_FIELDS = ("title", "snippet", "source")
+# User context fields relevant to ranking; ids and timestamps only cost tokens
+CONTEXT_FIELDS = ("preferences", "search_history")
+
+_ID_PATTERN = re.compile(r"\br(\d+)\b")
+_WHITESPACE = re.compile(r"\s+")
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token for English text)"""
+    return (len(text) + 3) // 4
+
+def _trim(value: Any, max_chars: int) -> str:
+    text = _WHITESPACE.sub(" ", str(value)).strip()
+    if len(text) <= max_chars:
+        return text
+    return text[:max_chars - 1].rstrip() + "…"
+
+@dataclass
+class EncodedResults:
+    """Prompt text for a result list; result i is referred to by the compact ID r{i + 1}"""
+    text: str
+    included: int
+    tokens: int
+
+def encode_results(results: Sequence[Dict[str, Any]], token_budget: int = DEFAULT_RESULTS_TOKEN_BUDGET,
+                   order: Optional[Sequence[int]] = None, snippet_chars: int = 160,
+                   title_chars: int = 80) -> EncodedResults:
+    """
+    Encode results one per line as "r{n} | title | snippet | source", in `order` (indices into
+    `results`, default as given). IDs are stable positions in `results`, so a re-ordered list
+    encodes with the same IDs. Lines are added until the token budget is reached.
+    """
+    lines: List[str] = []
+    tokens = 0
+    for index in (order if order is not None else range(len(results))):
+        result = results[index]
+        parts = [f"r{index + 1}"]
+        for field in RESULT_FIELDS:
+            value = result.get(field)
+            if value:
+                parts.append(_trim(value, title_chars if field == "title" else snippet_chars))
+        line = " | ".join(parts)
+        line_tokens = estimate_tokens(line) + 1
+        if lines and tokens + line_tokens > token_budget:
+            break
+        lines.append(line)
+        tokens += line_tokens
+    return EncodedResults(text="\n".join(lines), included=len(lines), tokens=tokens)
+
+def decode_order(output: Any, count: int) -> List[int]:
+    """
+    Indices of a ranking in LM output over `count` encoded results. IDs (r{n}) are taken in order
+    of first mention; results the LM did not mention keep their original relative order after
+    them, so output without recognizable IDs leaves the order unchanged.
+    """
+    if isinstance(output, (list, tuple)):
+        output = " ".join(
+            str(item.get("id", "")) if isinstance(item, dict) else str(item) for item in output
+        )
+    order: List[int] = []
+    seen = set()
+    for match in _ID_PATTERN.finditer(str(output or "")):
+        index = int(match.group(1)) - 1
+        if 0 <= index < count and index not in seen:
+            seen.add(index)
+            order.append(index)
+    order.extend(i for i in range(count) if i not in seen)
+    return order
+
+def decode_ranking(output: Any, results: Sequence[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Re-order the original result objects as ranked in LM output (see decode_order)"""
+    return [results[i] for i in decode_order(output, len(results))]
+
+def encode_context(context: Dict[str, Any], token_budget: int = DEFAULT_CONTEXT_TOKEN_BUDGET,
+                   fields: Sequence[str] = CONTEXT_FIELDS, max_items: int = 5) -> str:
+    """
+    Encode the relevant fields of a context dict as compact "key=value" lines. Lists keep their
+    last `max_items` entries (the most recent history) and dicts their first; empty fields are
+    dropped and the last field that fits is trimmed to the token budget.
+    """
+    lines: List[str] = []
+    tokens = 0
+    for field in fields:
+        value = context.get(field)
+        if not value:
+            continue
+        if isinstance(value, dict):
+            value = dict(list(value.items())[:max_items])
+        elif isinstance(value, (list, tuple)):
+            value = list(value)[-max_items:]
+        # Trim the value to what is left of the budget (4 characters per token, 1 for the newline)
+        max_chars = (token_budget - tokens - 1) * 4 - len(field) - 1
+        if max_chars < 16:
+            break
+        encoded = json.dumps(value, separators=(",", ":"), ensure_ascii=False, default=str)
+        line = f"{field}={_trim(encoded, max_chars)}"
+        line_tokens = estimate_tokens(line) + 1
+        lines.append(line)
+        tokens += line_tokens
+    return "\n".join(lines) or "none"
+
+__all__ = [
+    'EncodedResults', 'encode_results', 'decode_order', 'decode_ranking', 'encode_context',
+    'estimate_tokens'
+]
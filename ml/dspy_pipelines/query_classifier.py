@@ -0,0 +1,310 @@
+"""
+Tiered query classification for pipeline routing: compiled lexical matcher, hashed-feature
+linear model, then the LM for the few queries neither is confident about
+
+Train the linear model offline from labeled queries and/or the feedback log:
+    python -m ml.dspy_pipelines.query_classifier --labels query_labels.jsonl \
+        --feedback-log feedback_log --output query_classifier.json
+"""
+import argparse
+import json
+import math
+import os
+import random
+import re
+import threading
+import zlib
+from collections import OrderedDict
+from typing import Callable, Dict, Any, Iterable, List, Optional, Sequence, Tuple
+
+DEFAULT_MODEL_PATH = os.environ.get("QUERY_CLASSIFIER_MODEL", "query_classifier.json")
+DEFAULT_LABEL_LOG = os.environ.get("QUERY_CLASSIFIER_LABEL_LOG")
+DEFAULT_CONFIDENCE_THRESHOLD = float(os.environ.get("QUERY_CLASSIFIER_THRESHOLD", 0.7))
+DEFAULT_CACHE_SIZE = 10000
+
+FALLBACK_LABEL = 'general'
+
+# Keywords per query type, in priority order for queries that match several types
+QUERY_KEYWORDS = {
+    'academic': ['research', 'paper', 'study', 'studies', 'academic', 'journal', 'thesis', 'citation',
+                 'peer reviewed', 'arxiv', 'scholar'],
+    'commercial': ['buy', 'price', 'shop', 'purchase', 'cheap', 'discount', 'coupon', 'for sale'],
+    'news': ['news', 'latest', 'breaking', 'today', 'headline', 'announced'],
+}
+
+_NON_WORD = re.compile(r"[^\w\s]+")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_query(query: str) -> str:
+    """Lowercase, drop punctuation and collapse whitespace; the cache key for a query"""
+    return _WHITESPACE.sub(" ", _NON_WORD.sub(" ", query.lower())).strip()
+
+class LexicalMatcher:
+    """
+    All keywords compiled into one alternation, so a query is scanned once however many
+    keywords there are. Keywords match at word starts (so "shop" also matches "shopping").
+    """
+
+    def __init__(self, keywords: Dict[str, Sequence[str]] = QUERY_KEYWORDS):
+        self.labels = list(keywords)
+        self._label_of: Dict[str, str] = {}
+        for label, words in keywords.items():
+            for word in words:
+                self._label_of.setdefault(normalize_query(word), label)
+        # Longest first so multi-word keywords win over their prefixes
+        alternation = "|".join(re.escape(word) for word in sorted(self._label_of, key=len, reverse=True))
+        self._pattern = re.compile(rf"\b({alternation})\w*")
+
+    def match(self, normalized_query: str) -> Dict[str, int]:
+        """Number of keyword hits per label"""
+        hits: Dict[str, int] = {}
+        for match in self._pattern.finditer(normalized_query):
+            label = self._label_of[match.group(1)]
+            hits[label] = hits.get(label, 0) + 1
+        return hits
+
+    def classify(self, normalized_query: str) -> Tuple[Optional[str], bool]:
+        """(best label or None, whether exactly one label matched)"""
+        hits = self.match(normalized_query)
+        if not hits:
+            return None, False
+        best = max(self.labels, key=lambda label: hits.get(label, 0))
+        return best, len(hits) == 1
+
+def _features(normalized_query: str, n_features: int) -> List[int]:
+    """Hashed unigram and bigram features (crc32 is stable across processes, unlike hash())"""
+    words = normalized_query.split()
+    grams = [f"u:{word}" for word in words] + [f"b:{a}_{b}" for a, b in zip(words, words[1:])]
+    return sorted({zlib.crc32(gram.encode("utf-8")) % n_features for gram in grams})
+
+def _softmax(scores: List[float]) -> List[float]:
+    top = max(scores)
+    exps = [math.exp(score - top) for score in scores]
+    total = sum(exps)
+    return [value / total for value in exps]
+
+class HashedLinearClassifier:
+    """
+    Multinomial logistic regression over hashed word and bigram features. Weights are sparse:
+    only features seen in training are stored.
+    """
+
+    def __init__(self, labels: Sequence[str], n_features: int = 2 ** 18):
+        self.labels = list(labels)
+        self.n_features = n_features
+        self.bias = [0.0] * len(self.labels)
+        self.weights: Dict[int, List[float]] = {}
+
+    def _scores(self, features: List[int]) -> List[float]:
+        scores = list(self.bias)
+        for feature in features:
+            row = self.weights.get(feature)
+            if row is not None:
+                for i, weight in enumerate(row):
+                    scores[i] += weight
+        return scores
+
+    def predict(self, normalized_query: str) -> Tuple[str, float]:
+        """(label, probability)"""
+        probs = _softmax(self._scores(_features(normalized_query, self.n_features)))
+        best = max(range(len(probs)), key=probs.__getitem__)
+        return self.labels[best], probs[best]
+
+    def train(self, examples: Sequence[Tuple[str, str]], epochs: int = 5, learning_rate: float = 0.5,
+              l2: float = 1e-4, seed: int = 0):
+        """SGD on (query, label) pairs; queries are normalized here"""
+        index = {label: i for i, label in enumerate(self.labels)}
+        data = [(_features(normalize_query(query), self.n_features), index[label])
+                for query, label in examples if label in index]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(data)
+            rate = learning_rate / (1 + epoch)
+            for features, target in data:
+                probs = _softmax(self._scores(features))
+                gradient = [p - (1.0 if i == target else 0.0) for i, p in enumerate(probs)]
+                for i, g in enumerate(gradient):
+                    self.bias[i] -= rate * g
+                for feature in features:
+                    row = self.weights.setdefault(feature, [0.0] * len(self.labels))
+                    for i, g in enumerate(gradient):
+                        row[i] -= rate * (g + l2 * row[i])
+
+    def save(self, path: str):
+        """Write the model as JSON (atomically)"""
+        model = {
+            "labels": self.labels,
+            "n_features": self.n_features,
+            "bias": self.bias,
+            "weights": {str(feature): [round(w, 6) for w in row] for feature, row in self.weights.items()}
+        }
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(model, f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedLinearClassifier":
+        with open(path) as f:
+            model = json.load(f)
+        classifier = cls(model["labels"], model["n_features"])
+        classifier.bias = model["bias"]
+        classifier.weights = {int(feature): row for feature, row in model["weights"].items()}
+        return classifier
+
+class QueryClassifierCascade:
+    """
+    Classifies queries through increasingly expensive tiers, caching the result per normalized
+    query:
+      1. lexical: exactly one query type's keywords match
+      2. model: the hashed linear model's probability reaches `threshold`
+      3. lm: the LM classifier, only when the model exists but is unsure
+    Without a trained model, queries the lexical tier cannot settle use its best guess, or
+    'general'. LM decisions can be appended to `label_log` as training data for the model.
+    """
+
+    def __init__(self, lexical: Optional[LexicalMatcher] = None,
+                 model: Optional[HashedLinearClassifier] = None,
+                 lm: Optional[Callable[[str], str]] = None,
+                 threshold: float = DEFAULT_CONFIDENCE_THRESHOLD, cache_size: int = DEFAULT_CACHE_SIZE,
+                 label_log: Optional[str] = DEFAULT_LABEL_LOG):
+        self.lexical = lexical or LexicalMatcher()
+        self.model = model
+        self.lm = lm
+        self.threshold = threshold
+        self.cache_size = cache_size
+        self.label_log = label_log
+        self._cache: "OrderedDict[str, Tuple[str, str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"cache_hits": 0, "lexical": 0, "model": 0, "lm": 0, "lm_errors": 0, "fallback": 0}
+
+    def classify(self, query: str) -> str:
+        return self.classify_with_tier(query)[0]
+
+    def classify_with_tier(self, query: str) -> Tuple[str, str, float]:
+        """(label, tier that decided it, confidence)"""
+        key = normalize_query(query)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                self.stats["cache_hits"] += 1
+                return cached
+
+        decision = self._decide(key)
+        with self._lock:
+            self.stats[decision[1]] += 1
+            self._cache[key] = decision
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return decision
+
+    def _decide(self, key: str) -> Tuple[str, str, float]:
+        guess, unambiguous = self.lexical.classify(key)
+        if unambiguous:
+            return guess, "lexical", 1.0
+
+        if self.model is not None:
+            label, confidence = self.model.predict(key)
+            if confidence >= self.threshold:
+                return label, "model", confidence
+            if self.lm is not None:
+                try:
+                    lm_label = self.lm(key)
+                except Exception as e:
+                    with self._lock:
+                        self.stats["lm_errors"] += 1
+                    print(f"LM query classification failed: {e}")
+                else:
+                    if lm_label in self.lexical.labels or lm_label == FALLBACK_LABEL:
+                        self._log_label(key, lm_label)
+                        return lm_label, "lm", 1.0
+            return label, "model", confidence
+
+        return guess or FALLBACK_LABEL, "fallback", 0.0
+
+    def _log_label(self, key: str, label: str):
+        if not self.label_log:
+            return
+        try:
+            with open(self.label_log, "a") as f:
+                f.write(json.dumps({"query": key, "label": label}) + "\n")
+        except OSError as e:
+            print(f"Error logging query label: {e}")
+
+    def clear_cache(self):
+        with self._lock:
+            self._cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Decisions per tier, cache hits and cache size"""
+        with self._lock:
+            return {**self.stats, "cache_size": len(self._cache), "model_loaded": self.model is not None}
+
+def load_model(path: str = DEFAULT_MODEL_PATH) -> Optional[HashedLinearClassifier]:
+    """The trained model at `path`, or None if there is none yet"""
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        return HashedLinearClassifier.load(path)
+    except (OSError, ValueError, KeyError) as e:
+        print(f"Error loading query classifier model {path}: {e}")
+        return None
+
+def _read_labels(path: str) -> Iterable[Tuple[str, str]]:
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                yield record["query"], record["label"]
+
+def _weak_labels(feedback_log_dir: str, lexical: LexicalMatcher) -> Iterable[Tuple[str, str]]:
+    """Logged queries labeled by the lexical tier: its label where unambiguous, 'general' with no hits"""
+    from backend.services.feedback_log import FeedbackLog
+    log = FeedbackLog(feedback_log_dir)
+    try:
+        seen = set()
+        for record in log.read(0):
+            key = normalize_query(record.query)
+            if key in seen:
+                continue
+            seen.add(key)
+            label, unambiguous = lexical.classify(key)
+            if unambiguous:
+                yield key, label
+            elif label is None:
+                yield key, FALLBACK_LABEL
+    finally:
+        log.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Train the hashed linear query classifier")
+    parser.add_argument("--labels", action="append", default=[],
+                        help="JSONL of {\"query\", \"label\"} records (e.g. the LM label log); repeatable")
+    parser.add_argument("--feedback-log", help="Feedback log directory to take weakly labeled queries from")
+    parser.add_argument("--output", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--n-features", type=int, default=2 ** 18)
+    args = parser.parse_args()
+
+    lexical = LexicalMatcher()
+    examples: List[Tuple[str, str]] = []
+    for path in args.labels:
+        examples.extend(_read_labels(path))
+    if args.feedback_log:
+        examples.extend(_weak_labels(args.feedback_log, lexical))
+    if not examples:
+        parser.error("no training examples")
+
+    model = HashedLinearClassifier(lexical.labels + [FALLBACK_LABEL], args.n_features)
+    model.train(examples, epochs=args.epochs)
+    model.save(args.output)
+    print(f"Trained on {len(examples)} queries; wrote {args.output}")
+
+if __name__ == "__main__":
+    main()
+
+__all__ = [
+    'QueryClassifierCascade', 'LexicalMatcher', 'HashedLinearClassifier', 'normalize_query', 'load_model',
+    'QUERY_KEYWORDS'
+]
@@ -3,6 +3,7 @@ DSPy Pipeline for Query Reasoning and Processing
 """
 import dspy
 from typing import List, Optional
+from ml.dspy_pipelines.predictor_cache import MemoizedPredictor
 
 class QueryAnalysisSignature(dspy.Signature):
     """Signature for analyzing search queries"""
@@ -18,18 +19,25 @@ class QueryExpansionSignature(dspy.Signature):
 class QueryReasoningPipeline(dspy.Module):
     """Pipeline for reasoning about search queries using DSPy"""
     
-    def __init__(self):
+    def __init__(self, memoize: bool = True):
         super().__init__()
         self.analyze_query = dspy.Predict(QueryAnalysisSignature)
         self.expand_query = dspy.Predict(QueryExpansionSignature)
+        self.memoize = memoize
         
+    def _call(self, predictor, **kwargs):
+        # Memo keys include predictor state, so optimized predictors never reuse stale outputs
+        if self.memoize:
+            return MemoizedPredictor(predictor)(**kwargs)
+        return predictor(**kwargs)
+
     def forward(self, query: str, user_context: Optional[str] = None):
         # Analyze the query
-        analysis = self.analyze_query(query=query)
+        analysis = self._call(self.analyze_query, query=query)
         
         # Expand the query based on user context
         context = user_context or "General user"
-        expansion = self.expand_query(query=query, context=context)
+        expansion = self._call(self.expand_query, query=query, context=context)
         
         return dspy.Prediction(
             intent_analysis=analysis.analysis,
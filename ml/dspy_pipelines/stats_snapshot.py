@@ -0,0 +1,93 @@
+"""
+Periodically refreshed, versioned snapshots of expensive statistics
+"""
+import copy
+import os
+import threading
+import time
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, Hashable, Optional
+
+DEFAULT_STATS_REFRESH_INTERVAL = float(os.environ.get("GEPA_STATS_REFRESH_INTERVAL", 1.0))
+DEFAULT_STATS_MAX_AGE = float(os.environ.get("GEPA_STATS_MAX_AGE", 30.0))
+
+@dataclass(frozen=True)
+class StatsSnapshot:
+    """
+    Stats computed at one point in time. Shared by every reader, so `stats` must not be
+    modified; use to_dict() for a private copy.
+    """
+    version: int
+    created_at: float
+    stats: Dict[str, Any]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"version": self.version, "created_at": self.created_at, "stats": copy.deepcopy(self.stats)}
+
+class StatsSnapshotter:
+    """
+    Serves the latest snapshot of `compute()` to readers without computing anything on their
+    path. A background thread checks `change_token()` (which must be cheap) every
+    `refresh_interval` seconds and recomputes when it changed or the snapshot is older than
+    `max_age` (for stats that change without moving the token).
+    """
+
+    def __init__(self, compute: Callable[[], Dict[str, Any]], change_token: Callable[[], Hashable],
+                 refresh_interval: float = DEFAULT_STATS_REFRESH_INTERVAL,
+                 max_age: float = DEFAULT_STATS_MAX_AGE):
+        self.compute = compute
+        self.change_token = change_token
+        self.refresh_interval = refresh_interval
+        self.max_age = max_age
+        self._snapshot: Optional[StatsSnapshot] = None
+        self._token: Hashable = None
+        self._refresh_lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+        self.refresh_count = 0
+
+    def get(self) -> StatsSnapshot:
+        """Latest snapshot; only the very first call computes one"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            snapshot = self.refresh()
+            self._ensure_started()
+        return snapshot
+
+    def refresh(self) -> StatsSnapshot:
+        """Recompute the snapshot now"""
+        with self._refresh_lock:
+            token = self.change_token()
+            stats = self.compute()
+            version = self._snapshot.version + 1 if self._snapshot is not None else 1
+            self._token = token
+            self._snapshot = StatsSnapshot(version=version, created_at=time.time(), stats=stats)
+            self.refresh_count += 1
+            return self._snapshot
+
+    def refresh_if_stale(self) -> bool:
+        """Recompute if the change token moved or the snapshot is too old; returns whether it did"""
+        snapshot = self._snapshot
+        if (snapshot is not None and self.change_token() == self._token
+                and time.time() - snapshot.created_at < self.max_age):
+            return False
+        self.refresh()
+        return True
+
+    def _ensure_started(self):
+        with self._refresh_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="stats-snapshotter", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while not self._stopped.wait(self.refresh_interval):
+            try:
+                self.refresh_if_stale()
+            except Exception as e:
+                print(f"Error refreshing stats snapshot: {e}")
+
+    def stop(self):
+        self._stopped.set()
+
+__all__ = ['StatsSnapshot', 'StatsSnapshotter']
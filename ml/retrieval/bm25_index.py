@@ -0,0 +1,451 @@
+"""
+Local BM25 retrieval over an inverted index stored as memory-mapped segments
+
+Build an index from a JSONL corpus (one {"id", "title", "url", "snippet"/"text"} object per line):
+    python -m ml.retrieval.bm25_index build --corpus corpus.jsonl --index-dir search_index
+Query it:
+    python -m ml.retrieval.bm25_index search --index-dir search_index "query terms"
+"""
+import argparse
+import bisect
+import json
+import math
+import os
+import re
+import shutil
+import threading
+import time
+from array import array
+from collections import Counter
+import numpy as np
+from typing import Dict, Any, Iterable, List, Optional, Sequence, Tuple
+from ml.retrieval.postings import vbyte_encode, vbyte_decode
+
+DEFAULT_INDEX_DIR = os.environ.get("SEARCH_INDEX_DIR")
+
+BLOCK_SIZE = 128
+TEXT_FIELDS = ("title", "snippet", "text")
+STORED_FIELDS = ("id", "title", "url", "snippet")
+SEGMENT_PREFIX = "segment-"
+
+_TOKEN = re.compile(r"\w+")
+STOPWORDS = frozenset("a an and are as at be by for from in is it its of on or that the this to was with".split())
+
+def tokenize(text: str) -> List[str]:
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+def _term_weight(tf, doc_length, k1: float, b: float, avgdl: float):
+    """BM25 term-frequency component; increasing in tf and decreasing in doc_length"""
+    tf = np.asarray(tf, dtype=np.float64)
+    return tf * (k1 + 1.0) / (tf + k1 * (1.0 - b + b * np.asarray(doc_length, dtype=np.float64) / avgdl))
+
+def _load_bytes(path: str) -> np.ndarray:
+    """Read-only memory map of a file as bytes (np.memmap rejects empty files)"""
+    if os.path.getsize(path) == 0:
+        return np.empty(0, dtype=np.uint8)
+    return np.memmap(path, dtype=np.uint8, mode="r")
+
+class IndexWriter:
+    """
+    Accumulates documents in memory and writes them out as an immutable segment every
+    `max_docs_per_segment` documents (and on flush/close). Segments are written to a temporary
+    directory and renamed into place, so readers never see a partial segment.
+
+    Each term's postings are split into blocks of `block_size` documents; doc ID deltas and
+    term frequencies are variable-byte encoded per block. For every block the writer records
+    its last doc ID, highest term frequency and shortest document, which bound the block's BM25
+    contribution at query time whatever the corpus statistics are by then.
+    """
+
+    def __init__(self, index_dir: str, max_docs_per_segment: int = 500_000, block_size: int = BLOCK_SIZE,
+                 text_fields: Sequence[str] = TEXT_FIELDS, stored_fields: Sequence[str] = STORED_FIELDS):
+        self.index_dir = index_dir
+        self.max_docs_per_segment = max_docs_per_segment
+        self.block_size = block_size
+        self.text_fields = tuple(text_fields)
+        self.stored_fields = tuple(stored_fields)
+        os.makedirs(index_dir, exist_ok=True)
+        existing = [name for name in os.listdir(index_dir)
+                    if name.startswith(SEGMENT_PREFIX) and not name.endswith(".tmp")]
+        self._next_segment = max((int(name[len(SEGMENT_PREFIX):]) for name in existing), default=-1) + 1
+        self._reset()
+
+    def _reset(self):
+        self._postings: Dict[str, Tuple[array, array]] = {}
+        self._lengths = array("I")
+        self._stored: List[bytes] = []
+
+    def add(self, doc: Dict[str, Any]):
+        doc_id = len(self._lengths)
+        tokens = tokenize(" ".join(str(doc[field]) for field in self.text_fields if doc.get(field)))
+        for term, tf in Counter(tokens).items():
+            postings = self._postings.get(term)
+            if postings is None:
+                postings = self._postings[term] = (array("I"), array("I"))
+            postings[0].append(doc_id)
+            postings[1].append(tf)
+        self._lengths.append(len(tokens))
+        stored = {field: doc[field] for field in self.stored_fields if field in doc}
+        self._stored.append(json.dumps(stored, ensure_ascii=False).encode("utf-8"))
+        if len(self._lengths) >= self.max_docs_per_segment:
+            self.flush()
+
+    def add_all(self, docs: Iterable[Dict[str, Any]]) -> int:
+        count = 0
+        for doc in docs:
+            self.add(doc)
+            count += 1
+        return count
+
+    def flush(self) -> Optional[str]:
+        """Write buffered documents as a new segment; returns its path"""
+        if not self._lengths:
+            return None
+        name = f"{SEGMENT_PREFIX}{self._next_segment:06d}"
+        final_path = os.path.join(self.index_dir, name)
+        tmp_path = final_path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        os.makedirs(tmp_path)
+        self._write_segment(tmp_path)
+        os.rename(tmp_path, final_path)
+        self._next_segment += 1
+        self._reset()
+        return final_path
+
+    def _write_segment(self, path: str):
+        lengths = np.frombuffer(self._lengths, dtype=np.uint32)
+        terms = sorted(self._postings)
+        encoded_terms = [term.encode("utf-8") for term in terms]
+
+        term_offsets = np.zeros(len(terms) + 1, dtype=np.uint64)
+        term_offsets[1:] = np.cumsum([len(term) for term in encoded_terms])
+        term_df = np.empty(len(terms), dtype=np.uint32)
+        term_block_start = np.zeros(len(terms) + 1, dtype=np.uint64)
+        block_last, block_max_tf, block_min_dl = array("I"), array("I"), array("I")
+        doc_offsets, tf_offsets = array("Q", [0]), array("Q", [0])
+
+        with open(os.path.join(path, "postings_docs.bin"), "wb") as docs_file, \
+                open(os.path.join(path, "postings_tfs.bin"), "wb") as tfs_file:
+            for i, term in enumerate(terms):
+                doc_ids = np.frombuffer(self._postings[term][0], dtype=np.uint32)
+                tfs = np.frombuffer(self._postings[term][1], dtype=np.uint32)
+                deltas = np.diff(doc_ids, prepend=np.uint32(0))
+                term_df[i] = len(doc_ids)
+                for start in range(0, len(doc_ids), self.block_size):
+                    end = min(start + self.block_size, len(doc_ids))
+                    doc_bytes = vbyte_encode(deltas[start:end])
+                    tf_bytes = vbyte_encode(tfs[start:end])
+                    docs_file.write(doc_bytes)
+                    tfs_file.write(tf_bytes)
+                    doc_offsets.append(doc_offsets[-1] + len(doc_bytes))
+                    tf_offsets.append(tf_offsets[-1] + len(tf_bytes))
+                    block_last.append(int(doc_ids[end - 1]))
+                    block_max_tf.append(int(tfs[start:end].max()))
+                    block_min_dl.append(int(lengths[doc_ids[start:end]].min()))
+                term_block_start[i + 1] = len(block_last)
+
+        with open(os.path.join(path, "terms.bin"), "wb") as f:
+            f.write(b"".join(encoded_terms))
+        stored_offsets = np.zeros(len(self._stored) + 1, dtype=np.uint64)
+        stored_offsets[1:] = np.cumsum([len(doc) for doc in self._stored])
+        with open(os.path.join(path, "stored.bin"), "wb") as f:
+            f.write(b"".join(self._stored))
+
+        arrays = {
+            "term_offsets": term_offsets,
+            "term_df": term_df,
+            "term_block_start": term_block_start,
+            "block_last": np.frombuffer(block_last, dtype=np.uint32),
+            "block_max_tf": np.frombuffer(block_max_tf, dtype=np.uint32),
+            "block_min_dl": np.frombuffer(block_min_dl, dtype=np.uint32),
+            "block_doc_offsets": np.frombuffer(doc_offsets, dtype=np.uint64),
+            "block_tf_offsets": np.frombuffer(tf_offsets, dtype=np.uint64),
+            "doc_lengths": lengths,
+            "stored_offsets": stored_offsets,
+        }
+        for name, values in arrays.items():
+            np.save(os.path.join(path, f"{name}.npy"), values)
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump({
+                "num_docs": len(lengths),
+                "total_length": int(lengths.sum(dtype=np.uint64)),
+                "num_terms": len(terms),
+                "num_blocks": len(block_last),
+                "block_size": self.block_size
+            }, f)
+
+    def close(self):
+        self.flush()
+
+class _TermTable:
+    """Sorted term dictionary read lazily from the mapped terms file; supports bisect"""
+
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i: int) -> str:
+        return self._blob[int(self._offsets[i]):int(self._offsets[i + 1])].tobytes().decode("utf-8")
+
+class IndexSegment:
+    """Read-only view of one segment; every array is memory-mapped, so opening is O(1)"""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        self.num_docs = meta["num_docs"]
+        self.total_length = meta["total_length"]
+        self.block_size = meta["block_size"]
+
+        def load(name: str) -> np.ndarray:
+            return np.load(os.path.join(path, f"{name}.npy"), mmap_mode="r")
+
+        self.terms = _TermTable(_load_bytes(os.path.join(path, "terms.bin")), load("term_offsets"))
+        self.term_df = load("term_df")
+        self.term_block_start = load("term_block_start")
+        self.block_last = load("block_last")
+        self.block_max_tf = load("block_max_tf")
+        self.block_min_dl = load("block_min_dl")
+        self.block_doc_offsets = load("block_doc_offsets")
+        self.block_tf_offsets = load("block_tf_offsets")
+        self.doc_lengths = load("doc_lengths")
+        self.stored_offsets = load("stored_offsets")
+        self._doc_bytes = _load_bytes(os.path.join(path, "postings_docs.bin"))
+        self._tf_bytes = _load_bytes(os.path.join(path, "postings_tfs.bin"))
+        self._stored = _load_bytes(os.path.join(path, "stored.bin"))
+
+    def lookup(self, term: str) -> int:
+        """Term number, or -1 if the term does not occur in this segment"""
+        i = bisect.bisect_left(self.terms, term)
+        return i if i < len(self.terms) and self.terms[i] == term else -1
+
+    def document(self, doc_id: int) -> Dict[str, Any]:
+        start, end = int(self.stored_offsets[doc_id]), int(self.stored_offsets[doc_id + 1])
+        return json.loads(self._stored[start:end].tobytes().decode("utf-8"))
+
+    @staticmethod
+    def _gather(buffer: np.ndarray, offsets: np.ndarray, blocks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Concatenated encoded bytes of the given blocks, and each block's byte length"""
+        starts = offsets[blocks].astype(np.int64)
+        sizes = offsets[blocks + 1].astype(np.int64) - starts
+        if len(blocks) and np.all(np.diff(blocks) == 1):
+            return buffer[starts[0]:starts[0] + sizes.sum()], sizes
+        positions = np.repeat(starts - (np.cumsum(sizes) - sizes), sizes) + np.arange(sizes.sum())
+        return buffer[positions], sizes
+
+    def decode_blocks(self, term: int, blocks: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Doc IDs and term frequencies in the given (ascending) blocks of a term"""
+        first_block = int(self.term_block_start[term])
+        df = int(self.term_df[term])
+        counts = np.minimum(self.block_size, df - (blocks - first_block) * self.block_size)
+        deltas = vbyte_decode(self._gather(self._doc_bytes, self.block_doc_offsets, blocks)[0]).astype(np.int64)
+        tfs = vbyte_decode(self._gather(self._tf_bytes, self.block_tf_offsets, blocks)[0])
+
+        # Prefix sums restart at every block from the previous block's last doc ID
+        bases = np.where(blocks > first_block, self.block_last[np.maximum(blocks - 1, 0)], 0).astype(np.int64)
+        sums = np.cumsum(deltas)
+        block_starts = np.cumsum(counts) - counts
+        restart = sums[block_starts] - deltas[block_starts] - bases
+        return sums - np.repeat(restart, counts), tfs
+
+    def search(self, query_terms: Sequence[Tuple[int, float]], k: int, threshold: float,
+               k1: float, b: float, avgdl: float, stats: Dict[str, int]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Top-k (doc IDs, scores) scoring at least `threshold`, term-at-a-time with MaxScore pruning.
+        Terms are visited by decreasing upper bound. While unseen documents could still beat the
+        current k-th score, a term's postings are decoded in full (essential terms). After that
+        only existing candidates are scored: each term's block bounds drop candidates that can
+        no longer reach the threshold, and only blocks holding surviving candidates are decoded.
+        """
+        plan = []
+        for term, idf in query_terms:
+            first, last = int(self.term_block_start[term]), int(self.term_block_start[term + 1])
+            bounds = idf * _term_weight(self.block_max_tf[first:last], self.block_min_dl[first:last], k1, b, avgdl)
+            bounds *= 1.0 + 1e-9  # Keep the bound above scores computed in a different order
+            plan.append((float(bounds.max()), term, idf, first, last, bounds))
+        plan.sort(key=lambda entry: -entry[0])
+        remaining = np.concatenate([np.cumsum([entry[0] for entry in plan][::-1])[::-1], [0.0]])
+
+        docs = np.empty(0, dtype=np.int64)
+        scores = np.empty(0, dtype=np.float64)
+        if not plan or remaining[0] <= threshold:
+            return docs, scores
+
+        for i, (_, term, idf, first, last, bounds) in enumerate(plan):
+            if len(scores) >= k:
+                threshold = max(threshold, float(np.partition(scores, len(scores) - k)[len(scores) - k]))
+            if remaining[i] > threshold:
+                # Essential: a document not seen yet could still make the top k
+                term_docs, tfs = self.decode_blocks(term, np.arange(first, last))
+                stats["postings_decoded"] += len(term_docs)
+                term_scores = idf * _term_weight(tfs, self.doc_lengths[term_docs], k1, b, avgdl)
+                merged, inverse = np.unique(np.concatenate([docs, term_docs]), return_inverse=True)
+                scores = np.bincount(inverse, weights=np.concatenate([scores, term_scores]), minlength=len(merged))
+                docs = merged
+                continue
+
+            # Non-essential: only candidates whose score can still exceed the threshold matter
+            block_index = np.searchsorted(self.block_last[first:last], docs)
+            in_term = block_index < last - first
+            block_bound = np.where(in_term, bounds[np.minimum(block_index, last - first - 1)], 0.0)
+            keep = scores + block_bound + remaining[i + 1] >= threshold
+            docs, scores, block_index, in_term = docs[keep], scores[keep], block_index[keep], in_term[keep]
+            if not len(docs):
+                break
+            blocks = np.unique(block_index[in_term]) + first
+            stats["blocks_skipped"] += (last - first) - len(blocks)
+            if not len(blocks):
+                continue
+            term_docs, tfs = self.decode_blocks(term, blocks)
+            stats["postings_decoded"] += len(term_docs)
+            position = np.minimum(np.searchsorted(term_docs, docs), len(term_docs) - 1)
+            hit = term_docs[position] == docs
+            scores[hit] += idf * _term_weight(tfs[position[hit]], self.doc_lengths[docs[hit]], k1, b, avgdl)
+
+        keep = scores >= threshold
+        docs, scores = docs[keep], scores[keep]
+        if len(scores) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            docs, scores = docs[top], scores[top]
+        return docs, scores
+
+class BM25Index:
+    """
+    BM25 search over every segment in `index_dir`, with corpus statistics (document count,
+    average length, document frequencies) combined across segments. Segments are searched in
+    turn and the k-th best score so far is carried into the next as its pruning threshold.
+    """
+
+    def __init__(self, index_dir: str, k1: float = 1.2, b: float = 0.75):
+        self.index_dir = index_dir
+        self.k1 = k1
+        self.b = b
+        self._segments: List[IndexSegment] = []
+        self._lock = threading.Lock()
+        self.stats = {"queries": 0, "postings_decoded": 0, "blocks_skipped": 0, "total_time": 0.0}
+        self.reload()
+
+    def reload(self):
+        """Open segments added since the last load (segments are immutable once written)"""
+        names = sorted(
+            name for name in os.listdir(self.index_dir)
+            if name.startswith(SEGMENT_PREFIX) and not name.endswith(".tmp")
+        ) if os.path.isdir(self.index_dir) else []
+        opened = {os.path.basename(segment.path): segment for segment in self._segments}
+        self._segments = [opened.get(name) or IndexSegment(os.path.join(self.index_dir, name)) for name in names]
+
+    @property
+    def num_docs(self) -> int:
+        return sum(segment.num_docs for segment in self._segments)
+
+    def search(self, query: str, k: int = 10) -> List[Dict[str, Any]]:
+        """Top-k stored documents for a query with "score" (normalized to the best hit) and "bm25_score" """
+        start_time = time.time()
+        segments = self._segments
+        num_docs = sum(segment.num_docs for segment in segments)
+        query_terms = list(dict.fromkeys(tokenize(query)))
+        if not num_docs or not query_terms or k <= 0:
+            return []
+        avgdl = max(sum(segment.total_length for segment in segments) / num_docs, 1e-9)
+
+        # Per segment term numbers, and document frequencies over the whole index
+        lookups = [[segment.lookup(term) for term in query_terms] for segment in segments]
+        idf = []
+        for j in range(len(query_terms)):
+            df = sum(int(segment.term_df[terms[j]]) for segment, terms in zip(segments, lookups) if terms[j] >= 0)
+            idf.append(math.log(1.0 + (num_docs - df + 0.5) / (df + 0.5)))
+
+        search_stats = {"postings_decoded": 0, "blocks_skipped": 0}
+        hits: List[Tuple[float, int, int]] = []
+        threshold = 0.0
+        for s, (segment, terms) in enumerate(zip(segments, lookups)):
+            segment_terms = [(term, idf[j]) for j, term in enumerate(terms) if term >= 0]
+            if not segment_terms:
+                continue
+            docs, scores = segment.search(segment_terms, k, threshold, self.k1, self.b, avgdl, search_stats)
+            hits.extend(zip(scores.tolist(), [s] * len(docs), docs.tolist()))
+            if len(hits) >= k:
+                hits = sorted(hits, reverse=True)[:k]
+                threshold = hits[-1][0]
+        hits = sorted(hits, reverse=True)[:k]
+
+        results = []
+        for score, s, doc_id in hits:
+            results.append({**segments[s].document(doc_id), "score": score / hits[0][0], "bm25_score": score})
+
+        with self._lock:
+            self.stats["queries"] += 1
+            self.stats["postings_decoded"] += search_stats["postings_decoded"]
+            self.stats["blocks_skipped"] += search_stats["blocks_skipped"]
+            self.stats["total_time"] += time.time() - start_time
+        return results
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Index size and query counters"""
+        with self._lock:
+            queries = self.stats["queries"]
+            return {
+                "index_dir": self.index_dir,
+                "segments": len(self._segments),
+                "documents": self.num_docs,
+                "queries": queries,
+                "average_latency": self.stats["total_time"] / queries if queries else 0.0,
+                "postings_decoded": self.stats["postings_decoded"],
+                "blocks_skipped": self.stats["blocks_skipped"]
+            }
+
+_default_index: Optional[BM25Index] = None
+_default_index_lock = threading.Lock()
+
+def get_default_index() -> Optional[BM25Index]:
+    """The index in SEARCH_INDEX_DIR, shared by every agent; None when no index is configured"""
+    global _default_index
+    if not DEFAULT_INDEX_DIR or not os.path.isdir(DEFAULT_INDEX_DIR):
+        return None
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = BM25Index(DEFAULT_INDEX_DIR)
+        return _default_index
+
+def _read_corpus(path: str) -> Iterable[Dict[str, Any]]:
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query a local BM25 index")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="Index a JSONL corpus (appends new segments)")
+    build.add_argument("--corpus", required=True)
+    build.add_argument("--index-dir", default=DEFAULT_INDEX_DIR or "search_index")
+    build.add_argument("--segment-docs", type=int, default=500_000)
+    search = commands.add_parser("search", help="Run a query")
+    search.add_argument("--index-dir", default=DEFAULT_INDEX_DIR or "search_index")
+    search.add_argument("-k", type=int, default=10)
+    search.add_argument("query")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        start_time = time.time()
+        writer = IndexWriter(args.index_dir, max_docs_per_segment=args.segment_docs)
+        count = writer.add_all(_read_corpus(args.corpus))
+        writer.close()
+        print(f"Indexed {count} documents in {time.time() - start_time:.1f}s")
+    else:
+        index = BM25Index(args.index_dir)
+        start_time = time.time()
+        results = index.search(args.query, args.k)
+        elapsed_ms = (time.time() - start_time) * 1000
+        for result in results:
+            print(f"{result['bm25_score']:8.3f}  {result.get('id', '')}  {result.get('title', '')}")
+        print(f"{len(results)} results in {elapsed_ms:.2f} ms")
+
+if __name__ == "__main__":
+    main()
+
+__all__ = ['BM25Index', 'IndexWriter', 'IndexSegment', 'tokenize', 'get_default_index']
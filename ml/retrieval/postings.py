@@ -0,0 +1,39 @@
+"""
+Vectorized variable-byte codec for posting lists
+"""
+import numpy as np
+
+_SHIFTS = np.arange(0, 64, 7, dtype=np.uint64)
+
+def vbyte_encode(values: np.ndarray) -> bytes:
+    """
+    Encode non-negative integers 7 bits per byte, least significant group first; every byte but
+    the last of a value has the high bit set
+    """
+    values = np.asarray(values, dtype=np.uint64)
+    if len(values) == 0:
+        return b""
+    nbytes = np.ones(len(values), dtype=np.int64)
+    for shift in (7, 14, 21, 28, 35, 42, 49, 56, 63):
+        nbytes += values >= np.uint64(1 << shift)
+    owner = np.repeat(np.arange(len(values)), nbytes)
+    starts = np.cumsum(nbytes) - nbytes
+    position = np.arange(len(owner)) - starts[owner]
+    groups = (values[owner] >> _SHIFTS[position]) & np.uint64(0x7F)
+    more = (position < nbytes[owner] - 1).astype(np.uint64) << np.uint64(7)
+    return (groups | more).astype(np.uint8).tobytes()
+
+def vbyte_decode(data) -> np.ndarray:
+    """Decode a buffer written by vbyte_encode into uint64 values"""
+    encoded = data if isinstance(data, np.ndarray) else np.frombuffer(data, dtype=np.uint8)
+    if len(encoded) == 0:
+        return np.empty(0, dtype=np.uint64)
+    ends = np.flatnonzero(encoded < 0x80)
+    starts = np.empty_like(ends)
+    starts[0] = 0
+    starts[1:] = ends[:-1] + 1
+    position = np.arange(len(encoded)) - np.repeat(starts, ends - starts + 1)
+    groups = (encoded & 0x7F).astype(np.uint64) << _SHIFTS[position]
+    return np.add.reduceat(groups, starts)
+
+__all__ = ['vbyte_encode', 'vbyte_decode']
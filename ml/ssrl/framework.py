@@ -1,10 +1,18 @@
 """
 SSRL (Self-Search Reinforcement Learning) Implementation
 """
+import json
 import numpy as np
-from typing import Dict, List, Any, Tuple
+import os
+import time
+from typing import Dict, List, Any, Callable, Optional, Sequence, Tuple, Union
 from dataclasses import dataclass
 from abc import ABC, abstractmethod
+from ml.ssrl.segment_state import SegmentWeightTable, DEFAULT_MAX_SEGMENTS
+
+# Result sources the search agent merges, and the features the ranking agent scores results by
+SEARCH_SOURCES = ("local", "text", "cross_modal", "image")
+RANKING_FEATURES = ("relevance", "freshness", "authority", "diversity")
 
 @dataclass
 class FeedbackEvent:
@@ -14,6 +22,8 @@ class FeedbackEvent:
     user_id: str
     feedback: float  # -1.0 to 1.0 scale
     timestamp: float
+    source: str = ""  # Source of the result the feedback is about
+    features: Tuple[float, ...] = ()  # Its ranking feature values, in RANKING_FEATURES order
 
 class BaseAgentLearner(ABC):
     """Base class for agent learners in SSRL"""
@@ -26,78 +36,203 @@ class BaseAgentLearner(ABC):
     def update_parameters(self, feedback: FeedbackEvent) -> Dict[str, Any]:
         """Update agent parameters based on feedback"""
         pass
+
+    @abstractmethod
+    def update_batch(self, feedback_values: np.ndarray,
+                     segment_keys: Optional[Sequence[str]] = None,
+                     credit: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Apply a whole batch of feedback values (and their segments) at once and return a summary"""
+        pass
+
+    def credit(self, sources: Sequence[str], features: Sequence[Sequence[float]]) -> Optional[np.ndarray]:
+        """
+        How much each event's feedback is about each parameter (events × parameters), from the
+        source and features of the result it was given on; None credits every parameter equally
+        """
+        return None
+
+    def save_checkpoint(self, checkpoint_dir: str):
+        """Persist learned state"""
+        pass
+
+    def load_checkpoint(self, checkpoint_dir: str):
+        """Restore learned state saved by save_checkpoint"""
+        pass
         
     def record_performance(self, score: float):
         """Record agent performance"""
         self.performance_history.append(score)
 
-class SearchAgentLearner(BaseAgentLearner):
-    """Learner for the search agent using SSRL"""
-    
-    def __init__(self, agent_id: str):
+class MultiplicativeWeightsLearner(BaseAgentLearner):
+    """
+    Learner that scales weights up on positive feedback and down on negative feedback, then
+    normalizes. Each event only scales the parameters it credits (see credit), by factor**credit.
+    Normalization is scale-invariant, so a batch reduces to one update:
+    w <- normalize(w * up**positive_credit * down**negative_credit), computed in log space.
+    Factors are a scalar or one per parameter. Without credit and with the same factor for every
+    parameter the normalized weights never move, so such batches keep no per-segment rows.
+    Segments start from, and until their first feedback share, the global weights.
+    """
+    parameters: Tuple[str, ...] = ()
+    weights_key = "weights"
+    positive_factor: Union[float, Tuple[float, ...]] = 1.0
+    negative_factor: Union[float, Tuple[float, ...]] = 1.0
+
+    def __init__(self, agent_id: str, max_segments: int = DEFAULT_MAX_SEGMENTS):
         super().__init__(agent_id)
-        self.source_weights = {"web": 1.0, "images": 1.0, "videos": 1.0}
-        
+        self.weights = np.ones(len(self.parameters), dtype=np.float64)
+        # Per-segment weights, learned only from that segment's feedback
+        self.max_segments = max_segments
+        self.segments = SegmentWeightTable(self.weights, max_rows=max_segments)
+        self.log_positive = np.broadcast_to(np.log(self.positive_factor), self.weights.shape).astype(np.float64)
+        self.log_negative = np.broadcast_to(np.log(self.negative_factor), self.weights.shape).astype(np.float64)
+
+    @property
+    def learns_segments(self) -> bool:
+        """Whether uncredited feedback can move a segment away from the default weights"""
+        return bool(np.ptp(self.log_positive) > 0 or np.ptp(self.log_negative) > 0)
+
+    def has_segment(self, segment: str) -> bool:
+        """Whether a segment has weights of its own (it received feedback)"""
+        return segment in self.segments
+
+    def _weights_dict(self, weights: Optional[np.ndarray] = None) -> Dict[str, float]:
+        return dict(zip(self.parameters, (self.weights if weights is None else weights).tolist()))
+
+    def get_weights(self, segment: Optional[str] = None) -> Dict[str, float]:
+        """Global weights, or a segment's weights (the global ones if it has no feedback yet)"""
+        if segment is None or segment not in self.segments:
+            return self._weights_dict()
+        return self._weights_dict(self.segments.weights(segment))
+
     def update_parameters(self, feedback: FeedbackEvent) -> Dict[str, Any]:
-        """Update search parameters based on user feedback"""
-        # Simple reinforcement learning update
-        # Increase weight of sources that led to positive feedback
-        if feedback.feedback > 0:
-            # Positive feedback - slightly increase weights
-            for source in self.source_weights:
-                self.source_weights[source] *= 1.05
-        elif feedback.feedback < 0:
-            # Negative feedback - slightly decrease weights
-            for source in self.source_weights:
-                self.source_weights[source] *= 0.95
-                
-        # Normalize weights
-        total_weight = sum(self.source_weights.values())
-        if total_weight > 0:
-            for source in self.source_weights:
-                self.source_weights[source] /= total_weight
-                
-        return {"source_weights": self.source_weights.copy()}
-
-class RankingAgentLearner(BaseAgentLearner):
-    """Learner for the ranking agent using SSRL"""
-    
-    def __init__(self, agent_id: str):
-        super().__init__(agent_id)
-        self.feature_weights = {
-            "relevance": 1.0,
-            "freshness": 1.0,
-            "authority": 1.0,
-            "diversity": 1.0
+        """Update parameters based on one feedback event"""
+        credit = self.credit([feedback.source], [feedback.features])
+        self.update_batch(np.array([feedback.feedback], dtype=np.float64), credit=credit)
+        return {self.weights_key: self._weights_dict()}
+
+    def update_batch(self, feedback_values: np.ndarray,
+                     segment_keys: Optional[Sequence[str]] = None,
+                     credit: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """Apply a batch of feedback values; identical to applying them one at a time"""
+        feedback_values = np.asarray(feedback_values, dtype=np.float64)
+        is_positive = feedback_values > 0
+        is_negative = feedback_values < 0
+        positives = int(np.count_nonzero(is_positive))
+        negatives = int(np.count_nonzero(is_negative))
+        if len(feedback_values):
+            if credit is None:
+                positive_credit, negative_credit = is_positive, is_negative
+                log_weights = np.log(self.weights) + positives * self.log_positive + negatives * self.log_negative
+            else:
+                positive_credit = is_positive[:, None] * credit
+                negative_credit = is_negative[:, None] * credit
+                log_weights = (np.log(self.weights) + positive_credit.sum(axis=0) * self.log_positive
+                               + negative_credit.sum(axis=0) * self.log_negative)
+            # New segments start from the global weights as they were before this batch
+            self.segments.set_default_weights(self.weights)
+            # Subtract the maximum so a long batch cannot overflow or underflow
+            scaled = np.exp(log_weights - log_weights.max())
+            self.weights = scaled / scaled.sum()
+            if segment_keys is not None and (credit is not None or self.learns_segments):
+                self.segments.apply_counts(segment_keys, positive_credit, negative_credit,
+                                           self.log_positive, self.log_negative)
+            self.segments.set_default_weights(self.weights)
+        return {
+            "events": len(feedback_values),
+            "positive": positives,
+            "negative": negatives,
+            "segments": len(self.segments),
+            self.weights_key: self._weights_dict()
         }
-        
-    def update_parameters(self, feedback: FeedbackEvent) -> Dict[str, Any]:
-        """Update ranking parameters based on user feedback"""
-        # Update weights based on feedback
-        if feedback.feedback > 0:
-            # Positive feedback - increase all weights slightly
-            for feature in self.feature_weights:
-                self.feature_weights[feature] *= 1.02
-        elif feedback.feedback < 0:
-            # Negative feedback - decrease all weights slightly
-            for feature in self.feature_weights:
-                self.feature_weights[feature] *= 0.98
-                
-        # Normalize weights
-        total_weight = sum(self.feature_weights.values())
-        if total_weight > 0:
-            for feature in self.feature_weights:
-                self.feature_weights[feature] /= total_weight
-                
-        return {"feature_weights": self.feature_weights.copy()}
+
+    def save_checkpoint(self, checkpoint_dir: str):
+        """Persist per-segment weights as a memory-mappable matrix, and the global weights"""
+        prefix = os.path.join(checkpoint_dir, self.agent_id)
+        if len(self.segments):
+            self.segments.save(prefix)
+        np.save(prefix + ".global.npy", self.weights)
+
+    def load_checkpoint(self, checkpoint_dir: str):
+        """Restore weights saved by save_checkpoint, if present"""
+        prefix = os.path.join(checkpoint_dir, self.agent_id)
+        segments = SegmentWeightTable.load(prefix, np.ones(len(self.parameters)), max_rows=self.max_segments)
+        if segments is not None:
+            self.segments = segments
+        if os.path.exists(prefix + ".global.npy"):
+            weights = np.load(prefix + ".global.npy")
+            if weights.shape == self.weights.shape:
+                self.weights = weights
+        self.segments.set_default_weights(self.weights)
+
+class SearchAgentLearner(MultiplicativeWeightsLearner):
+    """Learner for the search agent using SSRL"""
+    parameters = SEARCH_SOURCES
+    weights_key = "source_weights"
+    # Increase weight of sources that led to positive feedback
+    positive_factor = 1.05
+    negative_factor = 0.95
+
+    def credit(self, sources: Sequence[str], features: Sequence[Sequence[float]]) -> Optional[np.ndarray]:
+        """Feedback is about the source of its result; results from unknown sources credit nothing"""
+        columns = {source: column for column, source in enumerate(self.parameters)}
+        credit = np.zeros((len(sources), len(self.parameters)), dtype=np.float64)
+        for row, source in enumerate(sources):
+            column = columns.get(source)
+            if column is not None:
+                credit[row, column] = 1.0
+        return credit
+
+    @property
+    def source_weights(self) -> Dict[str, float]:
+        return self._weights_dict()
+
+class RankingAgentLearner(MultiplicativeWeightsLearner):
+    """Learner for the ranking agent using SSRL"""
+    parameters = RANKING_FEATURES
+    weights_key = "feature_weights"
+    positive_factor = 1.02
+    negative_factor = 0.98
+
+    def credit(self, sources: Sequence[str], features: Sequence[Sequence[float]]) -> Optional[np.ndarray]:
+        """
+        Feedback is about the features its result scored on, in proportion to their values;
+        events without feature values credit nothing
+        """
+        credit = np.zeros((len(features), len(self.parameters)), dtype=np.float64)
+        for row, values in enumerate(features):
+            if len(values) == len(self.parameters):
+                credit[row] = values
+        np.clip(credit, 0.0, None, out=credit)
+        totals = credit.sum(axis=1, keepdims=True)
+        np.divide(credit, totals, out=credit, where=totals > 0)
+        return credit
+
+    @property
+    def feature_weights(self) -> Dict[str, float]:
+        return self._weights_dict()
 
 class SSRLFramework:
     """Main SSRL framework for online learning and agent tuning"""
     
-    def __init__(self):
+    def __init__(self, checkpoint_dir: Optional[str] = None, checkpoint_interval: float = 300.0,
+                 segment_of: Optional[Callable[[str], str]] = None):
         self.learners: Dict[str, BaseAgentLearner] = {}
         self.feedback_buffer: List[FeedbackEvent] = []
+        # Maps a user id to the segment whose parameters it shares (each user by default)
+        self.segment_of = segment_of or (lambda user_id: user_id)
+        self.checkpoint_dir = checkpoint_dir
+        self.checkpoint_interval = checkpoint_interval
+        self._last_checkpoint = time.time()
+        # Sequence number of the last feedback event applied (e.g. the feedback log position);
+        # checkpointed with the learners so a restart resumes right after their state
+        self.feedback_seq = 0
         self._initialize_learners()
+        if checkpoint_dir:
+            os.makedirs(checkpoint_dir, exist_ok=True)
+            for learner in self.learners.values():
+                learner.load_checkpoint(checkpoint_dir)
+            self.feedback_seq = self._load_position()
         
     def _initialize_learners(self):
         """Initialize learners for each agent type"""
@@ -117,24 +252,87 @@ class SSRLFramework:
             return {}
             
     def process_feedback_batch(self) -> Dict[str, Any]:
-        """Process a batch of feedback events"""
-        updates = {}
+        """Process all buffered feedback in one vectorized update per agent"""
+        feedback_values = np.fromiter((feedback.feedback for feedback in self.feedback_buffer),
+                                      dtype=np.float64, count=len(self.feedback_buffer))
+        user_ids = [feedback.user_id for feedback in self.feedback_buffer]
+        sources = [feedback.source for feedback in self.feedback_buffer]
+        features = [feedback.features for feedback in self.feedback_buffer]
         
-        # Process each feedback event
-        for feedback in self.feedback_buffer:
-            # For simplicity, we'll update both search and ranking agents
-            # In a real implementation, this would be more sophisticated
-            for agent_id in ["search_001", "ranking_001"]:
-                update = self.update_agent_parameters(agent_id, feedback)
-                if agent_id not in updates:
-                    updates[agent_id] = []
-                updates[agent_id].append(update)
-                
         # Clear the feedback buffer
         self.feedback_buffer.clear()
         
+        return self.process_feedback_values(feedback_values, user_ids, sources=sources, features=features)
+
+    def process_feedback_values(self, feedback_values: np.ndarray,
+                                user_ids: Optional[Sequence[str]] = None,
+                                last_seq: Optional[int] = None,
+                                sources: Optional[Sequence[str]] = None,
+                                features: Optional[Sequence[Sequence[float]]] = None) -> Dict[str, Any]:
+        """
+        Apply an array of feedback values (e.g. read from the feedback log) to the learners;
+        last_seq is the sequence number of the last event, saved with the next checkpoint.
+        sources and features describe the result each event was given on and decide which
+        parameters it moves; without them every parameter is credited equally.
+        """
+        segment_keys = [self.segment_of(user_id) for user_id in user_ids] if user_ids is not None else None
+        if sources is not None or features is not None:
+            sources = sources if sources is not None else [""] * len(feedback_values)
+            features = features if features is not None else [()] * len(feedback_values)
+        updates = {}
+        for agent_id in ["search_001", "ranking_001"]:
+            learner = self.learners.get(agent_id)
+            if learner is None:
+                continue
+            credit = learner.credit(sources, features) if sources is not None else None
+            updates[agent_id] = learner.update_batch(feedback_values, segment_keys, credit)
+        if last_seq is not None:
+            self.feedback_seq = last_seq
+        if self.checkpoint_dir and time.time() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
         return updates
 
+    def get_segment_weights(self, agent_id: str, user_id: Optional[str] = None) -> Dict[str, float]:
+        """O(1) lookup of the parameters learned for a user's segment (global ones without a user)"""
+        learner = self.learners.get(agent_id)
+        if not isinstance(learner, MultiplicativeWeightsLearner):
+            return {}
+        return learner.get_weights(None if user_id is None else self.segment_of(user_id))
+
+    def has_segment_weights(self, user_id: str) -> bool:
+        """Whether any learner has weights of its own for the user's segment"""
+        segment = self.segment_of(user_id)
+        return any(isinstance(learner, MultiplicativeWeightsLearner) and learner.has_segment(segment)
+                   for learner in self.learners.values())
+
+    def checkpoint(self):
+        """
+        Save every learner's state to checkpoint_dir, then the feedback position it covers.
+        A crash between the two replays some events on restart rather than skipping any.
+        """
+        if not self.checkpoint_dir:
+            return
+        feedback_seq = self.feedback_seq
+        for learner in self.learners.values():
+            learner.save_checkpoint(self.checkpoint_dir)
+        path = os.path.join(self.checkpoint_dir, "position.json")
+        with open(path + ".tmp", "w") as f:
+            json.dump({"feedback_seq": feedback_seq, "saved_at": time.time()}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self._last_checkpoint = time.time()
+
+    def _load_position(self) -> int:
+        """Feedback position of the last checkpoint, 0 if there is none"""
+        try:
+            with open(os.path.join(self.checkpoint_dir, "position.json")) as f:
+                return int(json.load(f)["feedback_seq"])
+        except (OSError, ValueError, KeyError) as e:
+            if not isinstance(e, FileNotFoundError):
+                print(f"Error loading SSRL checkpoint position: {e}")
+            return 0
+
 # Example usage:
 # ssrl = SSRLFramework()
 # feedback = FeedbackEvent(
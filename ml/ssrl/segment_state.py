@@ -0,0 +1,137 @@
+"""
+Per-segment learner state stored as rows of a dense array
+"""
+import json
+import os
+import numpy as np
+from typing import Dict, List, Optional, Sequence
+
+DEFAULT_MAX_SEGMENTS = int(os.environ.get("SSRL_MAX_SEGMENTS", 100_000))
+
+class SegmentWeightTable:
+    """
+    Normalized log-weights for each segment (a user id or any grouping key) × parameter.
+    Only segments that received feedback get a row, starting from the default weights; every
+    other segment falls back to the defaults, so memory grows with active segments and is
+    capped at `max_rows`.
+    Rows are float32 in one array and are looked up in O(1) through a key -> row dict.
+    """
+
+    def __init__(self, default_weights: np.ndarray, max_rows: int = DEFAULT_MAX_SEGMENTS,
+                 initial_capacity: int = 1024):
+        default_weights = np.asarray(default_weights, dtype=np.float64)
+        self.default_log_weights = np.log(default_weights / default_weights.sum()).astype(np.float32)
+        self.max_rows = max_rows
+        self._rows: Dict[str, int] = {}
+        self._keys: List[str] = []
+        self._log_weights = np.empty((initial_capacity, len(default_weights)), dtype=np.float32)
+        self.dropped_updates = 0
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._rows
+
+    def set_default_weights(self, default_weights: np.ndarray):
+        """Weights for segments without a row, and the starting point of new rows"""
+        default_weights = np.asarray(default_weights, dtype=np.float64)
+        self.default_log_weights = np.log(default_weights / default_weights.sum()).astype(np.float32)
+
+    def _row(self, key: str) -> int:
+        """Row for a segment, allocating one if there is room; -1 when the table is full"""
+        row = self._rows.get(key)
+        if row is None:
+            if len(self._keys) >= self.max_rows:
+                return -1
+            row = len(self._keys)
+            if row >= len(self._log_weights):
+                grown = np.empty((min(max(2 * len(self._log_weights), 1024), self.max_rows),
+                                  self._log_weights.shape[1]), dtype=np.float32)
+                grown[:row] = self._log_weights[:row]
+                self._log_weights = grown
+            self._log_weights[row] = self.default_log_weights
+            self._rows[key] = row
+            self._keys.append(key)
+        return row
+
+    def weights(self, key: str) -> np.ndarray:
+        """Normalized weights for a segment (the defaults if it has no row)"""
+        row = self._rows.get(key)
+        log_weights = self.default_log_weights if row is None else self._log_weights[row]
+        return np.exp(log_weights.astype(np.float64))
+
+    def apply_counts(self, keys: Sequence[str], positive: np.ndarray, negative: np.ndarray,
+                     log_positive: np.ndarray, log_negative: np.ndarray):
+        """
+        Batched multiplicative update: row r gains positive[i] * log_positive + negative[i] * log_negative
+        for every event i of its segment, then is renormalized. positive/negative hold one count
+        per event, or one credit per event and parameter (shape events × parameters).
+        """
+        rows = np.fromiter((self._row(key) for key in keys), dtype=np.int64, count=len(keys))
+        valid = rows >= 0
+        self.dropped_updates += int(np.count_nonzero(~valid))
+        rows = rows[valid]
+        if not len(rows):
+            return
+        # Count per touched row only, so a batch costs O(batch) however many rows the table has
+        touched, inverse = np.unique(rows, return_inverse=True)
+        positives = self._sum_per_row(inverse, len(touched), positive, valid)
+        negatives = self._sum_per_row(inverse, len(touched), negative, valid)
+
+        log_weights = (self._log_weights[touched].astype(np.float64)
+                       + positives * log_positive
+                       + negatives * log_negative)
+        # Renormalize in log space (subtract the row's log-sum-exp)
+        row_max = log_weights.max(axis=1, keepdims=True)
+        log_weights -= row_max + np.log(np.exp(log_weights - row_max).sum(axis=1, keepdims=True))
+        self._log_weights[touched] = log_weights.astype(np.float32)
+
+    @staticmethod
+    def _sum_per_row(inverse: np.ndarray, row_count: int, values: np.ndarray, valid: np.ndarray) -> np.ndarray:
+        """Per-row sums of per-event values, as a column (counts) or a row × parameter matrix"""
+        values = np.asarray(values, dtype=np.float64)[valid]
+        if values.ndim == 1:
+            return np.bincount(inverse, weights=values, minlength=row_count)[:, None]
+        sums = np.zeros((row_count, values.shape[1]), dtype=np.float64)
+        np.add.at(sums, inverse, values)
+        return sums
+
+    def save(self, path_prefix: str):
+        """
+        Checkpoint to `<prefix>.npy` (loadable with mmap) and `<prefix>.keys.json`.
+        Rows are append-only, so the matrix is replaced before the keys: a crash in between
+        leaves newer values under a subset of keys, never keys without rows.
+        """
+        matrix_path, keys_path = f"{path_prefix}.npy", f"{path_prefix}.keys.json"
+        with open(matrix_path + ".tmp", "wb") as f:
+            np.save(f, self._log_weights[:len(self._keys)])
+            f.flush()
+            os.fsync(f.fileno())
+        with open(keys_path + ".tmp", "w") as f:
+            json.dump(self._keys, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(matrix_path + ".tmp", matrix_path)
+        os.replace(keys_path + ".tmp", keys_path)
+
+    @classmethod
+    def load(cls, path_prefix: str, default_weights: np.ndarray,
+             max_rows: int = DEFAULT_MAX_SEGMENTS) -> Optional["SegmentWeightTable"]:
+        """
+        Restore a checkpoint; the matrix is memory-mapped copy-on-write, so its pages are read
+        only when rows are looked up or updated. None if there is no usable checkpoint.
+        """
+        matrix_path, keys_path = f"{path_prefix}.npy", f"{path_prefix}.keys.json"
+        if not (os.path.exists(matrix_path) and os.path.exists(keys_path)):
+            return None
+        table = cls(default_weights, max_rows=max_rows, initial_capacity=1)
+        matrix = np.load(matrix_path, mmap_mode="c")
+        with open(keys_path) as f:
+            keys = json.load(f)[:len(matrix)]
+        if matrix.shape[1] != len(table.default_log_weights):
+            return None
+        table._log_weights = matrix
+        table._keys = keys
+        table._rows = {key: row for row, key in enumerate(keys)}
+        return table
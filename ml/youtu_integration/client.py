@@ -1,18 +1,28 @@
 """
 Tencent/Youtu-agent Integration
 """
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import asyncio
+import os
+from ml.youtu_integration.transport import YoutuTransport, get_shared_transport
 
 class YoutuSearchClient:
     """Client for interacting with Tencent/Youtu-agent for multi-modal search"""
     
-    def __init__(self, api_key: str = None):
+    def __init__(self, api_key: str = None, base_url: Optional[str] = None,
+                 transport: Optional[YoutuTransport] = None):
         self.api_key = api_key
-        # In a real implementation, this would be initialized with actual API credentials
+        # Calls go over a pooled transport shared by all clients of the same upstream; without an
+        # upstream URL (YOUTU_BASE_URL) the placeholder results below are returned
+        base_url = base_url or os.environ.get("YOUTU_BASE_URL")
+        self.transport = transport or (get_shared_transport(base_url, api_key) if base_url else None)
         
     async def text_search(self, query: str, **kwargs) -> List[Dict[str, Any]]:
         """Perform text-based search using Youtu-agent"""
+        if self.transport is not None:
+            response = await self.transport.request_json("POST", "/v1/search/text", json={"query": query, **kwargs})
+            return response.get("results", [])
+
         # Placeholder implementation
         await asyncio.sleep(0.1)  # Simulate network delay
         
@@ -36,6 +46,12 @@ class YoutuSearchClient:
         
     async def image_search(self, image_data: bytes, **kwargs) -> List[Dict[str, Any]]:
         """Perform image-based search using Youtu-agent"""
+        if self.transport is not None:
+            response = await self.transport.request_json(
+                "POST", "/v1/search/image", data=image_data, headers={"Content-Type": "application/octet-stream"}
+            )
+            return response.get("results", [])
+
         # Placeholder implementation
         await asyncio.sleep(0.1)  # Simulate network delay
         
@@ -51,6 +67,12 @@ class YoutuSearchClient:
         
     async def cross_modal_search(self, query: str, modality: str = "text_to_image") -> List[Dict[str, Any]]:
         """Perform cross-modal search (text-to-image or image-to-text)"""
+        if self.transport is not None:
+            response = await self.transport.request_json(
+                "POST", "/v1/search/cross_modal", json={"query": query, "modality": modality}
+            )
+            return response.get("results", [])
+
         # Placeholder implementation
         await asyncio.sleep(0.1)  # Simulate network delay
         
@@ -76,6 +98,7 @@ class YoutuSearchClient:
 # In the actual implementation, we would integrate with the real Youtu-agent API
 # This would involve:
 # 1. Proper authentication with API keys
-# 2. Real API calls to Tencent/Youtu services
-# 3. Error handling and retry mechanisms
+# 2. Real API calls to Tencent/Youtu services (the request paths used above are those served by
+#    ml/youtu_integration/standin_server.py)
+# 3. Error handling and retry mechanisms (see YoutuTransport)
 # 4. Rate limiting considerations
\ No newline at end of file
@@ -0,0 +1,104 @@
+"""
+Local stand-in for the Youtu search upstream, for offline testing and benchmarking
+
+Usage:
+    python -m ml.youtu_integration.standin_server --port 8900 --latency-ms 50 --error-rate 0.05
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import random
+from aiohttp import web
+from typing import Dict, Any, List
+
+def _results(prefix: str, seed: str, title: str, count: int) -> List[Dict[str, Any]]:
+    digest = hashlib.sha256(seed.encode("utf-8")).hexdigest()[:8]
+    return [
+        {
+            "id": f"{prefix}_{digest}_{i}",
+            "title": f"{title} - Option {i + 1}",
+            "url": f"https://example.com/{prefix}/{digest}/{i + 1}",
+            "snippet": f"Stand-in result {i + 1} for {seed}",
+            "score": round(0.95 - i * 0.05, 4)
+        }
+        for i in range(count)
+    ]
+
+def create_app(latency_ms: float = 50.0, jitter_ms: float = 20.0, error_rate: float = 0.0,
+               error_status: int = 503, result_count: int = 10) -> web.Application:
+    """
+    Application emulating the upstream search endpoints. Each request waits latency_ms plus up to
+    jitter_ms, and fails with error_status with probability error_rate. Responses are gzip-compressed
+    when the client accepts it. Counters are kept in app["stats"]; "connections" counts distinct
+    client sockets, so keep-alive reuse shows up as requests much larger than connections.
+    """
+    stats = {"requests": 0, "errors": 0, "connections": 0}
+    peers = set()
+
+    @web.middleware
+    async def emulate_upstream(request: web.Request, handler):
+        if request.path == "/stats":
+            return await handler(request)
+        peer = request.transport.get_extra_info("peername") if request.transport else None
+        if peer not in peers:
+            peers.add(peer)
+            stats["connections"] += 1
+        stats["requests"] += 1
+        await asyncio.sleep((latency_ms + random.uniform(0, jitter_ms)) / 1000.0)
+        if random.random() < error_rate:
+            stats["errors"] += 1
+            return web.json_response({"error": "injected failure"}, status=error_status,
+                                     headers={"Retry-After": "0"})
+        return await handler(request)
+
+    def respond(results: List[Dict[str, Any]]) -> web.Response:
+        response = web.json_response({"results": results})
+        response.enable_compression()
+        return response
+
+    async def text_search(request: web.Request) -> web.Response:
+        body = await request.json()
+        query = body.get("query", "")
+        return respond(_results("text", query, f"Result for '{query}'", result_count))
+
+    async def image_search(request: web.Request) -> web.Response:
+        data = await request.read()
+        seed = base64.b64encode(hashlib.sha256(data).digest()).decode("ascii")
+        return respond(_results("image", seed, "Visually similar image result", result_count))
+
+    async def cross_modal_search(request: web.Request) -> web.Response:
+        body = await request.json()
+        query = body.get("query", "")
+        modality = body.get("modality", "text_to_image")
+        title = f"Image result for '{query}'" if modality == "text_to_image" else "Text result for image query"
+        return respond(_results("cross", f"{modality}:{query}", title, result_count))
+
+    async def get_stats(request: web.Request) -> web.Response:
+        return web.json_response(stats)
+
+    app = web.Application(middlewares=[emulate_upstream])
+    app["stats"] = stats
+    app.router.add_post("/v1/search/text", text_search)
+    app.router.add_post("/v1/search/image", image_search)
+    app.router.add_post("/v1/search/cross_modal", cross_modal_search)
+    app.router.add_get("/stats", get_stats)
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Local stand-in for the Youtu search upstream")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8900)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--jitter-ms", type=float, default=20.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--error-status", type=int, default=503)
+    parser.add_argument("--results", type=int, default=10)
+    args = parser.parse_args()
+    web.run_app(
+        create_app(args.latency_ms, args.jitter_ms, args.error_rate, args.error_status, args.results),
+        host=args.host, port=args.port
+    )
+
+if __name__ == "__main__":
+    main()
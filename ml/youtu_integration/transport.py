@@ -0,0 +1,159 @@
+"""
+Pooled keep-alive HTTP transport for the Youtu search upstream
+"""
+import aiohttp
+import asyncio
+import random
+import threading
+import time
+from typing import Dict, Any, Optional, Set, Tuple
+
+# Statuses worth retrying: throttling and transient upstream failures
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+class UpstreamError(Exception):
+    """Raised when the upstream fails after all retries"""
+
+    def __init__(self, message: str, status: Optional[int] = None):
+        super().__init__(message)
+        self.status = status
+
+class YoutuTransport:
+    """
+    Shared aiohttp session with a bounded keep-alive connection pool, per-host concurrency limits,
+    full-jitter exponential backoff retries and transparent gzip/deflate decompression
+    """
+
+    def __init__(self, base_url: str, api_key: Optional[str] = None, max_connections: int = 100,
+                 max_connections_per_host: int = 32, keepalive_timeout: float = 30.0,
+                 request_timeout: float = 10.0, max_retries: int = 2,
+                 backoff_base: float = 0.05, backoff_max: float = 1.0):
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self.max_connections = max_connections
+        self.max_connections_per_host = max_connections_per_host
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._session_loop: Optional[asyncio.AbstractEventLoop] = None
+        self._closing: Set[asyncio.Task] = set()
+        self.request_count = 0
+        self.retry_count = 0
+        self.failure_count = 0
+        self.total_time = 0.0
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        """Session for the running event loop, created on first use (sessions are bound to a loop)"""
+        loop = asyncio.get_running_loop()
+        if self._session is None or self._session.closed or self._session_loop is not loop:
+            self._close_stale_session()
+            connector = aiohttp.TCPConnector(
+                limit=self.max_connections,
+                limit_per_host=self.max_connections_per_host,
+                keepalive_timeout=self.keepalive_timeout,
+                ttl_dns_cache=300
+            )
+            headers = {"Accept-Encoding": "gzip, deflate"}
+            if self.api_key:
+                headers["Authorization"] = f"Bearer {self.api_key}"
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout),
+                auto_decompress=True
+            )
+            self._session_loop = loop
+        return self._session
+
+    def _close_stale_session(self):
+        """Close the session of a previous event loop so its pooled connections are released"""
+        session, loop = self._session, self._session_loop
+        self._session = None
+        if session is None or session.closed:
+            return
+        if loop.is_closed():
+            # Its connections went with the loop; closing only marks the pool closed, no I/O
+            task = asyncio.get_running_loop().create_task(session.close())
+            self._closing.add(task)
+            task.add_done_callback(self._closing.discard)
+        else:
+            # Close on the loop that owns the connections, now or when it next runs
+            asyncio.run_coroutine_threadsafe(session.close(), loop)
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        """Full-jitter exponential backoff, at least the server's Retry-After if it sent one"""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+        if retry_after:
+            try:
+                delay = max(delay, min(float(retry_after), self.backoff_max))
+            except ValueError:
+                pass
+        return delay
+
+    async def request_json(self, method: str, path: str, json: Any = None, data: Optional[bytes] = None,
+                           headers: Optional[Dict[str, str]] = None) -> Any:
+        """Send a request and decode the JSON response, retrying transient failures"""
+        session = self._get_session()
+        url = f"{self.base_url}{path}"
+        start_time = time.time()
+        self.request_count += 1
+        last_error: Optional[UpstreamError] = None
+        try:
+            for attempt in range(self.max_retries + 1):
+                if attempt:
+                    self.retry_count += 1
+                retry_after = None
+                try:
+                    async with session.request(method, url, json=json, data=data, headers=headers) as response:
+                        if response.status in RETRYABLE_STATUSES:
+                            retry_after = response.headers.get("Retry-After")
+                            last_error = UpstreamError(f"{method} {path} returned {response.status}",
+                                                       response.status)
+                        elif response.status >= 400:
+                            raise UpstreamError(f"{method} {path} returned {response.status}", response.status)
+                        else:
+                            return await response.json(content_type=None)
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    last_error = UpstreamError(f"{method} {path} failed: {e!r}")
+                if attempt < self.max_retries:
+                    await asyncio.sleep(self._backoff(attempt, retry_after))
+            raise last_error
+        except UpstreamError:
+            self.failure_count += 1
+            raise
+        finally:
+            self.total_time += time.time() - start_time
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Get request, retry and pool statistics"""
+        return {
+            "base_url": self.base_url,
+            "requests": self.request_count,
+            "retries": self.retry_count,
+            "failures": self.failure_count,
+            "average_latency": self.total_time / self.request_count if self.request_count else 0.0,
+            "pool_limit": self.max_connections,
+            "pool_limit_per_host": self.max_connections_per_host
+        }
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+
+_transports: Dict[Tuple[str, Optional[str]], YoutuTransport] = {}
+_transports_lock = threading.Lock()
+
+def get_shared_transport(base_url: str, api_key: Optional[str] = None, **kwargs) -> YoutuTransport:
+    """One transport (and connection pool) per upstream, shared by every client"""
+    key = (base_url.rstrip("/"), api_key)
+    with _transports_lock:
+        transport = _transports.get(key)
+        if transport is None:
+            transport = _transports[key] = YoutuTransport(base_url, api_key, **kwargs)
+        return transport
+
+__all__ = ['YoutuTransport', 'UpstreamError', 'get_shared_transport', 'RETRYABLE_STATUSES']
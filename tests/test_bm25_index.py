@@ -0,0 +1,65 @@
+import collections
+import math
+import random
+import pytest
+
+np = pytest.importorskip("numpy")
+from ml.retrieval.bm25_index import BM25Index, IndexWriter, tokenize
+from ml.retrieval.postings import vbyte_encode, vbyte_decode
+
+def test_vbyte_round_trip():
+    values = np.array([0, 1, 127, 128, 300, 2 ** 32 + 5, 2 ** 63], dtype=np.uint64)
+    assert (vbyte_decode(vbyte_encode(values)) == values).all()
+    assert len(vbyte_encode(np.arange(128))) == 128
+
+def brute_force(docs, query, k, k1=1.2, b=0.75):
+    tokens = [tokenize(doc["title"]) for doc in docs]
+    avgdl = sum(map(len, tokens)) / len(docs)
+    df = collections.Counter(term for doc_tokens in tokens for term in set(doc_tokens))
+    scored = []
+    for i, doc_tokens in enumerate(tokens):
+        counts = collections.Counter(doc_tokens)
+        score = 0.0
+        for term in dict.fromkeys(tokenize(query)):
+            if counts[term]:
+                idf = math.log(1 + (len(docs) - df[term] + 0.5) / (df[term] + 0.5))
+                tf = counts[term]
+                score += idf * tf * (k1 + 1) / (tf + k1 * (1 - b + b * len(doc_tokens) / avgdl))
+        if score > 0:
+            scored.append(score)
+    return sorted(scored, reverse=True)[:k]
+
+def test_pruned_search_matches_exhaustive_bm25(tmp_path):
+    rng = random.Random(3)
+    vocab = [f"w{i}" for i in range(500)]
+    zipf = [1 / (i + 1) for i in range(len(vocab))]
+    docs = [{"id": f"d{i}", "title": " ".join(rng.choices(vocab, zipf, k=rng.randint(3, 30)))}
+            for i in range(3000)]
+    writer = IndexWriter(str(tmp_path), max_docs_per_segment=1000)
+    writer.add_all(docs)
+    writer.close()
+
+    index = BM25Index(str(tmp_path))
+    assert index.get_stats()["segments"] == 3 and index.num_docs == 3000
+    for _ in range(50):
+        query = " ".join(rng.choices(vocab, zipf, k=rng.randint(1, 4)))
+        results = index.search(query, 10)
+        assert np.allclose([r["bm25_score"] for r in results], brute_force(docs, query, 10))
+    assert index.get_stats()["blocks_skipped"] > 0
+
+def test_search_returns_stored_fields_and_reloads(tmp_path):
+    writer = IndexWriter(str(tmp_path))
+    writer.add({"id": "a", "title": "Fresh coffee beans", "url": "https://example.com/a", "snippet": "Roasted"})
+    writer.add({"id": "b", "title": "Tea leaves", "url": "https://example.com/b"})
+    writer.close()
+    index = BM25Index(str(tmp_path))
+    results = index.search("coffee", 5)
+    assert [r["id"] for r in results] == ["a"]
+    assert results[0]["url"] == "https://example.com/a" and results[0]["score"] == 1.0
+    assert index.search("the", 5) == [] and index.search("missing", 5) == []
+
+    writer = IndexWriter(str(tmp_path))
+    writer.add({"id": "c", "title": "Coffee grinder"})
+    writer.close()
+    index.reload()
+    assert {r["id"] for r in index.search("coffee", 5)} == {"a", "c"}
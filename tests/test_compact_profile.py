@@ -0,0 +1,78 @@
+import gc
+import os
+import sys
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+pytest.importorskip("pydantic")
+from services.compact_profile import CompactProfile, IdRing, StringInterner, query_interner, result_interner
+from services.personalization import UserProfile
+
+def test_id_ring_wraps_around_oldest_first():
+    ring = IdRing(3)
+    assert [ring.append(value) for value in range(3)] == [None, None, None]
+    assert list(ring) == [0, 1, 2]
+    assert ring.append(3) == 0
+    assert ring.append(4) == 1
+    assert list(ring) == [2, 3, 4] and len(ring) == 3
+    for value in range(5, 11):
+        ring.append(value)
+    assert list(ring) == [8, 9, 10]
+
+def test_round_trips_through_the_pydantic_model():
+    profile = CompactProfile("alice", history_capacity=3, click_capacity=2)
+    profile.preferences = {"tech": 0.5}
+    for query in ["a", "b", "a", "c", "d"]:
+        profile.add_search(query)
+    for result_id in ["r1", "r2", "r3"]:
+        profile.add_click(result_id)
+    profile.set_feedback("r9", 1.0)
+    profile.set_feedback("r2", -0.5)
+
+    model = UserProfile(**profile.to_dict())
+    assert model.search_history == ["a", "c", "d"]
+    assert model.clicked_results == ["r2", "r3"]
+    assert model.feedback_scores == {"r9": 1.0, "r2": -0.5}
+    restored = CompactProfile.from_dict(model.dict(), history_capacity=3, click_capacity=2)
+    assert restored.to_dict() == profile.to_dict()
+    # Longer stored histories keep their newest entries
+    assert CompactProfile.from_dict({"user_id": "bob", "search_history": ["x", "y", "z", "w"]},
+                                    history_capacity=2).to_dict()["search_history"] == ["z", "w"]
+
+def test_feedback_arrays_stay_sorted_and_updates_replace():
+    profile = CompactProfile("carol")
+    for i, result_id in enumerate(["fb_c", "fb_a", "fb_b", "fb_a"]):
+        profile.set_feedback(result_id, float(i))
+    ids, scores = profile.feedback_arrays()
+    assert list(ids) == sorted(ids) and len(ids) == 3
+    assert profile.get_feedback("fb_a") == 3.0
+    assert profile.get_feedback("fb_c") == 0.0
+    assert profile.get_feedback("fb_never_seen") is None
+    assert profile.to_dict()["feedback_scores"] == {"fb_c": 0.0, "fb_a": 3.0, "fb_b": 2.0}
+
+def test_interner_drops_strings_no_profile_holds():
+    interner = StringInterner()
+    first = interner.intern("one")
+    assert interner.intern("one") == first
+    interner.intern("two")
+    size = interner.bytes_used
+    interner.release([first])
+    assert interner.lookup("one") == first
+    interner.release([first])
+    assert interner.lookup("one") == -1 and len(interner) == 1 and interner.bytes_used < size
+    # Freed ids are reused
+    assert interner.intern("three") == first
+
+def test_profiles_release_their_strings():
+    queries, results = len(query_interner), len(result_interner)
+    profile = CompactProfile("dave", history_capacity=2)
+    for i in range(5):
+        profile.add_search(f"release query {i}")
+    profile.add_click("release click")
+    profile.set_feedback("release click", 1.0)
+    # Overwritten history entries are released as the ring wraps
+    assert len(query_interner) == queries + 2
+    assert len(result_interner) == results + 1
+    del profile
+    gc.collect()
+    assert (len(query_interner), len(result_interner)) == (queries, results)
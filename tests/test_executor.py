@@ -0,0 +1,81 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import types
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+pytest.importorskip("pydantic")
+from services.executor import PipelineExecutor, ExecutorSaturatedError
+from services.metrics import metrics_service
+
+def executor_metrics(name, metric_name):
+    return [metric.value for metric in metrics_service.metrics_buffer
+            if metric.metric_name == metric_name and metric.tags.get("executor") == name]
+
+def test_rejects_calls_when_queue_is_full():
+    executor = PipelineExecutor(max_workers=1, max_queue_size=1, name="test_saturation")
+    release = threading.Event()
+    started = threading.Event()
+
+    def blocking(value):
+        started.set()
+        release.wait(5)
+        return value
+
+    async def scenario():
+        running = asyncio.create_task(executor.run(blocking, "first"))
+        await asyncio.get_running_loop().run_in_executor(None, started.wait, 5)
+        queued = asyncio.create_task(executor.run(blocking, "second"))
+        await asyncio.sleep(0)
+        with pytest.raises(ExecutorSaturatedError) as error:
+            await executor.run(blocking, "third")
+        assert error.value.retry_after >= 1.0
+        assert executor.get_stats()["queue_depth"] == 1
+        release.set()
+        return await running, await queued
+
+    assert asyncio.run(scenario()) == ("first", "second")
+    stats = executor.get_stats()
+    assert stats["rejected"] == 1 and stats["completed"] == 2 and stats["queue_depth"] == 0
+    executor.shutdown()
+
+def test_records_queue_depth_and_wait_time():
+    executor = PipelineExecutor(max_workers=1, max_queue_size=8, name="test_wait")
+
+    async def scenario():
+        return await asyncio.gather(*(executor.run(time.sleep, 0.05) for _ in range(3)))
+
+    asyncio.run(scenario())
+    queue_depths = executor_metrics("test_wait", "executor_queue_depth")
+    assert len(queue_depths) == 3 and max(queue_depths) >= 2.0
+    wait_times = executor_metrics("test_wait", "executor_wait_time")
+    assert len(wait_times) == 3
+    # The third call waited for the two before it on the single worker
+    assert max(wait_times) >= 0.09
+    stats = executor.get_stats()
+    assert stats["max_wait_time"] == pytest.approx(max(wait_times))
+    assert stats["average_wait_time"] == pytest.approx(sum(wait_times) / 3)
+    executor.shutdown()
+
+def test_saturation_is_a_retryable_503(monkeypatch):
+    from backend.main import executor_saturated_handler
+    from agents.gepa_agent import GEPAReasoningAgent
+    from agents.base import BaseAgent
+    import agents.gepa_agent as gepa_agent
+
+    async def saturated(fn, *args, **kwargs):
+        raise ExecutorSaturatedError("pipeline executor queue is full", retry_after=2.5)
+
+    monkeypatch.setattr(gepa_agent.pipeline_executor, "run", saturated)
+    agent = GEPAReasoningAgent.__new__(GEPAReasoningAgent)
+    BaseAgent.__init__(agent, "gepa_reasoning_001", "GEPA Reasoning Agent")
+    agent.orchestrator = types.SimpleNamespace(process_search=None)
+    with pytest.raises(ExecutorSaturatedError) as error:
+        asyncio.run(agent.process({"query": "q"}))
+
+    response = asyncio.run(executor_saturated_handler(None, error.value))
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "3"
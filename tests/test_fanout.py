@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+pytest.importorskip("pydantic")
+from agents.fanout import HedgingPolicy, fan_out, hedged_call
+
+def test_hedged_call_takes_faster_duplicate():
+    calls = []
+
+    async def call():
+        calls.append(1)
+        await asyncio.sleep(1.0 if len(calls) == 1 else 0.01)
+        return ["ok"]
+
+    result, hedged = asyncio.run(hedged_call(call, hedge_delay=0.05))
+    assert result == ["ok"]
+    assert hedged
+    assert len(calls) == 2
+
+def test_fan_out_returns_partial_results_at_deadline():
+    async def fast():
+        return [{"id": "fast"}]
+
+    async def slow():
+        await asyncio.sleep(1.0)
+        return [{"id": "slow"}]
+
+    outcomes = asyncio.run(fan_out({"fast": fast, "slow": slow}, 0.1, HedgingPolicy(default_delay=0.5)))
+    assert outcomes["fast"].complete and outcomes["fast"].results == [{"id": "fast"}]
+    assert not outcomes["slow"].complete
+    assert outcomes["slow"].error == "deadline exceeded"
+
+def test_fan_out_does_not_hedge_unhedged_sources():
+    calls = {"local": 0, "remote": 0}
+
+    def source(name):
+        async def call():
+            calls[name] += 1
+            await asyncio.sleep(0.1)
+            return [{"id": name}]
+        return call
+
+    policy = HedgingPolicy(default_delay=0.01)
+    outcomes = asyncio.run(fan_out({"local": source("local"), "remote": source("remote")}, 1.0, policy,
+                                   unhedged={"local"}))
+    assert outcomes["local"].complete and not outcomes["local"].hedged
+    assert outcomes["remote"].hedged
+    assert calls == {"local": 1, "remote": 2}
@@ -0,0 +1,101 @@
+import pytest
+from backend.services.feedback_log import FeedbackLog
+
+def make_event(i):
+    return {"query": f"query {i}", "result_id": f"result_{i}", "user_id": "user", "feedback_type": "click"}
+
+def test_append_and_read(tmp_path):
+    log = FeedbackLog(str(tmp_path), max_segment_bytes=1024)
+    for start in range(0, 100, 10):
+        last_seq = log.append([make_event(i) for i in range(start, start + 10)])
+    assert last_seq == 100
+    records = list(log.read())
+    assert [record.seq for record in records] == list(range(1, 101))
+    assert records[5].query == "query 5"
+    assert len(log.segments()) > 1
+    assert [record.seq for record in log.read(after_seq=95)] == [96, 97, 98, 99, 100]
+    assert [record.seq for record in log.recent(2)] == [99, 100]
+    log.close()
+
+def test_recovers_after_torn_write(tmp_path):
+    log = FeedbackLog(str(tmp_path))
+    log.append([make_event(i) for i in range(10)])
+    log.close()
+    with open(log.segments()[-1], "ab") as f:
+        f.write(b"\x40\x00\x00\x00partial")
+
+    reopened = FeedbackLog(str(tmp_path))
+    assert reopened.last_seq == 10
+    assert reopened.append([make_event(10)]) == 11
+    assert [record.seq for record in reopened.read()] == list(range(1, 12))
+    reopened.close()
+
+def test_retention_drops_oldest_segments(tmp_path):
+    log = FeedbackLog(str(tmp_path), max_segment_bytes=512, retention_bytes=2048)
+    for i in range(100):
+        log.append([make_event(i)])
+    assert sum(1 for _ in log.read()) < 100
+    assert list(log.read())[-1].seq == 100
+    log.close()
+
+class FailingWrites:
+    """File wrapper whose writes put half the data on disk and then fail"""
+
+    def __init__(self, file):
+        self.file = file
+
+    def write(self, data):
+        self.file.write(data[:len(data) // 2])
+        self.file.flush()
+        raise OSError("disk full")
+
+    def __getattr__(self, name):
+        return getattr(self.file, name)
+
+def test_failed_write_is_rolled_back(tmp_path):
+    log = FeedbackLog(str(tmp_path))
+    log.append([make_event(i) for i in range(3)])
+    log._file = FailingWrites(log._file)
+    with pytest.raises(OSError):
+        log.append([make_event(3)])
+    assert log.get_stats()["failed_commits"] == 1
+    # Later batches land right after the last good record and survive recovery
+    last_seq = log.append([make_event(4)])
+    log.close()
+
+    reopened = FeedbackLog(str(tmp_path))
+    assert [record.query for record in reopened.read()] == ["query 0", "query 1", "query 2", "query 4"]
+    assert reopened.last_seq == last_seq
+    reopened.close()
+
+def test_log_fails_closed_when_rollback_fails(tmp_path, monkeypatch):
+    import backend.services.feedback_log as feedback_log_module
+    log = FeedbackLog(str(tmp_path))
+    log.append([make_event(0)])
+    log._file = FailingWrites(log._file)
+
+    def broken_open(*args, **kwargs):
+        raise OSError("read-only file system")
+
+    monkeypatch.setattr(feedback_log_module, "open", broken_open, raising=False)
+    with pytest.raises(OSError):
+        log.append([make_event(1)])
+    with pytest.raises(IOError):
+        log.append([make_event(2)])
+    assert not log.get_stats()["writable"]
+    log.close()
+
+def test_retention_keeps_segments_a_cursor_has_not_read(tmp_path):
+    log = FeedbackLog(str(tmp_path), max_segment_bytes=512, retention_bytes=2048)
+    cursor = log.cursor()
+    for i in range(100):
+        log.append([make_event(i)])
+    assert [record.seq for record in log.read()] == list(range(1, 101))
+    assert log.get_stats()["retention_deferred_segments"] > 0
+
+    assert len(cursor.read(60)) == 60
+    log.append([make_event(100)])
+    remaining = [record.seq for record in log.read()]
+    assert remaining[0] > 1 and remaining[0] <= 61
+    assert [record.seq for record in cursor.read(100)] == list(range(61, 102))
+    log.close()
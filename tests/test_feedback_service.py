@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+pytest.importorskip("pydantic")
+from services.feedback import FeedbackService
+from services.feedback_log import FeedbackLog
+from services.feedback_scheduler import FeedbackBackpressureError, FeedbackScheduler
+
+def make_events(start, count, feedback_type="like"):
+    return [{"query": f"query {i}", "result_id": f"result_{i}", "user_id": f"user_{i % 3}",
+             "feedback_type": feedback_type} for i in range(start, start + count)]
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_restart_processes_backlog_logged_before_it(tmp_path):
+    log = FeedbackLog(str(tmp_path / "log"))
+    checkpoints = str(tmp_path / "checkpoints")
+    service = FeedbackService(log, checkpoint_dir=checkpoints)
+    assert service.processed_seq == 0
+    log.append(make_events(0, 5))
+    assert service.process_pending()["processed_count"] == 5
+    service.close()
+
+    # Logged while no service was learning
+    log.append(make_events(5, 10, "dislike"))
+    restarted = FeedbackService(log, checkpoint_dir=checkpoints)
+    assert restarted.processed_seq == 5 and restarted.lag() == 10
+    result = restarted.process_pending()
+    assert result["processed_count"] == 10
+    assert result["agent_updates"]["search_001"]["negative"] == 10
+    assert restarted.lag() == 0
+    restarted.close()
+    log.close()
+
+def test_crash_replays_events_after_the_last_checkpoint(tmp_path):
+    log = FeedbackLog(str(tmp_path / "log"))
+    checkpoints = str(tmp_path / "checkpoints")
+    service = FeedbackService(log, checkpoint_dir=checkpoints)
+    log.append(make_events(0, 4))
+    service.process_pending()
+    service.ssrl_framework.checkpoint()
+    log.append(make_events(4, 6))
+    service.process_pending()
+    # No close(): the learners' saved state only covers the first 4 events
+    recovered = FeedbackService(log, checkpoint_dir=checkpoints)
+    assert recovered.processed_seq == 4
+    assert recovered.process_pending()["processed_count"] == 6
+    log.close()
+
+def test_scheduler_drains_backlog_in_batches(tmp_path):
+    log = FeedbackLog(str(tmp_path / "log"))
+    service = FeedbackService(log, checkpoint_dir=str(tmp_path / "checkpoints"))
+    service.scheduler = FeedbackScheduler(service, batch_size=10, max_interval=0.05)
+    log.append(make_events(0, 35))
+    service.scheduler.start()
+    wait_for(lambda: service.lag() == 0)
+    stats = service.scheduler.get_stats()
+    assert stats["processed"] == 35 and stats["batches"] == 4
+    assert stats["last_batch_seconds"] > 0
+    service.close()
+    log.close()
+
+def test_admission_is_refused_beyond_max_lag(tmp_path):
+    log = FeedbackLog(str(tmp_path / "log"))
+    service = FeedbackService(log, checkpoint_dir=str(tmp_path / "checkpoints"))
+    service.scheduler = FeedbackScheduler(service, batch_size=100, max_lag=25)
+    log.append(make_events(0, 20))
+    service.scheduler.admit(5)
+    # Recent throughput: 10 events in 2 seconds
+    service.scheduler.last_batch_events, service.scheduler.last_batch_time = 10, 2.0
+    with pytest.raises(FeedbackBackpressureError) as error:
+        service.scheduler.admit(10)
+    assert error.value.lag == 20
+    assert error.value.retry_after == pytest.approx((20 + 10 - 25) / 5.0)
+    assert service.scheduler.get_stats()["shed"] == 10
+
+    service.process_pending()
+    service.scheduler.admit(10)
+    log.close()
+
+def test_feedback_endpoint_returns_429_with_retry_after(monkeypatch):
+    from fastapi.testclient import TestClient
+    from backend.main import app
+    from services.feedback import feedback_service
+    monkeypatch.setattr(feedback_service.scheduler, "max_lag", 0)
+    response = TestClient(app).post("/feedback", json={
+        "query": "q", "result_id": "r", "user_id": "u", "feedback_type": "click"
+    })
+    assert response.status_code == 429
+    assert int(response.headers["Retry-After"]) >= 1
+    assert response.json()["status"] == "error"
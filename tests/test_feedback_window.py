@@ -0,0 +1,57 @@
+import random
+from ml.dspy_pipelines.feedback_window import FeedbackWindow
+
+def quality(feedback):
+    if not feedback:
+        return 0.5
+    score = sum({'click': 0.3, 'like': 0.5, 'dislike': -0.4}.get(f.get('type'), 0.0) for f in feedback)
+    return max(0.0, min(1.0, score / len(feedback)))
+
+def reference(history, pattern_window, score_window):
+    """Full recomputation over the window, as the pipeline used to do"""
+    popular, successes = {}, []
+    for query, feedback in history[-pattern_window:]:
+        popular[query] = popular.get(query, 0) + 1
+        successes.extend(
+            {'query': query, 'result_id': f.get('result_id'), 'feedback_type': f.get('type')}
+            for f in feedback if f.get('type') in ('click', 'like')
+        )
+    recent = history[-score_window:]
+    score = sum(quality(feedback) for _, feedback in recent) / len(recent)
+    return popular, successes, score
+
+def test_incremental_aggregates_match_recomputation():
+    rng = random.Random(7)
+    window = FeedbackWindow(quality, pattern_window=50, score_window=7)
+    history = []
+    for _ in range(500):
+        query = f"q{rng.randrange(20)}"
+        feedback = [
+            {'type': rng.choice(['click', 'like', 'dislike', 'view']), 'result_id': f"r{rng.randrange(10)}"}
+            for _ in range(rng.randrange(4))
+        ]
+        history.append((query, feedback))
+        window.add(query, feedback)
+
+        popular, successes, score = reference(history, 50, 7)
+        patterns = window.patterns()
+        assert patterns['popular_queries'] == popular
+        top = window.patterns(max_items=3)['popular_queries']
+        assert sorted(top.values(), reverse=True) == sorted(popular.values(), reverse=True)[:3]
+        assert all(popular[query] == count for query, count in top.items())
+        assert patterns['successful_results'] == successes
+        assert abs(window.performance_score() - score) < 1e-9
+    assert window.total_entries == 500
+    assert len(window) == 50
+
+def test_limited_patterns_and_empty_window():
+    window = FeedbackWindow(quality, pattern_window=1000, score_window=10)
+    assert window.patterns() == {}
+    assert window.performance_score() == 0.5
+    for i in range(100):
+        window.add(f"q{i}", [{'type': 'click', 'result_id': f"r{i}"}])
+    for i in (50, 60, 60, 70, 70, 70):
+        window.add(f"q{i}", [])
+    patterns = window.patterns(max_items=3)
+    assert patterns['popular_queries'] == {'q70': 4, 'q60': 3, 'q50': 2}
+    assert [r['result_id'] for r in patterns['successful_results']] == ['r97', 'r98', 'r99']
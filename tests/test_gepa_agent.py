@@ -0,0 +1,79 @@
+import asyncio
+import os
+import sys
+import types
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+pytest.importorskip("pydantic")
+dspy = pytest.importorskip("dspy")
+from agents.gepa_agent import GEPASearchAgent
+from agents.orchestrator import AGENT_IDS, AgentOrchestrator
+
+class FakeGEPAOrchestrator:
+    """Stands in for AdaptiveGEPASearchOrchestrator, whose pipelines need a reflection LM"""
+
+    def __init__(self):
+        self.version = "0.0.0"
+        self.calls = []
+
+    def process_search(self, query, initial_results, user_context, user_feedback=None):
+        self.calls.append((query, initial_results))
+        return dspy.Prediction(enhanced_query=f"enhanced {query}", optimized_results="r3 r1",
+                               performance_score=0.7)
+
+    def get_pipeline_version(self):
+        return self.version
+
+def test_search_agent_ranks_with_the_shared_orchestrator():
+    orchestrator = FakeGEPAOrchestrator()
+    agent = GEPASearchAgent(orchestrator=orchestrator)
+    agent.local_index = None
+    output = asyncio.run(agent.process({"refined_query": "rust async"}))
+
+    assert [query for query, _ in orchestrator.calls] == ["rust async"]
+    searched = orchestrator.calls[0][1]
+    assert [r["id"] for r in output["search_results"][:3]] == [searched[2]["id"], searched[0]["id"],
+                                                                 searched[1]["id"]]
+    assert output["enhanced_query"] == "enhanced rust async"
+
+def test_snapshot_swap_in_search_pipelines_changes_cache_version():
+    reasoning = FakeGEPAOrchestrator()
+    search = FakeGEPAOrchestrator()
+
+    class Orchestrator(AgentOrchestrator):
+        def _initialize_agents(self):
+            self.agents[AGENT_IDS["gepa"]["reasoning"]] = types.SimpleNamespace(orchestrator=reasoning)
+            self.agents[AGENT_IDS["gepa"]["search"]] = GEPASearchAgent(orchestrator=search)
+
+    orchestrator = Orchestrator()
+    before = orchestrator._pipeline_version("gepa")
+    search.version = "0.1.0"
+    assert orchestrator._pipeline_version("gepa") != before
+
+def test_pipeline_without_results_only_enhances_the_query(monkeypatch):
+    from ml.dspy_pipelines import gepa_enhanced_reasoning
+    monkeypatch.setattr(gepa_enhanced_reasoning, "GEPA", lambda **kwargs: None)
+    pipeline = gepa_enhanced_reasoning.GEPAEnhancedSearchPipeline(memoize=False, micro_batch=False)
+    calls = []
+
+    def predictor(name, **outputs):
+        def predict(**inputs):
+            calls.append(name)
+            return dspy.Prediction(**outputs)
+        return predict
+
+    pipeline._install_predictors(
+        query_enhancer=predictor("enhance", enhanced_query="enhanced"),
+        result_ranker=predictor("rank", ranked_results="r2 r1"),
+        result_optimizer=predictor("optimize", optimized_results="r1 r2"),
+        version=0
+    )
+    result = pipeline.forward("rust async", [], {}, user_feedback=[{"type": "click"}])
+    assert calls == ["enhance"]
+    assert result.enhanced_query == "enhanced" and result.optimized_results == ""
+
+    calls.clear()
+    result = pipeline.forward("rust async", [{"id": "a"}, {"id": "b"}], {})
+    assert calls == ["enhance", "rank"]
+    assert result.optimized_results == "r2 r1"
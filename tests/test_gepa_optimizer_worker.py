@@ -0,0 +1,36 @@
+import os
+from ml.dspy_pipelines.gepa_optimizer_worker import PredictorSnapshotStore, GEPAOptimizerClient
+
+def test_publish_advances_latest_and_loads_versions(tmp_path):
+    store = PredictorSnapshotStore(str(tmp_path))
+    assert store.latest_version("general") == 0
+    assert store.load("general") is None
+
+    assert store.publish("general", {"rank": {"instructions": "v1"}}) == 1
+    assert store.publish("general", {"rank": {"instructions": "v2"}}) == 2
+    assert store.latest_version("general") == 2
+    assert store.latest_version("academic") == 0
+    assert store.load("general")["predictors"] == {"rank": {"instructions": "v2"}}
+    assert store.load("general", 1)["predictors"] == {"rank": {"instructions": "v1"}}
+    with open(os.path.join(tmp_path, "general", "LATEST")) as f:
+        assert f.read() == "2"
+    assert not [name for name in os.listdir(tmp_path / "general") if name.endswith(".tmp")]
+
+def test_prune_keeps_newest_snapshots(tmp_path):
+    store = PredictorSnapshotStore(str(tmp_path))
+    for i in range(5):
+        store.publish("news", {"i": i})
+    store.prune("news", keep=2)
+    assert store.load("news", 3) is None
+    assert store.load("news", 4)["predictors"] == {"i": 3}
+    assert store.load("news")["version"] == 5
+
+def test_submit_drops_instead_of_blocking_when_queue_is_full(tmp_path):
+    client = GEPAOptimizerClient(str(tmp_path), max_queue_size=2)
+    # No worker consumes the queue
+    client.start = lambda: None
+    accepted = [client.submit("general", f"query {i}", [], [{"rating": 1}], {}) for i in range(4)]
+    assert accepted == [True, True, False, False]
+    assert client.get_stats() == {"worker_alive": False, "submitted": 2, "dropped": 2}
+    item = client._queue.get(timeout=1)
+    assert item["pipeline"] == "general" and item["query"] == "query 0"
@@ -0,0 +1,68 @@
+import pytest
+from backend.services.histograms import LatencyHistogram, HistogramRegistry
+
+def test_quantiles_within_bucket_error():
+    histogram = LatencyHistogram()
+    for i in range(1, 1001):
+        histogram.record(i / 1000.0)
+    assert histogram.count == 1000
+    assert histogram.quantile(0.5) == pytest.approx(0.5, rel=0.1)
+    assert histogram.quantile(0.99) == pytest.approx(0.99, rel=0.1)
+    assert histogram.quantile(1.0) == pytest.approx(1.0)
+
+def test_merge():
+    a, b = LatencyHistogram(), LatencyHistogram()
+    a.record(0.01)
+    b.record(2.0)
+    a.merge(b)
+    assert a.count == 2
+    assert a.max_seen == 2.0
+    with pytest.raises(ValueError):
+        a.merge(LatencyHistogram(buckets_per_octave=4))
+
+def test_prometheus_exposition():
+    registry = HistogramRegistry()
+    registry.observe("stage", 0.03, {"stage": "search"})
+    text = registry.render_prometheus()
+    assert "# TYPE ysearch_stage_seconds histogram" in text
+    assert 'ysearch_stage_seconds_bucket{stage="search",le="0.05"} 1' in text
+    assert 'ysearch_stage_seconds_bucket{stage="search",le="0.025"} 0' in text
+    assert 'ysearch_stage_seconds_count{stage="search"} 1' in text
+
+def test_export_bounds_count_exactly():
+    bounds = [0.0025, 0.025, 0.25, 2.5]
+    histogram = LatencyHistogram(export_bounds=bounds)
+    # Evenly log-spaced observations over four decades
+    values = [0.001 * 10 ** (4 * i / 9999) for i in range(10000)] + [0.025, 20.0]
+    for value in values:
+        histogram.record(value)
+    assert histogram.cumulative_counts() == [sum(value <= bound for value in values) for bound in bounds]
+    with pytest.raises(ValueError):
+        histogram.cumulative_counts([0.0005, 20.0])
+
+def test_cumulative_counts_never_decrease_between_scrapes():
+    bounds = [0.024 + i * 0.0002 for i in range(12)] + [0.5, 10.0]
+    histogram = LatencyHistogram(export_bounds=bounds)
+    previous = histogram.cumulative_counts()
+    for value in [0.0241] * 100 + [0.03, 0.0244, 0.0252, 0.0255, 0.0258, 0.3, 7.0, 0.001, 0.026]:
+        histogram.record(value)
+        counts = histogram.cumulative_counts()
+        assert counts == sorted(counts)
+        assert all(now >= before for now, before in zip(counts, previous))
+        previous = counts
+    assert previous[-1] == histogram.count
+
+def test_default_export_bounds_reported_cases():
+    histogram = LatencyHistogram()
+    for _ in range(100):
+        histogram.record(0.024)
+    histogram.record(0.03)
+    counts = dict(zip(histogram.export_bounds, histogram.cumulative_counts()))
+    assert counts[0.025] == 100 and counts[0.05] == 101
+
+    histogram = LatencyHistogram()
+    for _ in range(100):
+        histogram.record(0.0026)
+    histogram.record(0.001)
+    counts = dict(zip(histogram.export_bounds, histogram.cumulative_counts()))
+    assert counts[0.001] == 1 and counts[0.0025] == 1 and counts[0.005] == 101
@@ -0,0 +1,83 @@
+import json
+import os
+import sys
+import time
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+pytest.importorskip("pydantic")
+from services.metrics_log import SegmentedLog, BackgroundLogWriter
+from services.metrics import MetricsService
+
+def wait_for(condition, timeout=5.0):
+    deadline = time.time() + timeout
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.01)
+
+def test_rotates_segments_and_replays_after_seq(tmp_path):
+    log = SegmentedLog(str(tmp_path), max_segment_bytes=200)
+    for seq in range(1, 31, 3):
+        log.append([{"seq": s, "op": "search", "args": [0.1, True]} for s in range(seq, seq + 3)])
+    log.close()
+    assert len(log.segments()) > 1
+    assert os.path.basename(log.segments()[0]) == "segment-0000000000000001.log"
+    assert [record["seq"] for record in log.replay()] == list(range(1, 31))
+    assert [record["seq"] for record in log.replay(after_seq=27)] == [28, 29, 30]
+
+def test_replay_skips_torn_final_line(tmp_path):
+    log = SegmentedLog(str(tmp_path))
+    log.append([{"seq": 1}, {"seq": 2}])
+    log.close()
+    with open(log.segments()[-1], "a") as f:
+        f.write('{"seq": 3, "op"')
+    assert [record["seq"] for record in SegmentedLog(str(tmp_path)).replay()] == [1, 2]
+
+def test_compaction_writes_snapshot_and_drops_covered_segments(tmp_path):
+    state = {"last_seq": 0}
+    log = SegmentedLog(str(tmp_path / "log"), max_segment_bytes=64)
+    writer = BackgroundLogWriter(log, str(tmp_path / "snapshot.json"), lambda: dict(state),
+                                 compact_interval=3600)
+    for seq in range(1, 21):
+        state["last_seq"] = seq
+        writer.append({"seq": seq})
+        if seq % 5 == 0:
+            writer.request_flush()
+            wait_for(lambda: writer.written_count == seq)
+    assert len(log.segments()) > 1
+
+    writer.compact()
+    with open(tmp_path / "snapshot.json") as f:
+        assert json.load(f) == {"last_seq": 20}
+    # Only the fresh active segment is left
+    assert [os.path.basename(path) for path in log.segments()] == ["segment-0000000000000021.log"]
+    assert list(log.replay()) == []
+    writer.close()
+
+def test_recovers_from_snapshot_plus_log_tail(tmp_path):
+    metrics_file = str(tmp_path / "metrics.json")
+    service = MetricsService(metrics_file=metrics_file)
+    for _ in range(3):
+        service.record_search_query(0.2)
+    service.record_agent_processing("search_001", 0.1)
+    wait_for(lambda: service._seq == 4)
+    service._writer.compact()
+
+    service.record_search_query(0.5, success=False)
+    service.record_agent_processing("search_001", 0.3, success=False)
+    service.flush_metrics()
+    wait_for(lambda: service._writer.written_count == 6)
+
+    # A process that died before its next compaction: snapshot at seq 4, seqs 5-6 only in the log
+    with open(metrics_file) as f:
+        assert json.load(f)["last_seq"] == 4
+    recovered = MetricsService(metrics_file=metrics_file, log_dir=str(tmp_path / "metrics_log"))
+    assert recovered._seq == 6
+    assert recovered.search_metrics.query_count == 4
+    assert recovered.search_metrics.success_rate == pytest.approx(0.75)
+    assert recovered.search_metrics.average_response_time == pytest.approx(0.275)
+    agent = recovered.agent_metrics["search_001"]
+    assert agent.process_count == 2 and agent.error_count == 1
+    assert agent.average_processing_time == pytest.approx(0.2)
+    service.close()
+    recovered.close()
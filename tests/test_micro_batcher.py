@@ -0,0 +1,82 @@
+import threading
+import time
+import pytest
+
+dspy = pytest.importorskip("dspy")
+from ml.dspy_pipelines.micro_batcher import MicroBatcher, MicroBatchedPredictor
+
+class RecordingPredictor:
+    """Echoes its input; `fail_in_batch` inputs come back as None from batch(), `fail` inputs raise"""
+
+    def __init__(self, name, fail_in_batch=(), fail=(), batch_error=None):
+        self.name = name
+        self.fail_in_batch = set(fail_in_batch)
+        self.fail = set(fail)
+        self.batch_error = batch_error
+        self.batches = []
+        self.single_calls = []
+        self._lock = threading.Lock()
+
+    def batch(self, examples, num_threads, disable_progress_bar):
+        with self._lock:
+            self.batches.append([example.text for example in examples])
+        if self.batch_error:
+            raise self.batch_error
+        return [None if example.text in self.fail_in_batch | self.fail else f"{self.name}:{example.text}"
+                for example in examples]
+
+    def __call__(self, text):
+        with self._lock:
+            self.single_calls.append(text)
+        if text in self.fail:
+            raise ValueError(text)
+        return f"{self.name}:{text}"
+
+def test_calls_within_window_share_one_batch():
+    batcher = MicroBatcher(max_wait=0.2, max_batch_size=16)
+    predictor = RecordingPredictor("p")
+    futures = [batcher.submit(predictor, {"text": str(i)}) for i in range(5)]
+    assert [future.result(5) for future in futures] == [f"p:{i}" for i in range(5)]
+    assert predictor.batches == [["0", "1", "2", "3", "4"]]
+    assert predictor.single_calls == []
+    assert batcher.get_stats()["batches"] == 1
+
+def test_full_batch_dispatches_before_window_ends():
+    batcher = MicroBatcher(max_wait=10.0, max_batch_size=2)
+    predictor = RecordingPredictor("p")
+    start = time.monotonic()
+    futures = [batcher.submit(predictor, {"text": str(i)}) for i in range(2)]
+    assert [future.result(5) for future in futures] == ["p:0", "p:1"]
+    assert time.monotonic() - start < 5.0
+
+def test_batches_are_grouped_by_predictor():
+    batcher = MicroBatcher(max_wait=0.2, max_batch_size=16)
+    first, second = RecordingPredictor("a"), RecordingPredictor("b")
+    futures = [batcher.submit(predictor, {"text": str(i)})
+               for i in range(3) for predictor in (first, second)]
+    assert [future.result(5) for future in futures] == ["a:0", "b:0", "a:1", "b:1", "a:2", "b:2"]
+    assert first.batches == [["0", "1", "2"]] and second.batches == [["0", "1", "2"]]
+    assert batcher.get_stats()["batches"] == 2 and batcher.get_stats()["average_batch_size"] == 3.0
+
+def test_items_failed_in_batch_are_retried_alone():
+    batcher = MicroBatcher(max_wait=0.2, max_batch_size=16)
+    predictor = RecordingPredictor("p", fail_in_batch=["1"], fail=["2"])
+    futures = [batcher.submit(predictor, {"text": str(i)}) for i in range(3)]
+    assert futures[0].result(5) == "p:0"
+    assert futures[1].result(5) == "p:1"
+    with pytest.raises(ValueError):
+        futures[2].result(5)
+    assert sorted(predictor.single_calls) == ["1", "2"]
+
+def test_batch_error_falls_back_to_single_calls():
+    batcher = MicroBatcher(max_wait=0.2, max_batch_size=16)
+    predictor = RecordingPredictor("p", batch_error=RuntimeError("backend down"))
+    wrapped = MicroBatchedPredictor(predictor, batcher)
+    results = []
+    threads = [threading.Thread(target=lambda i=i: results.append(wrapped(text=str(i)))) for i in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(5)
+    assert sorted(results) == ["p:0", "p:1", "p:2"]
+    assert len(predictor.batches) == 1 and sorted(predictor.single_calls) == ["0", "1", "2"]
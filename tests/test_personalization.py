@@ -0,0 +1,69 @@
+import os
+import sys
+import numpy as np
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+pytest.importorskip("pydantic")
+from services.personalization import PersonalizationService
+
+CATEGORIES = ["tech", "news", "sports", "music"]
+
+@pytest.fixture
+def service(tmp_path):
+    service = PersonalizationService(data_file=str(tmp_path / "profiles.json"),
+                                     db_file=str(tmp_path / "profiles.db"))
+    yield service
+    service.close()
+
+def candidate_set(seed, count=200):
+    rng = np.random.default_rng(seed)
+    base_scores = rng.uniform(0.0, 1.0, count)
+    category_matrix = (rng.uniform(size=(count, len(CATEGORIES))) < 0.3).astype(np.float64)
+    result_ids = [f"result_{seed}_{i}" for i in range(count)]
+    return base_scores, result_ids, category_matrix
+
+def scalar_scores(service, user_id, base_scores, result_ids, category_matrix):
+    return np.array([
+        service.get_personalized_score(
+            user_id, base, result_id, [c for c, member in zip(CATEGORIES, row) if member])
+        for base, result_id, row in zip(base_scores, result_ids, category_matrix)
+    ])
+
+def test_vectorized_scores_match_scalar(service):
+    base_scores, result_ids, category_matrix = candidate_set(1)
+    service.update_preferences("alice", {"tech": 0.9, "music": -0.5, "unused": 1.0})
+    for i in range(0, 200, 7):
+        service.record_feedback("alice", result_ids[i], (i % 5 - 2) / 2.0)
+    # Feedback on results outside the candidate set, interned before and after the candidates
+    service.record_feedback("alice", "result_elsewhere", 1.0)
+    # Candidates the service has never seen, so they have no interned id
+    result_ids = result_ids[:-10] + [f"unknown_{i}" for i in range(10)]
+
+    vectorized = service.get_personalized_scores("alice", base_scores, result_ids, category_matrix, CATEGORIES)
+    assert np.allclose(vectorized, scalar_scores(service, "alice", base_scores, result_ids, category_matrix))
+    assert (vectorized != np.clip(base_scores, 0, 1)).any()
+
+def test_user_without_profile_keeps_base_scores(service):
+    base_scores, result_ids, category_matrix = candidate_set(2)
+    base_scores[:3] = [1.5, -0.2, 0.4]
+    vectorized = service.get_personalized_scores("nobody", base_scores, result_ids, category_matrix, CATEGORIES)
+    assert np.allclose(vectorized, scalar_scores(service, "nobody", base_scores, result_ids, category_matrix))
+    assert np.allclose(vectorized, np.clip(base_scores, 0.0, 1.0))
+
+def test_rank_personalized_returns_top_k_best_first(service):
+    base_scores, result_ids, category_matrix = candidate_set(3)
+    service.update_preferences("bob", {"news": 0.7})
+    service.record_feedback("bob", result_ids[5], -1.0)
+    scores = service.get_personalized_scores("bob", base_scores, result_ids, category_matrix, CATEGORIES)
+
+    indices, top_scores = service.rank_personalized("bob", base_scores, result_ids, category_matrix,
+                                                    CATEGORIES, top_k=10)
+    # Several scores clip to 1.0, so compare scores rather than tie order
+    assert np.allclose(top_scores, np.sort(scores)[::-1][:10])
+    assert np.allclose(scores[indices], top_scores) and len(set(indices)) == 10
+
+    all_indices, _ = service.rank_personalized("bob", base_scores, result_ids, category_matrix, CATEGORIES)
+    assert sorted(all_indices) == list(range(200))
+    assert len(service.rank_personalized("bob", base_scores, result_ids, category_matrix,
+                                         CATEGORIES, top_k=0)[0]) == 0
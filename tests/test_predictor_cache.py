@@ -0,0 +1,60 @@
+import pytest
+
+dspy = pytest.importorskip("dspy")
+from dspy.utils import DummyLM
+from ml.dspy_pipelines.predictor_cache import PredictorMemoStore, MemoizedPredictor
+
+def access_times(store):
+    return dict(store._conn.execute("SELECT key, last_access FROM memo"))
+
+def test_memoizes_until_predictor_state_changes(tmp_path):
+    store = PredictorMemoStore(str(tmp_path / "memo.db"))
+    predictor = dspy.Predict("question -> answer")
+    memoized = MemoizedPredictor(predictor, store)
+    lm = DummyLM([{"answer": "first"}, {"answer": "second"}, {"answer": "third"}])
+
+    with dspy.context(lm=lm):
+        assert memoized(question="q").answer == "first"
+        assert memoized(question="q").answer == "first"
+        assert memoized(question="other").answer == "second"
+        # A GEPA update changes the instructions, so earlier entries no longer match
+        predictor.signature = predictor.signature.with_instructions("Answer tersely.")
+        assert memoized(question="q").answer == "third"
+    assert store.get_stats()["hits"] == 1 and store.get_stats()["misses"] == 3
+
+def test_hits_buffer_access_times(tmp_path):
+    store = PredictorMemoStore(str(tmp_path / "memo.db"), access_flush_size=3, access_flush_interval=3600)
+    for key in "abc":
+        store.put(key, "sig", {"answer": key})
+    written = access_times(store)
+
+    store.get("a")
+    store.get("b")
+    assert access_times(store) == written
+    store.get("a")
+    assert access_times(store) == written
+    # The third distinct key fills the buffer
+    store.get("c")
+    updated = access_times(store)
+    assert all(updated[key] > written[key] for key in "abc")
+
+def test_evicts_least_recently_used_beyond_size_cap(tmp_path):
+    store = PredictorMemoStore(str(tmp_path / "memo.db"), max_bytes=1000, access_flush_size=1000)
+    value = {"answer": "x" * 225}
+    for key in "abcd":
+        store.put(key, "sig", value)
+    # Buffered hit on "a" must still count when evicting
+    assert store.get("a") is not None
+    store.put("e", "sig", value)
+
+    assert store.get_stats()["evictions"] == 2
+    assert store.total_bytes <= 900
+    assert [key for key in "abcde" if store.get(key) is not None] == ["a", "d", "e"]
+
+def test_store_reopens_with_size_and_contents(tmp_path):
+    path = str(tmp_path / "memo.db")
+    store = PredictorMemoStore(path)
+    store.put("key", "sig", {"answer": "kept"})
+    reopened = PredictorMemoStore(path)
+    assert reopened.total_bytes == store.total_bytes
+    assert reopened.get("key") == {"answer": "kept"}
@@ -0,0 +1,108 @@
+import os
+import sys
+import threading
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+pytest.importorskip("pydantic")
+from services.compact_profile import CompactProfile
+from services.profile_cache import ProfileCache
+from services.profile_store import ProfileStore, WriteBehindFlusher
+from services.personalization import PersonalizationService
+
+def make_cache(budget, stored=(), shared_bytes=lambda: 0):
+    evicted = []
+    loaded = []
+
+    def loader(user_id):
+        loaded.append(user_id)
+        return CompactProfile(user_id) if user_id in stored else None
+
+    cache = ProfileCache(loader, lambda user_id, profile: evicted.append(user_id), budget, shared_bytes)
+    return cache, evicted, loaded
+
+def test_evicts_least_recently_used_over_byte_budget():
+    size = CompactProfile("x").estimated_size()
+    cache, evicted, _ = make_cache(3 * size)
+    for user_id in "abc":
+        cache.get_or_create(user_id, lambda user_id=user_id: CompactProfile(user_id))
+    cache.get("a")
+    cache.get_or_create("d", lambda: CompactProfile("d"))
+    assert evicted == ["b"] and "a" in cache and len(cache) == 3
+    assert cache.bytes_used == 3 * size
+
+    # Growing a profile re-estimates its size and evicts others to make room
+    profile = cache.get("d")
+    profile.preferences.update({f"category {i}": 1.0 for i in range(20)})
+    cache.resize("d")
+    assert evicted == ["b", "c", "a"] and len(cache) == 1
+    assert cache.bytes_used == profile.estimated_size() > 3 * size
+
+def test_shared_bytes_count_against_the_budget():
+    size = CompactProfile("x").estimated_size()
+    shared = [0]
+    cache, evicted, _ = make_cache(4 * size, shared_bytes=lambda: shared[0])
+    for user_id in "ab":
+        cache.get_or_create(user_id, lambda user_id=user_id: CompactProfile(user_id))
+    shared[0] = 3 * size
+    cache.get_or_create("c", lambda: CompactProfile("c"))
+    assert evicted == ["a", "b"]
+
+def test_misses_load_and_hits_do_not():
+    cache, _, loaded = make_cache(10 ** 6, stored={"alice"})
+    assert cache.get("alice").user_id == "alice"
+    assert cache.get("alice") is cache.peek("alice")
+    assert cache.get("nobody") is None and "nobody" not in cache
+    assert loaded == ["alice", "nobody"]
+    assert cache.get_stats()["hits"] == 1 and cache.get_stats()["misses"] == 2
+
+@pytest.fixture
+def service(tmp_path):
+    service = PersonalizationService(data_file=str(tmp_path / "profiles.json"),
+                                     db_file=str(tmp_path / "profiles.db"),
+                                     flush_interval=3600, cache_budget_bytes=4000)
+    yield service
+    service.close()
+
+def test_dirty_profiles_are_written_back_on_eviction(service):
+    service.update_preferences("alice", {"tech": 0.9})
+    service.record_feedback("alice", "cache_result_1", 0.5)
+    for i in range(20):
+        service.get_compact_profile(f"filler_{i}")
+    assert "alice" not in service.profiles
+    # Not in the store yet, but staged with the flusher and served from there
+    assert service.store.load("alice") is None
+    assert service.flusher.pending_record("alice")["preferences"] == {"tech": 0.9}
+    profile = service.get_user_profile("alice")
+    assert profile.preferences == {"tech": 0.9} and profile.feedback_scores == {"cache_result_1": 0.5}
+
+    service.flush()
+    assert service.store.load("alice")["feedback_scores"] == {"cache_result_1": 0.5}
+    # Clean profiles are dropped without a write
+    assert service.store.load("filler_0") is None
+
+class BlockingStore(ProfileStore):
+    def __init__(self, path):
+        super().__init__(path)
+        self.saving = threading.Event()
+        self.release = threading.Event()
+
+    def save_many(self, records):
+        self.saving.set()
+        self.release.wait(5)
+        super().save_many(records)
+
+def test_records_in_flight_are_readable_until_saved(tmp_path):
+    store = BlockingStore(str(tmp_path / "profiles.db"))
+    flusher = WriteBehindFlusher(store, lambda user_id: None, flush_interval=3600)
+    flusher.stage_record("alice", {"user_id": "alice", "preferences": {"news": 1.0}})
+    flushing = threading.Thread(target=flusher.flush)
+    flushing.start()
+    assert store.saving.wait(5)
+    assert flusher.pending_record("alice") == {"user_id": "alice", "preferences": {"news": 1.0}}
+    assert store.load("alice") is None
+    store.release.set()
+    flushing.join(5)
+    assert flusher.pending_record("alice") is None
+    assert store.load("alice")["preferences"] == {"news": 1.0}
+    flusher.close()
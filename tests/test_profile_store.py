@@ -0,0 +1,87 @@
+import json
+import os
+import sys
+import threading
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+pytest.importorskip("pydantic")
+from services.profile_store import ProfileStore, WriteBehindFlusher
+from services.personalization import PersonalizationService
+
+class CountingSerializer:
+    def __init__(self):
+        self.calls = []
+        self.versions = {}
+
+    def __call__(self, user_id):
+        self.calls.append(user_id)
+        return {"user_id": user_id, "version": self.versions.get(user_id, 0)}
+
+def test_dirty_profiles_are_coalesced_per_flush(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.db"))
+    serialize = CountingSerializer()
+    flusher = WriteBehindFlusher(store, serialize, flush_interval=3600)
+    for version in range(50):
+        serialize.versions["alice"] = version
+        flusher.mark_dirty("alice")
+    flusher.mark_dirty("bob")
+    assert flusher.pending() == 2 and flusher.is_dirty("alice")
+
+    flusher.flush()
+    assert sorted(serialize.calls) == ["alice", "bob"]
+    assert flusher.flushed_count == 2 and flusher.pending() == 0
+    assert store.load("alice") == {"user_id": "alice", "version": 49}
+    assert not flusher.is_dirty("alice")
+    flusher.close()
+
+def test_close_writes_everything_still_pending(tmp_path):
+    path = str(tmp_path / "profiles.db")
+    store = ProfileStore(path)
+    flusher = WriteBehindFlusher(store, CountingSerializer(), flush_interval=3600)
+    flusher.mark_dirty("alice")
+    flusher.stage_record("bob", {"user_id": "bob", "version": 7})
+    assert flusher.pending_record("bob") == {"user_id": "bob", "version": 7}
+    flusher.close()
+    store.close()
+
+    reopened = ProfileStore(path)
+    assert dict(reopened.load_all()) == {
+        "alice": {"user_id": "alice", "version": 0},
+        "bob": {"user_id": "bob", "version": 7}
+    }
+
+def test_full_batch_wakes_the_flusher(tmp_path):
+    store = ProfileStore(str(tmp_path / "profiles.db"))
+    flushed = threading.Event()
+
+    def serialize(user_id):
+        flushed.set()
+        return {"user_id": user_id}
+
+    flusher = WriteBehindFlusher(store, serialize, flush_interval=3600, max_batch=3)
+    for user_id in ("a", "b", "c"):
+        flusher.mark_dirty(user_id)
+    assert flushed.wait(5)
+    flusher.close()
+    assert store.count() == 3
+
+def test_legacy_json_profiles_are_migrated_once(tmp_path):
+    data_file = str(tmp_path / "user_profiles.json")
+    db_file = str(tmp_path / "user_profiles.db")
+    with open(data_file, "w") as f:
+        json.dump({"alice": {"user_id": "alice", "preferences": {"tech": 0.8},
+                             "search_history": ["python"], "feedback_scores": {"r1": 0.5}}}, f)
+
+    service = PersonalizationService(data_file=data_file, db_file=db_file)
+    profile = service.get_user_profile("alice")
+    assert profile.preferences == {"tech": 0.8}
+    assert profile.search_history == ["python"] and profile.feedback_scores == {"r1": 0.5}
+    service.close()
+
+    # The store is no longer empty, so later edits to the legacy file are not re-imported
+    with open(data_file, "w") as f:
+        json.dump({"carol": {"user_id": "carol"}}, f)
+    service = PersonalizationService(data_file=data_file, db_file=db_file)
+    assert [user_id for user_id, _ in service.store.load_all()] == ["alice"]
+    service.close()
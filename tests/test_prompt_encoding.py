@@ -0,0 +1,48 @@
+from ml.dspy_pipelines.prompt_encoding import (
+    encode_results, decode_order, decode_ranking, encode_context, estimate_tokens
+)
+
+RESULTS = [
+    {"id": f"doc_{i}", "title": f"Title {i}", "snippet": "word " * 100, "url": f"https://example.com/{i}",
+     "score": 0.9 - i * 0.1, "source": "web"}
+    for i in range(8)
+]
+
+def test_encode_results_uses_compact_ids_and_trims_snippets():
+    encoded = encode_results(RESULTS, token_budget=10_000, snippet_chars=40)
+    lines = encoded.text.split("\n")
+    assert encoded.included == len(RESULTS)
+    assert lines[0].startswith("r1 | Title 0 | word")
+    assert "https://" not in encoded.text and "doc_0" not in encoded.text
+    assert all(len(line) < 80 for line in lines)
+
+def test_encode_results_respects_token_budget():
+    encoded = encode_results(RESULTS, token_budget=60, snippet_chars=100)
+    assert 0 < encoded.included < len(RESULTS)
+    assert estimate_tokens(encoded.text) <= 60
+
+def test_reordered_encoding_keeps_ids():
+    encoded = encode_results(RESULTS[:3], order=[2, 0, 1])
+    assert [line.split(" | ")[0] for line in encoded.text.split("\n")] == ["r3", "r1", "r2"]
+
+def test_decode_ranking_maps_ids_to_original_objects():
+    ranked = decode_ranking("r3, r1, r3, r42 and then r2", RESULTS[:4])
+    assert [r["id"] for r in ranked] == ["doc_2", "doc_0", "doc_1", "doc_3"]
+    assert ranked[0] is RESULTS[2]
+
+def test_decode_without_ids_keeps_original_order():
+    assert decode_order("no ranking here", 3) == [0, 1, 2]
+    assert decode_order(["r2", {"id": "r1"}], 3) == [1, 0, 2]
+
+def test_encode_context_keeps_relevant_recent_fields():
+    context = {"user_id": "u1", "timestamp": 123.0, "preferences": {"lang": "en"},
+               "search_history": [f"query {i}" for i in range(20)]}
+    text = encode_context(context, token_budget=200, max_items=3)
+    assert "u1" not in text and "123" not in text
+    assert 'preferences={"lang":"en"}' in text
+    assert "query 19" in text and "query 16" not in text
+    assert encode_context({}) == "none"
+
+def test_encode_context_trims_to_budget():
+    text = encode_context({"search_history": ["x" * 1000]}, token_budget=50)
+    assert estimate_tokens(text) <= 50
@@ -0,0 +1,57 @@
+from ml.dspy_pipelines.query_classifier import (
+    QueryClassifierCascade, LexicalMatcher, HashedLinearClassifier, normalize_query
+)
+
+def test_lexical_tier_and_fallback_without_model():
+    cascade = QueryClassifierCascade(label_log=None)
+    assert cascade.classify("Latest research PAPERS on transformers") == "academic"  # Most keyword hits wins
+    assert cascade.classify_with_tier("cheap flights") == ("commercial", "lexical", 1.0)
+    assert cascade.classify_with_tier("breaking: election results") == ("news", "lexical", 1.0)
+    assert cascade.classify_with_tier("how do penguins sleep") == ("general", "fallback", 0.0)
+
+def test_results_are_cached_per_normalized_query():
+    calls = []
+    model = HashedLinearClassifier(["academic", "commercial", "news", "general"])
+    cascade = QueryClassifierCascade(model=model, lm=lambda q: calls.append(q) or "news",
+                                     threshold=0.9, label_log=None)
+    assert cascade.classify("Election  results?") == "news"
+    assert cascade.classify("election results") == "news"
+    assert calls == ["election results"]
+    stats = cascade.get_stats()
+    assert stats["lm"] == 1 and stats["cache_hits"] == 1
+
+def test_trained_model_keeps_confident_queries_away_from_lm():
+    examples = (
+        [(f"neurips {topic} findings", "academic") for topic in ("vision", "language", "robotics")] * 20
+        + [(f"iphone {item} deals", "commercial") for item in ("case", "charger", "screen")] * 20
+        + [(f"how to {task}", "general") for task in ("cook rice", "tie a tie", "sleep better")] * 20
+    )
+    model = HashedLinearClassifier(["academic", "commercial", "news", "general"], n_features=2 ** 12)
+    model.train(examples, epochs=5)
+    lm_calls = []
+    cascade = QueryClassifierCascade(model=model, lm=lambda q: lm_calls.append(q) or "news",
+                                     threshold=0.6, label_log=None)
+    assert cascade.classify_with_tier("neurips findings")[:2] == ("academic", "model")
+    assert cascade.classify_with_tier("iphone deals")[:2] == ("commercial", "model")
+    assert not lm_calls
+    assert cascade.classify_with_tier("zzz qqq")[1] == "lm"
+
+def test_lm_errors_and_unknown_labels_fall_back_to_model():
+    def failing(query):
+        raise RuntimeError("no LM configured")
+    model = HashedLinearClassifier(["academic", "commercial", "news", "general"])
+    cascade = QueryClassifierCascade(model=model, lm=failing, threshold=0.9, label_log=None)
+    assert cascade.classify_with_tier("something vague")[1] == "model"
+    assert cascade.get_stats()["lm_errors"] == 1
+    cascade = QueryClassifierCascade(model=model, lm=lambda q: "sports", threshold=0.9, label_log=None)
+    assert cascade.classify_with_tier("something vague")[1] == "model"
+
+def test_model_round_trip(tmp_path):
+    model = HashedLinearClassifier(["academic", "general"], n_features=2 ** 10)
+    model.train([("arxiv preprint", "academic"), ("weather", "general")] * 10)
+    path = str(tmp_path / "model.json")
+    model.save(path)
+    loaded = HashedLinearClassifier.load(path)
+    query = normalize_query("arxiv preprint")
+    assert loaded.predict(query)[0] == model.predict(query)[0] == "academic"
+    assert abs(loaded.predict(query)[1] - model.predict(query)[1]) < 1e-4
@@ -0,0 +1,50 @@
+import asyncio
+import time
+import pytest
+from backend.agents.scheduler import Stage, StageScheduler, StageTimeoutError
+
+def sleeper(name: str, delay: float):
+    async def run(input_data):
+        await asyncio.sleep(delay)
+        return {name: True}
+    return run
+
+def test_independent_stages_run_concurrently():
+    scheduler = StageScheduler([
+        Stage("a", sleeper("a", 0.1)),
+        Stage("b", sleeper("b", 0.1)),
+        Stage("c", sleeper("c", 0.1), inputs=["a", "b"])
+    ])
+    start = time.time()
+    result = asyncio.run(scheduler.run({"query": "test"}))
+    assert time.time() - start < 0.3
+    assert result.outputs["c"] == {"c": True}
+    assert set(result.timings) == {"a", "b", "c"}
+
+def test_stage_timeout():
+    scheduler = StageScheduler([Stage("slow", sleeper("slow", 1.0), timeout=0.05)])
+    with pytest.raises(StageTimeoutError):
+        asyncio.run(scheduler.run({}))
+
+def test_optional_stage_timeout_yields_empty_output():
+    scheduler = StageScheduler([Stage("slow", sleeper("slow", 1.0), timeout=0.05, optional=True)])
+    result = asyncio.run(scheduler.run({}))
+    assert result.outputs["slow"] == {}
+    assert result.failed == ["slow"]
+
+def test_cycle_rejected():
+    with pytest.raises(ValueError):
+        StageScheduler([
+            Stage("a", sleeper("a", 0), inputs=["b"]),
+            Stage("b", sleeper("b", 0), inputs=["a"])
+        ])
+
+def test_stage_completion_callback_order():
+    completed = []
+    scheduler = StageScheduler([
+        Stage("fast", sleeper("fast", 0.01)),
+        Stage("slow", sleeper("slow", 0.1)),
+        Stage("last", sleeper("last", 0.01), inputs=["fast", "slow"])
+    ])
+    asyncio.run(scheduler.run({}, on_stage_complete=lambda name, output: completed.append((name, output))))
+    assert completed == [("fast", {"fast": True}), ("slow", {"slow": True}), ("last", {"last": True})]
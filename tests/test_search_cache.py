@@ -0,0 +1,105 @@
+import asyncio
+import os
+import sys
+import time
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+pytest.importorskip("pydantic")
+from services.search_cache import SearchResultCache, InMemoryCacheBackend, RedisCacheBackend
+
+class FakeAsyncRedis:
+    """Local stand-in for the redis.asyncio commands the backend uses"""
+
+    def __init__(self):
+        self.data = {}
+
+    async def get(self, key):
+        item = self.data.get(key)
+        if item is None or item[0] <= time.time():
+            self.data.pop(key, None)
+            return None
+        return item[1]
+
+    async def set(self, key, value, px):
+        assert isinstance(value, str)
+        self.data[key] = (time.time() + px / 1000, value)
+
+    async def delete(self, key):
+        self.data.pop(key, None)
+
+def counting_compute(values):
+    calls = []
+
+    async def compute():
+        calls.append(1)
+        return {"results": [values[min(len(calls), len(values)) - 1]]}
+    return compute, calls
+
+@pytest.mark.parametrize("backend", [InMemoryCacheBackend, lambda: RedisCacheBackend(FakeAsyncRedis())])
+def test_hit_then_stale_refresh_then_expiry(backend):
+    cache = SearchResultCache(backend=backend(), ttl=0.05, stale_ttl=0.1)
+    compute, calls = counting_compute(["v1", "v2"])
+
+    async def scenario():
+        key = cache.make_key("  Coffee  Beans", "gepa", "1")
+        assert key == cache.make_key("coffee beans", "gepa", "1")
+        assert await cache.get_or_compute(key, compute) == ({"results": ["v1"]}, "miss")
+        assert await cache.get_or_compute(key, compute) == ({"results": ["v1"]}, "hit")
+
+        await asyncio.sleep(0.07)
+        # Past its TTL: served stale while one background refresh runs
+        assert await cache.get_or_compute(key, compute) == ({"results": ["v1"]}, "stale")
+        assert await cache.get_or_compute(key, compute) == ({"results": ["v1"]}, "stale")
+        assert cache.get_stats()["refreshing"] == 1
+        await asyncio.sleep(0.01)
+        assert await cache.get_or_compute(key, compute) == ({"results": ["v2"]}, "hit")
+        assert len(calls) == 2
+
+        await asyncio.sleep(0.2)
+        # Past TTL plus stale TTL: the backend dropped it
+        assert (await cache.get_or_compute(key, compute))[1] == "miss"
+
+        await cache.invalidate(key)
+        assert (await cache.get_or_compute(key, compute))[1] == "miss"
+
+    asyncio.run(scenario())
+    stats = cache.get_stats()
+    assert stats["misses"] == 3 and stats["stale_hits"] == 2 and stats["hits"] == 2
+
+def test_partial_candidates_are_refreshed_on_next_lookup():
+    cache = SearchResultCache(ttl=60, stale_ttl=60)
+
+    async def partial():
+        return {"results": [], "complete": False}
+
+    async def scenario():
+        await cache.get_or_compute("key", partial)
+        return (await cache.get_or_compute("key", partial))[1]
+
+    assert asyncio.run(scenario()) == "stale"
+
+def test_redis_backend_serializes_with_prefix_and_ttl():
+    client = FakeAsyncRedis()
+    backend = RedisCacheBackend(client, prefix="test:")
+
+    async def scenario():
+        await backend.set("key", {"value": [1, 2]}, ttl=0.05)
+        assert list(client.data) == ["test:key"]
+        assert await backend.get("key") == {"value": [1, 2]}
+        await asyncio.sleep(0.06)
+        assert await backend.get("key") is None
+
+    asyncio.run(scenario())
+
+def test_in_memory_backend_evicts_least_recently_used():
+    backend = InMemoryCacheBackend(max_entries=2)
+
+    async def scenario():
+        await backend.set("a", 1, 60)
+        await backend.set("b", 2, 60)
+        await backend.get("a")
+        await backend.set("c", 3, 60)
+        return [await backend.get(key) for key in "abc"]
+
+    assert asyncio.run(scenario()) == [1, None, 3]
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import os
+import sys
+import pytest
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'backend'))
+
+pytest.importorskip("pydantic")
+import agents.orchestrator as orchestrator_module
+from agents.orchestrator import AGENT_IDS, AgentOrchestrator
+from services.search_cache import SearchResultCache
+
+class FakeAgent:
+    """Returns canned output for one stage; can be held open to test overlap and cancellation"""
+
+    def __init__(self, agent_id, output):
+        self.agent_id = agent_id
+        self.output = output
+        self.calls = 0
+        self.started = None
+        self.release = None
+        self.cancelled = False
+
+    def hold(self):
+        self.started = asyncio.Event()
+        self.release = asyncio.Event()
+
+    async def process(self, input_data):
+        self.calls += 1
+        if self.release is not None:
+            self.started.set()
+            try:
+                await self.release.wait()
+            except asyncio.CancelledError:
+                self.cancelled = True
+                raise
+        return dict(self.output)
+
+    def get_status(self):
+        return {"agent_id": self.agent_id}
+
+    def has_learned_weights(self, user_id):
+        return False
+
+class FakeOrchestrator(AgentOrchestrator):
+    def _initialize_agents(self):
+        ids = AGENT_IDS["traditional"]
+        outputs = {
+            "reasoning": {"refined_query": "refined", "enhanced_query": "enhanced"},
+            "search": {"results": [{"id": "raw"}], "sources": {"local": 1}, "complete": True},
+            "ranking": {"ranked_results": [{"id": "ranked"}]},
+            "personalization": {"personalized_results": [{"id": "personal"}]},
+        }
+        for stage, agent_id in ids.items():
+            self.agents[agent_id] = FakeAgent(agent_id, outputs[stage])
+
+    def agent(self, stage):
+        return self.agents[AGENT_IDS["traditional"][stage]]
+
+@pytest.fixture
+def orchestrator(monkeypatch):
+    monkeypatch.setattr(orchestrator_module, "search_cache", SearchResultCache())
+    return FakeOrchestrator()
+
+async def collect(orchestrator, query):
+    return [event async for event in orchestrator.stream_search_query(query, "user", use_gepa=False)]
+
+def names(events):
+    return [event["event"] for event in events]
+
+def test_miss_streams_each_stage_in_order(orchestrator):
+    events = asyncio.run(collect(orchestrator, "rust async"))
+    assert names(events) == ["enhanced_query", "candidates", "ranked", "personalized", "done"]
+    assert events[0]["enhanced_query"] == "enhanced"
+    assert events[1]["results"] == [{"id": "raw"}]
+    assert events[2]["results"] == [{"id": "ranked"}]
+    assert events[3]["results"] == [{"id": "personal"}]
+    assert events[4]["cache_status"] == "miss"
+
+def test_cached_candidates_skip_raw_results(orchestrator):
+    async def run():
+        await collect(orchestrator, "rust async")
+        return await collect(orchestrator, "rust async")
+
+    events = asyncio.run(run())
+    assert names(events) == ["enhanced_query", "ranked", "personalized", "done"]
+    assert events[0]["refined_query"] == "refined"
+    assert events[1]["results"] == [{"id": "ranked"}]
+    assert events[-1]["cache_status"] == "hit"
+    assert orchestrator.agent("search").calls == 1
+
+def test_coalesced_request_gets_candidates_in_one_go(orchestrator):
+    search = orchestrator.agent("search")
+    search.hold()
+
+    async def run():
+        leader = asyncio.ensure_future(collect(orchestrator, "rust async"))
+        await search.started.wait()
+        follower = asyncio.ensure_future(collect(orchestrator, "rust async"))
+        await asyncio.sleep(0.05)
+        search.release.set()
+        return await leader, await follower
+
+    leader, follower = asyncio.run(run())
+    assert names(leader) == ["enhanced_query", "candidates", "ranked", "personalized", "done"]
+    assert names(follower) == ["enhanced_query", "ranked", "personalized", "done"]
+    assert follower[1]["results"] == [{"id": "ranked"}]
+    assert search.calls == 1
+    assert orchestrator.candidate_flights.get_stats()["coalesced"] == 1
+
+def test_disconnect_cancels_request_work(orchestrator):
+    personalization = orchestrator.agent("personalization")
+    personalization.hold()
+
+    async def run():
+        stream = orchestrator.stream_search_query("rust async", "user", use_gepa=False)
+        seen = []
+        async for event in stream:
+            seen.append(event["event"])
+            if event["event"] == "ranked":
+                break
+        await personalization.started.wait()
+        await stream.aclose()
+        await asyncio.sleep(0.01)
+        return seen
+
+    seen = asyncio.run(run())
+    assert seen == ["enhanced_query", "candidates", "ranked"]
+    assert personalization.cancelled
+
+def stream_client(monkeypatch, orchestrator):
+    from fastapi.testclient import TestClient
+    import backend.main
+    monkeypatch.setattr(backend.main, "_orchestrator", orchestrator)
+    return TestClient(backend.main.app)
+
+def test_endpoint_streams_ndjson(monkeypatch, orchestrator):
+    response = stream_client(monkeypatch, orchestrator).get(
+        "/search/stream", params={"q": "rust async", "use_gepa": False})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    lines = response.text.splitlines()
+    assert [json.loads(line)["event"] for line in lines] == [
+        "enhanced_query", "candidates", "ranked", "personalized", "done"]
+
+def test_endpoint_streams_sse(monkeypatch, orchestrator):
+    response = stream_client(monkeypatch, orchestrator).get(
+        "/search/stream", params={"q": "rust async", "use_gepa": False, "format": "sse"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    frames = response.text.split("\n\n")
+    assert frames[-1] == ""
+    for frame in frames[:-1]:
+        event_line, data_line = frame.split("\n")
+        assert event_line.startswith("event: ") and data_line.startswith("data: ")
+        assert json.loads(data_line[len("data: "):])["event"] == event_line[len("event: "):]
+    assert len(frames) - 1 == 5
+
+def test_endpoint_rejects_unknown_format(monkeypatch, orchestrator):
+    response = stream_client(monkeypatch, orchestrator).get(
+        "/search/stream", params={"q": "rust async", "format": "xml"})
+    assert response.status_code == 400
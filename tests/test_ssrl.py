@@ -0,0 +1,144 @@
+import os
+import numpy as np
+import pytest
+from ml.ssrl.framework import (SSRLFramework, FeedbackEvent, SearchAgentLearner, RankingAgentLearner,
+                               MultiplicativeWeightsLearner)
+
+def sequential_update(weights, feedback_values, up, down):
+    """Reference: the per-event multiply-and-normalize update"""
+    weights = dict(weights)
+    for value in feedback_values:
+        factor = up if value > 0 else down if value < 0 else 1.0
+        for key in weights:
+            weights[key] *= factor
+        total = sum(weights.values())
+        for key in weights:
+            weights[key] /= total
+    return weights
+
+def test_batch_update_matches_sequential():
+    feedback_values = [0.5, -1.0, 0.0, 1.0, 1.0, -0.5]
+    learner = SearchAgentLearner("search_001")
+    summary = learner.update_batch(np.array(feedback_values))
+    expected = sequential_update({"local": 1.0, "text": 1.0, "cross_modal": 1.0, "image": 1.0},
+                                 feedback_values, 1.05, 0.95)
+    assert summary["events"] == 6
+    assert summary["positive"] == 3
+    assert summary["negative"] == 2
+    assert summary["source_weights"] == pytest.approx(expected)
+
+def test_process_large_backlog():
+    framework = SSRLFramework()
+    for i in range(1000):
+        framework.record_feedback(FeedbackEvent("query", f"result_{i}", "user", 1.0 if i % 3 else -1.0, 0.0))
+    updates = framework.process_feedback_batch()
+    assert framework.feedback_buffer == []
+    assert updates["ranking_001"]["events"] == 1000
+    assert sum(updates["ranking_001"]["feature_weights"].values()) == pytest.approx(1.0)
+    assert sum(framework.process_feedback_values(np.ones(1_000_000))["search_001"]["source_weights"].values()) \
+        == pytest.approx(1.0)
+
+def test_segment_weights_are_isolated_and_checkpointed(tmp_path):
+    from ml.ssrl.segment_state import SegmentWeightTable
+    table = SegmentWeightTable(np.ones(2))
+    log_up, log_down = np.log([2.0, 1.0]), np.log([0.5, 1.0])
+    table.apply_counts(["a", "a", "b"], np.array([1, 1, 0]), np.array([0, 0, 1]), log_up, log_down)
+    assert table.weights("a") == pytest.approx([0.8, 0.2], rel=1e-6)
+    assert table.weights("b") == pytest.approx([1 / 3, 2 / 3], rel=1e-6)
+    assert table.weights("unseen") == pytest.approx([0.5, 0.5])
+
+    table.save(str(tmp_path / "learner"))
+    restored = SegmentWeightTable.load(str(tmp_path / "learner"), np.ones(2))
+    assert len(restored) == 2
+    assert restored.weights("a") == pytest.approx(table.weights("a"))
+    restored.apply_counts(["c"], np.array([1]), np.array([0]), log_up, log_down)
+    assert restored.weights("c") == pytest.approx([2 / 3, 1 / 3], rel=1e-6)
+
+def test_uniform_factors_keep_no_segment_rows(tmp_path):
+    learner = SearchAgentLearner("search_001")
+    assert not learner.learns_segments
+    learner.update_batch(np.array([1.0, -1.0, 1.0]), ["a", "b", "c"])
+    assert len(learner.segments) == 0
+    assert learner.get_weights("a") == pytest.approx(learner.get_weights())
+    learner.save_checkpoint(str(tmp_path))
+    assert sorted(os.listdir(tmp_path)) == ["search_001.global.npy"]
+
+class SourceLearner(MultiplicativeWeightsLearner):
+    parameters = ("web", "images")
+    positive_factor = (1.2, 1.0)
+    negative_factor = (0.8, 1.0)
+
+def test_per_parameter_factors_learn_per_segment(tmp_path):
+    learner = SourceLearner("source_001", max_segments=2)
+    assert learner.learns_segments
+    learner.update_batch(np.array([1.0, 1.0, -1.0, 1.0]), ["a", "a", "b", "c"])
+    assert learner.get_weights("a")["web"] == pytest.approx(1.44 / 2.44, rel=1e-6)
+    assert learner.get_weights("b")["web"] == pytest.approx(0.8 / 1.8, rel=1e-6)
+    # Over max_segments: "c" keeps the global weights
+    assert learner.get_weights("c") == pytest.approx(learner.get_weights())
+    assert learner.segments.dropped_updates == 1
+
+    learner.save_checkpoint(str(tmp_path))
+    restored = SourceLearner("source_001", max_segments=2)
+    restored.load_checkpoint(str(tmp_path))
+    assert restored.get_weights("a") == pytest.approx(learner.get_weights("a"))
+    assert restored.get_weights() == pytest.approx(learner.get_weights())
+
+def test_apply_counts_touches_only_segments_in_the_batch():
+    from ml.ssrl.segment_state import SegmentWeightTable
+    table = SegmentWeightTable(np.ones(2))
+    log_up, log_down = np.log([2.0, 1.0]), np.log([0.5, 1.0])
+    keys = [f"user_{i}" for i in range(5000)]
+    table.apply_counts(keys, np.ones(5000), np.zeros(5000), log_up, log_down)
+    table.apply_counts(["user_9", "user_3", "user_9"], np.array([1, 0, 1]), np.array([0, 1, 0]), log_up, log_down)
+    assert table.weights("user_9") == pytest.approx([8 / 9, 1 / 9], rel=1e-6)
+    assert table.weights("user_3") == pytest.approx([0.5, 0.5], rel=1e-6)
+    assert table.weights("user_4") == pytest.approx([2 / 3, 1 / 3], rel=1e-6)
+
+def test_feedback_moves_the_clicked_source_for_that_user_only():
+    framework = SSRLFramework()
+    framework.process_feedback_values(np.array([1.0, 1.0, -1.0]), ["alice", "alice", "bob"],
+                                      sources=["local", "local", "text"])
+    alice = framework.get_segment_weights("search_001", "alice")
+    bob = framework.get_segment_weights("search_001", "bob")
+    assert alice["local"] == pytest.approx(1.05 ** 2 / (1.05 ** 2 + 3), rel=1e-6)
+    assert bob["text"] == pytest.approx(0.95 / 3.95, rel=1e-6)
+    assert bob["local"] == pytest.approx(bob["image"])
+    # Users without feedback of their own see the global weights
+    assert not framework.has_segment_weights("carol")
+    assert framework.get_segment_weights("search_001", "carol") == pytest.approx(
+        framework.get_segment_weights("search_001"))
+    assert framework.get_segment_weights("search_001")["local"] > 0.25
+
+def test_ranking_feedback_is_credited_by_feature_values():
+    learner = RankingAgentLearner("ranking_001")
+    credit = learner.credit(["local", "local"], [(0.0, 3.0, 1.0, 0.0), ()])
+    assert credit.tolist() == [[0.0, 0.75, 0.25, 0.0], [0.0, 0.0, 0.0, 0.0]]
+    learner.update_batch(np.array([1.0, 1.0]), ["a", "a"], credit)
+    weights = learner.get_weights("a")
+    assert weights["freshness"] > weights["authority"] > weights["relevance"] == pytest.approx(weights["diversity"])
+
+def test_credited_batch_matches_per_event_updates():
+    learner = SearchAgentLearner("search_001")
+    events = [(1.0, "local"), (-1.0, "text"), (1.0, "unknown"), (0.5, "local"), (-0.5, "image")]
+    for value, source in events:
+        learner.update_parameters(FeedbackEvent("q", "r", "u", value, 0.0, source=source))
+    batched = SearchAgentLearner("search_001")
+    values = np.array([value for value, _ in events])
+    batched.update_batch(values, credit=batched.credit([source for _, source in events], [()] * len(events)))
+    assert batched.get_weights() == pytest.approx(learner.get_weights())
+
+def test_new_segments_start_from_the_global_weights(tmp_path):
+    learner = SearchAgentLearner("search_001")
+    learner.update_batch(np.ones(10), ["a"] * 10, learner.credit(["local"] * 10, [()] * 10))
+    learner.update_batch(np.array([1.0]), ["b"], learner.credit(["text"], [()]))
+    before = SearchAgentLearner("search_001")
+    before.update_batch(np.ones(10), credit=before.credit(["local"] * 10, [()] * 10))
+    expected = before.weights * np.array([1.0, 1.05, 1.0, 1.0])
+    assert list(learner.get_weights("b").values()) == pytest.approx(expected / expected.sum(), rel=1e-6)
+
+    learner.save_checkpoint(str(tmp_path))
+    restored = SearchAgentLearner("search_001")
+    restored.load_checkpoint(str(tmp_path))
+    assert restored.get_weights("b") == pytest.approx(learner.get_weights("b"), rel=1e-6)
+    assert restored.get_weights("unseen") == pytest.approx(learner.get_weights())
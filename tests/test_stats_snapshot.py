@@ -0,0 +1,45 @@
+import time
+from ml.dspy_pipelines.stats_snapshot import StatsSnapshotter
+
+def make_snapshotter(state, **kwargs):
+    def compute():
+        state["computed"] += 1
+        return {"value": state["value"]}
+    return StatsSnapshotter(compute, lambda: state["value"], **kwargs)
+
+def test_reads_do_not_recompute():
+    state = {"value": 1, "computed": 0}
+    snapshots = make_snapshotter(state, refresh_interval=60)
+    first = snapshots.get()
+    for _ in range(100):
+        assert snapshots.get() is first
+    assert state["computed"] == 1
+    assert first.version == 1 and first.stats == {"value": 1}
+    snapshots.stop()
+
+def test_refresh_on_change_or_age():
+    state = {"value": 1, "computed": 0}
+    snapshots = make_snapshotter(state, refresh_interval=60, max_age=0.05)
+    snapshots.get()
+    assert not snapshots.refresh_if_stale()
+    state["value"] = 2
+    assert snapshots.refresh_if_stale()
+    assert snapshots.get().version == 2 and snapshots.get().stats == {"value": 2}
+    time.sleep(0.06)
+    assert snapshots.refresh_if_stale()
+    assert snapshots.get().version == 3
+    snapshots.stop()
+
+def test_background_refresh_picks_up_changes():
+    state = {"value": 1, "computed": 0}
+    snapshots = make_snapshotter(state, refresh_interval=0.01)
+    snapshots.get()
+    state["value"] = 5
+    deadline = time.time() + 2
+    while snapshots.get().stats["value"] != 5 and time.time() < deadline:
+        time.sleep(0.01)
+    assert snapshots.get().stats == {"value": 5}
+    snapshot = snapshots.get().to_dict()
+    snapshot["stats"]["value"] = 0
+    assert snapshots.get().stats == {"value": 5}
+    snapshots.stop()
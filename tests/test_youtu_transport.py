@@ -0,0 +1,87 @@
+import asyncio
+import pytest
+
+pytest.importorskip("aiohttp")
+from aiohttp.test_utils import TestServer
+from ml.youtu_integration.client import YoutuSearchClient
+from ml.youtu_integration.standin_server import create_app
+from ml.youtu_integration.transport import YoutuTransport, UpstreamError
+
+async def with_server(app, fn):
+    server = TestServer(app)
+    await server.start_server()
+    try:
+        return await fn(str(server.make_url("")))
+    finally:
+        await server.close()
+
+def test_connections_are_reused():
+    app = create_app(latency_ms=1, jitter_ms=0)
+
+    async def run(base_url):
+        transport = YoutuTransport(base_url, max_connections_per_host=4)
+        client = YoutuSearchClient(transport=transport)
+        for _ in range(5):
+            results = await asyncio.gather(*(client.text_search(f"query {i}") for i in range(8)))
+            assert all(len(result) == 10 for result in results)
+        await transport.close()
+
+    asyncio.run(with_server(app, run))
+    assert app["stats"]["requests"] == 40
+    assert app["stats"]["connections"] <= 4
+
+def test_retries_then_fails():
+    app = create_app(latency_ms=0, jitter_ms=0, error_rate=1.0)
+
+    async def run(base_url):
+        transport = YoutuTransport(base_url, max_retries=2, backoff_base=0.001)
+        with pytest.raises(UpstreamError):
+            await YoutuSearchClient(transport=transport).text_search("query")
+        assert transport.get_stats()["retries"] == 2
+        await transport.close()
+
+    asyncio.run(with_server(app, run))
+    assert app["stats"]["requests"] == 3
+
+def test_session_of_a_previous_loop_is_closed():
+    transport = YoutuTransport("http://127.0.0.1:1")
+
+    async def get_session():
+        return transport._get_session()
+
+    first = asyncio.run(get_session())
+
+    async def replace():
+        second = transport._get_session()
+        await asyncio.sleep(0)
+        await transport.close()
+        return second
+
+    second = asyncio.run(replace())
+    assert second is not first
+    assert first.closed and second.closed
+
+def test_session_of_a_loop_in_another_thread_is_closed_on_that_loop():
+    import threading
+    transport = YoutuTransport("http://127.0.0.1:1")
+    other_loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=other_loop.run_forever)
+    thread.start()
+    try:
+        async def get_session():
+            return transport._get_session()
+
+        first = asyncio.run_coroutine_threadsafe(get_session(), other_loop).result(5)
+
+        async def replace():
+            second = transport._get_session()
+            await transport.close()
+            return second
+
+        assert asyncio.run(replace()) is not first
+        asyncio.run_coroutine_threadsafe(asyncio.sleep(0), other_loop).result(5)
+        assert first.closed
+    finally:
+        other_loop.call_soon_threadsafe(other_loop.stop)
+        thread.join(5)
+        other_loop.close()